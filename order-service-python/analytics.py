@@ -0,0 +1,290 @@
+"""
+Restaurant sales rollups
+Hourly/daily per-restaurant counters maintained incrementally
+
+Every order write appends a small delta row to restaurant_sales_rollups
+inside the same transaction, so writers never contend on a shared counter
+row. A periodic compaction job merges the deltas into one row per bucket,
+which keeps /restaurants/{id}/analytics reads bounded by the number of
+buckets in the window instead of the number of orders. On PostgreSQL a
+transaction-level advisory lock lets only one instance compact at a time;
+two concurrent runs would both merge the same deltas.
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+import asyncio
+import logging
+import os
+
+from database import SessionLocal, ShardSessions
+from models import ArchivedOrder, Order, RestaurantSalesRollup
+import archive
+import partitioning
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("hour", "day")
+
+# Default look-back window per granularity
+DEFAULT_WINDOWS = {
+    "hour": timedelta(hours=24),
+    "day": timedelta(days=30),
+}
+
+COMPACTION_INTERVAL_SECONDS = int(os.getenv("ROLLUP_COMPACTION_INTERVAL", "300"))
+
+# Arbitrary constant so only one instance compacts at a time on PostgreSQL
+_ADVISORY_LOCK_ID = 318_026
+
+_COUNTERS = (
+    "order_count", "item_count", "revenue", "delivered_count", "cancelled_count",
+    "rating_count", "rating_total"
+)
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its hour/day bucket"""
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _item_count(items) -> int:
+    return sum(int(item.get("quantity", 0)) for item in (items or []))
+
+
+def _add_delta(db: Session, restaurant_id: int, created_at: datetime, **delta):
+    for granularity in GRANULARITIES:
+        db.add(RestaurantSalesRollup(
+            restaurant_id=restaurant_id,
+            granularity=granularity,
+            bucket_start=bucket_start(created_at, granularity),
+            **delta
+        ))
+
+
+def record_order_created(db: Session, order: Order):
+    """Add a new order to its rollup buckets (caller commits)"""
+    _add_delta(
+        db,
+        order.restaurant_id,
+        order.created_at or datetime.utcnow(),
+        order_count=1,
+        item_count=_item_count(order.items),
+        revenue=order.total_amount,
+    )
+
+
+def record_status_change(db: Session, order: Order, old_status: str, new_status: str):
+    """Adjust rollups for a status transition (caller commits)
+
+    Changes are booked against the bucket the order was created in so
+    that cancelled revenue is removed from the hour it was counted in.
+    """
+    if old_status == new_status:
+        return
+
+    delta = {}
+    if new_status == "DELIVERED":
+        delta["delivered_count"] = 1
+    elif old_status == "DELIVERED":
+        delta["delivered_count"] = -1
+
+    if new_status == "CANCELLED":
+        delta["cancelled_count"] = 1
+        delta["revenue"] = -order.total_amount
+    elif old_status == "CANCELLED":
+        delta["cancelled_count"] = -1
+        delta["revenue"] = order.total_amount
+
+    if delta:
+        _add_delta(db, order.restaurant_id, order.created_at or datetime.utcnow(), **delta)
+
+
+def record_order_rated(db: Session, order, rating: int):
+    """Add a customer rating to the order's bucket (caller commits)"""
+    _add_delta(db, order.restaurant_id, order.created_at or datetime.utcnow(), rating_count=1, rating_total=rating)
+
+
+def compact_rollups(db: Session) -> int:
+    """Merge delta rows into a single row per bucket, returns buckets merged
+
+    Skipped (returns 0) while another instance is compacting; the lock is
+    held until this transaction commits.
+    """
+    if partitioning.is_postgres(db.get_bind()):
+        locked = db.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": _ADVISORY_LOCK_ID}).scalar()
+        if not locked:
+            db.rollback()
+            return 0
+
+    key = (
+        RestaurantSalesRollup.restaurant_id,
+        RestaurantSalesRollup.granularity,
+        RestaurantSalesRollup.bucket_start,
+    )
+    fragmented = db.query(*key).group_by(*key).having(
+        func.count(RestaurantSalesRollup.id) > 1
+    ).subquery()
+
+    rows = db.query(RestaurantSalesRollup).join(
+        fragmented,
+        (RestaurantSalesRollup.restaurant_id == fragmented.c.restaurant_id)
+        & (RestaurantSalesRollup.granularity == fragmented.c.granularity)
+        & (RestaurantSalesRollup.bucket_start == fragmented.c.bucket_start)
+    ).all()
+
+    merged = {}
+    for row in rows:
+        bucket = merged.setdefault(
+            (row.restaurant_id, row.granularity, row.bucket_start),
+            dict.fromkeys(_COUNTERS, 0)
+        )
+        for counter in _COUNTERS:
+            bucket[counter] += getattr(row, counter) or 0
+        db.delete(row)
+
+    for (restaurant_id, granularity, start), counters in merged.items():
+        db.add(RestaurantSalesRollup(
+            restaurant_id=restaurant_id,
+            granularity=granularity,
+            bucket_start=start,
+            **counters
+        ))
+
+    db.commit()
+    return len(merged)
+
+
+def _backfill(db: Session, order: Order):
+    record_order_created(db, order)
+    record_status_change(db, order, "PENDING", order.status)
+    if order.rating is not None:
+        record_order_rated(db, order, order.rating)
+
+
+def rebuild_rollups(db: Session) -> int:
+    """Recompute all rollups from the orders and archived orders of every shard (backfill)"""
+    db.query(RestaurantSalesRollup).delete()
+
+    count = 0
+    for factory in ShardSessions:
+        shard_db = db if factory is SessionLocal else factory()
+        try:
+            for order in shard_db.query(Order).yield_per(1000):
+                _backfill(db, order)
+                count += 1
+            for entry in shard_db.query(ArchivedOrder).yield_per(1000):
+                _backfill(db, archive.entry_to_order(entry))
+                count += 1
+        finally:
+            if shard_db is not db:
+                shard_db.close()
+
+    db.commit()
+    compact_rollups(db)
+    return count
+
+
+def get_restaurant_analytics(
+    db: Session,
+    restaurant_id: int,
+    granularity: str = "hour",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+) -> dict:
+    """Aggregate rollup buckets for a restaurant over a time window"""
+    until = until or datetime.utcnow()
+    since = since or until - DEFAULT_WINDOWS[granularity]
+
+    rows = db.query(
+        RestaurantSalesRollup.bucket_start,
+        func.sum(RestaurantSalesRollup.order_count),
+        func.sum(RestaurantSalesRollup.item_count),
+        func.sum(RestaurantSalesRollup.revenue),
+        func.sum(RestaurantSalesRollup.delivered_count),
+        func.sum(RestaurantSalesRollup.cancelled_count),
+    ).filter(
+        RestaurantSalesRollup.restaurant_id == restaurant_id,
+        RestaurantSalesRollup.granularity == granularity,
+        RestaurantSalesRollup.bucket_start >= bucket_start(since, granularity),
+        RestaurantSalesRollup.bucket_start <= until,
+    ).group_by(
+        RestaurantSalesRollup.bucket_start
+    ).order_by(
+        RestaurantSalesRollup.bucket_start
+    ).all()
+
+    buckets = [
+        _format_bucket(start, orders, items, revenue, delivered, cancelled)
+        for start, orders, items, revenue, delivered, cancelled in rows
+    ]
+
+    totals = _format_bucket(
+        None,
+        sum(b["orders"] for b in buckets),
+        sum(b["items"] for b in buckets),
+        sum(b["revenue"] for b in buckets),
+        sum(b["delivered"] for b in buckets),
+        sum(b["cancelled"] for b in buckets),
+    )
+    del totals["bucketStart"]
+
+    return {
+        "restaurantId": restaurant_id,
+        "granularity": granularity,
+        "since": since,
+        "until": until,
+        "buckets": buckets,
+        "totals": totals
+    }
+
+
+def _format_bucket(start, orders, items, revenue, delivered, cancelled) -> dict:
+    orders = int(orders or 0)
+    cancelled = int(cancelled or 0)
+    revenue = round(float(revenue or 0.0), 2)
+    billable = orders - cancelled
+    return {
+        "bucketStart": start,
+        "orders": orders,
+        "items": int(items or 0),
+        "revenue": revenue,
+        "averageBasket": round(revenue / billable, 2) if billable > 0 else 0.0,
+        "delivered": int(delivered or 0),
+        "cancelled": cancelled
+    }
+
+
+def _compact_once() -> int:
+    db = SessionLocal()
+    try:
+        return compact_rollups(db)
+    finally:
+        db.close()
+
+
+async def run_compaction_loop(interval: int = COMPACTION_INTERVAL_SECONDS):
+    """Background task: periodically compact rollup deltas"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_compact_once)
+        except Exception:
+            logger.exception("Rollup compaction failed")
+
+
+if __name__ == "__main__":
+    import sys
+
+    db = SessionLocal()
+    try:
+        if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+            print(f"✅ Rebuilt rollups from {rebuild_rollups(db)} orders")
+        else:
+            print(f"✅ Compacted {compact_rollups(db)} rollup buckets")
+    finally:
+        db.close()
@@ -0,0 +1,226 @@
+"""
+Cold order archive
+Moves closed orders past the retention window out of the orders table
+
+Each archive run takes a batch of DELIVERED/CANCELLED orders older than
+ORDER_RETENTION_DAYS, copies every full row into archived_orders and
+deletes it from orders in the same transaction, so an order is never in
+neither table. archived_orders lives in the database next to the orders
+(per shard), so every instance can read it back and it survives
+redeploys; the hot orders table and its monthly partitions shrink.
+GET /orders/{id} falls back to it.
+
+With ORDER_ARCHIVE_DIR set, each batch is also exported as a gzip'd JSONL
+file (e.g. a mounted bucket) for offline analysis. Reads never depend on
+those files, except for entries archived before rows were kept in the
+table; a missing file then reads as a missing order.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import DateTime, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import asyncio
+import gzip
+import json
+import logging
+import os
+
+from database import ShardSessions, shard_engines
+from models import Order, ArchivedOrder
+import partitioning
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("ORDER_ARCHIVE_DIR", "")  # optional file export
+# Where exports went when they were the only copy (entries without a record)
+LEGACY_ARCHIVE_DIR = ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+RETENTION_DAYS = int(os.getenv("ORDER_RETENTION_DAYS", "180"))
+BATCH_SIZE = int(os.getenv("ORDER_ARCHIVE_BATCH_SIZE", "5000"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ORDER_ARCHIVE_INTERVAL", "86400"))
+
+CLOSED_STATUSES = ("DELIVERED", "CANCELLED")
+
+# Arbitrary constant so only one worker archives at a time on PostgreSQL
+_ADVISORY_LOCK_ID = 318_031
+
+
+_DATETIME_COLUMNS = {column.key for column in Order.__table__.columns if isinstance(column.type, DateTime)}
+
+
+def order_to_record(order: Order) -> dict:
+    """Every orders column, JSON-safe (datetimes as ISO strings)"""
+    record = {}
+    for column in Order.__table__.columns:
+        value = getattr(order, column.key)
+        record[column.key] = value.isoformat() if isinstance(value, datetime) else value
+    return record
+
+
+def record_to_order(record: dict) -> Order:
+    """Transient Order from an archived record (older records lack some columns)"""
+    fields = {}
+    for key, value in record.items():
+        if key not in Order.__table__.columns:
+            continue
+        fields[key] = datetime.fromisoformat(value) if key in _DATETIME_COLUMNS and value else value
+    return Order(**fields)
+
+
+def entry_to_order(entry: ArchivedOrder) -> Order:
+    """Transient Order for an archive entry; entries without a record only carry the index columns"""
+    if entry.record is not None:
+        return record_to_order(entry.record)
+    return Order(
+        id=entry.order_id, user_id=entry.user_id, restaurant_id=entry.restaurant_id,
+        status=entry.status, total_amount=entry.total_amount or 0.0, created_at=entry.created_at
+    )
+
+
+def _write_archive(orders) -> str:
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    # Deterministic name: a retried batch overwrites its own orphaned file
+    filename = f"orders-{orders[0].created_at:%Y%m}-{orders[0].id}-{orders[-1].id}.jsonl.gz"
+    path = os.path.join(ARCHIVE_DIR, filename)
+    tmp_path = path + ".tmp"
+
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for order in orders:
+            f.write(json.dumps(order_to_record(order), separators=(",", ":")))
+            f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return filename
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = BATCH_SIZE) -> int:
+    """Archive one batch of closed orders created before cutoff"""
+    orders = db.query(Order).filter(
+        Order.status.in_(CLOSED_STATUSES),
+        Order.created_at < cutoff
+    ).order_by(Order.id).limit(batch_size).all()
+
+    if not orders:
+        return 0
+
+    filename = _write_archive(orders) if ARCHIVE_DIR else None
+
+    db.bulk_insert_mappings(ArchivedOrder, [{
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "restaurant_id": order.restaurant_id,
+        "status": order.status,
+        "total_amount": order.total_amount,
+        "created_at": order.created_at,
+        "record": order_to_record(order),
+        "archive_file": filename
+    } for order in orders])
+    db.query(Order).filter(
+        Order.id.in_([order.id for order in orders])
+    ).delete(synchronize_session=False)
+    db.commit()
+    return len(orders)
+
+
+def run_archive(retention_days: int = RETENTION_DAYS) -> int:
+    """Archive eligible orders on every order shard"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    return sum(archive_shard(shard, cutoff) for shard in range(len(shard_engines)))
+
+
+@contextmanager
+def _archiver_lock(engine: Engine):
+    """Yield whether this worker may archive the shard (one at a time on PostgreSQL)
+
+    pg_try_advisory_lock belongs to the database session, so it is taken
+    and released on one dedicated connection; the batches commit through
+    an ORM session whose pooled connection can change after every commit.
+    """
+    if not partitioning.is_postgres(engine):
+        yield True
+        return
+    with engine.connect() as conn:
+        locked = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": _ADVISORY_LOCK_ID}).scalar()
+        conn.commit()
+        try:
+            yield locked
+        finally:
+            if locked:
+                try:
+                    conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _ADVISORY_LOCK_ID})
+                    conn.commit()
+                except Exception:
+                    # Closing the session for good releases the lock too
+                    conn.invalidate()
+                    raise
+
+
+def archive_shard(shard: int, cutoff: datetime) -> int:
+    """Archive all eligible orders of one shard, then drop emptied monthly partitions"""
+    engine = shard_engines[shard]
+    total = 0
+
+    with _archiver_lock(engine) as locked:
+        if not locked:
+            return 0
+        db = ShardSessions[shard]()
+        try:
+            while True:
+                archived = archive_batch(db, cutoff)
+                total += archived
+                if archived == 0:
+                    break
+        finally:
+            db.close()
+
+    partitioning.drop_empty_partitions(engine, before=cutoff)
+    return total
+
+
+def _read_export(filename: str, order_id: int) -> Optional[dict]:
+    path = os.path.join(LEGACY_ARCHIVE_DIR, filename)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["id"] == order_id:
+                    return record
+    except FileNotFoundError:
+        logger.warning("Archive file %s is missing", filename, extra={"orderId": order_id})
+    return None
+
+
+def load_archived_order(db: Session, order_id: int, user_id: int) -> Optional[Order]:
+    """An archived order as a transient Order, None if unknown"""
+    entry = db.query(ArchivedOrder).filter(
+        ArchivedOrder.order_id == order_id,
+        ArchivedOrder.user_id == user_id
+    ).first()
+    if not entry:
+        return None
+
+    record = entry.record
+    if record is None and entry.archive_file:
+        record = _read_export(entry.archive_file, order_id)
+    return record_to_order(record) if record else None
+
+
+async def run_archive_loop(interval: int = ARCHIVE_INTERVAL_SECONDS):
+    """Background task: keep partitions ahead of time and archive old orders"""
+    while True:
+        try:
+            for engine in shard_engines:
+                await asyncio.to_thread(partitioning.ensure_partitions, engine)
+            archived = await asyncio.to_thread(run_archive)
+            if archived:
+                logger.info("📦 Archived %d closed orders", archived, extra={"archived": archived})
+        except Exception:
+            logger.exception("Order archive failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    print(f"✅ Archived {run_archive()} orders")
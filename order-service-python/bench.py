@@ -0,0 +1,576 @@
+"""
+Order service benchmarks
+Run: python bench.py <benchmark> [options]
+
+Uses a throwaway SQLite database unless DATABASE_URL is already set.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault(
+    "DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.gettempdir(), 'order-service-bench.sqlite')}"
+)
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_database():
+    """Drop and recreate every table in the benchmark database"""
+    from database import engine, Base
+    import models  # noqa: F401 - register tables
+    import partitioning
+
+    Base.metadata.drop_all(bind=engine)
+    partitioning.create_tables(engine)
+
+
+def seed_catalog(restaurants: int, items_per_restaurant: int):
+    """Bulk-insert a synthetic catalog, returns the restaurant ids"""
+    from database import SessionLocal
+    from models import Restaurant, MenuItem
+
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(Restaurant, [{
+            "id": i + 1,
+            "name": f"Restaurant {i + 1}",
+            "cuisine": CATEGORIES[i % len(CATEGORIES)],
+            "rating": 4.0,
+            "delivery_time": "25-35 min",
+            "image": "https://example.com/r.jpg",
+            "is_open": True,
+            "address": f"{i + 1} Bench Street",
+            "phone": "+91 9000000000"
+        } for i in range(restaurants)])
+        db.bulk_insert_mappings(MenuItem, [{
+            "restaurant_id": r + 1,
+            "name": f"Dish {r}-{i}",
+            "description": "House special with seasonal vegetables and spices",
+            "price": 50.0 + i,
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "image": IMAGES[i % len(IMAGES)],
+            "is_available": True,
+            "popularity_score": 0.0
+        } for r in range(restaurants) for i in range(items_per_restaurant)])
+        db.commit()
+    finally:
+        db.close()
+    return list(range(1, restaurants + 1))
+
+
+def bench_user(role: str = "customer", email: str = "bench@example.com") -> dict:
+    """Create a user directly and return Authorization headers for it"""
+    from database import SessionLocal
+    from models import User
+    from auth import create_access_token
+
+    db = SessionLocal()
+    try:
+        user = User(email=email, username=email.split("@")[0], hashed_password="!", role=role)
+        db.add(user)
+        db.commit()
+        token = create_access_token(data={"user_id": user.id})
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {token}"}
+
+
+def seed_orders(count: int, restaurants: list, user_id: int = 1, status: str = "PENDING") -> list:
+    """Bulk-insert synthetic orders, returns their ids"""
+    from datetime import datetime
+    from database import SessionLocal
+    from models import Order, User
+
+    db = SessionLocal()
+    try:
+        if not db.query(User).filter(User.id == user_id).first():
+            db.add(User(id=user_id, email=f"orders{user_id}@example.com", username=f"orders{user_id}", hashed_password="!"))
+            db.commit()
+        first = (db.query(Order.id).order_by(Order.id.desc()).first() or (0,))[0] + 1
+        now = datetime.utcnow()
+        db.bulk_insert_mappings(Order, [{
+            "id": first + i,
+            "user_id": user_id,
+            "restaurant_id": restaurants[i % len(restaurants)],
+            "items": [{"menuItemId": 1, "quantity": 1, "price": 100.0}],
+            "total_amount": 100.0,
+            "delivery_address": "1 Bench Street",
+            "status": status,
+            "version": 1,
+            "created_at": now,
+            "updated_at": now
+        } for i in range(count)])
+        db.commit()
+    finally:
+        db.close()
+    return list(range(first, first + count))
+
+
+def timed(fn, repeat: int) -> float:
+    """Mean wall time of fn() in milliseconds"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def report(title: str, rows: list, columns: list):
+    print(f"\n{title}")
+    print("=" * 60)
+    print("  ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{v:>14.2f}" if isinstance(v, float) else f"{v:>14}" for v in row))
+
+
+# ============================================
+# CATALOG MEMORY
+# ============================================
+
+CATEGORIES = ["Main Course", "Breads", "Desserts", "Starters", "Beverages", "Sides"]
+IMAGES = ["🍛", "🫓", "🍮", "🍗", "☕", "🥗"]
+
+
+def _synthetic_items(restaurant_id: int, first_id: int, count: int):
+    from models import MenuItem
+    return [MenuItem(
+        id=first_id + i,
+        restaurant_id=restaurant_id,
+        name=f"Dish {first_id + i}",
+        description=f"House special number {first_id + i} with seasonal vegetables and spices",
+        price=50.0 + (first_id + i) % 400,
+        category=CATEGORIES[(first_id + i) % len(CATEGORIES)].encode().decode(),  # fresh copy, as loaded from the DB
+        image=IMAGES[(first_id + i) % len(IMAGES)].encode().decode(),
+        is_available=True,
+        popularity_score=0.0
+    ) for i in range(count)]
+
+
+def _memory_worker(approach: str, items: int, per_restaurant: int) -> float:
+    import gc
+    from catalog import MenuBlock
+    from main import menu_item_to_dict
+
+    gc.collect()
+    before = rss_mb()
+    cache = {}
+    for restaurant_id in range(items // per_restaurant):
+        batch = _synthetic_items(restaurant_id, restaurant_id * per_restaurant, per_restaurant)
+        if approach == "orm":
+            cache[restaurant_id] = batch
+        elif approach == "dicts":
+            cache[restaurant_id] = [menu_item_to_dict(item) for item in batch]
+        else:
+            cache[restaurant_id] = MenuBlock(batch)
+    gc.collect()
+    return rss_mb() - before
+
+
+def bench_memory(args):
+    """Per-worker RSS of a cached catalog: ORM instances vs dicts vs columnar MenuBlock"""
+    rows = []
+    for approach in ("orm", "dicts", "columnar"):
+        # Fresh interpreter per approach so RSS deltas do not overlap
+        output = subprocess.run(
+            [sys.executable, __file__, "_memory_worker", approach, str(args.items), str(args.per_restaurant)],
+            check=True, capture_output=True, text=True
+        ).stdout.strip().splitlines()[-1]
+        delta = float(output)
+        rows.append((approach, delta, delta * 1024 * 1024 / args.items))
+
+    report(f"Catalog memory for {args.items} menu items", rows, ["approach", "rss_mb", "bytes/item"])
+
+
+# ============================================
+# BATCH MENUS
+# ============================================
+
+def bench_batch_menus(args):
+    """N x /restaurants/{id}/menu vs one /menus?restaurant_ids=... call"""
+    os.environ["CATALOG_CACHE_TTL"] = "0"  # measure the database path
+    from fastapi.testclient import TestClient
+    reset_database()
+    ids = seed_catalog(args.restaurants, args.items)
+
+    from main import app
+    client = TestClient(app)
+    joined = ",".join(map(str, ids))
+
+    individual = timed(lambda: [client.get(f"/restaurants/{i}/menu") for i in ids], args.repeat)
+    batched = timed(lambda: client.get(f"/menus?restaurant_ids={joined}"), args.repeat)
+
+    report(
+        f"{len(ids)} menus x {args.items} items (mean of {args.repeat})",
+        [("individual", individual), ("batch", batched), ("speedup", individual / batched)],
+        ["mode", "ms"]
+    )
+
+
+# ============================================
+# BULK MENU UPDATES
+# ============================================
+
+def bench_menu_updates(args):
+    """PATCH /restaurants/{id}/menu throughput across restaurants"""
+    import random
+    from fastapi.testclient import TestClient
+    reset_database()
+    ids = seed_catalog(args.restaurants, args.items)
+
+    from main import app
+    client = TestClient(app)
+    headers = bench_user("admin", "bench-admin@example.com")
+
+    rng = random.Random(42)
+    total = 0
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        restaurant_id = rng.choice(ids)
+        first_item = (restaurant_id - 1) * args.items + 1
+        changes = [{
+            "id": first_item + rng.randrange(args.items),
+            "price": float(rng.randint(50, 500)),
+            "isAvailable": rng.random() > 0.2
+        } for _ in range(args.batch)]
+        response = client.patch(f"/restaurants/{restaurant_id}/menu", json={"items": changes}, headers=headers)
+        response.raise_for_status()
+        total += response.json()["updated"]
+    elapsed = time.perf_counter() - started
+
+    report(
+        f"{args.requests} PATCH requests x {args.batch} changes over {len(ids)} restaurants",
+        [("requests/s", args.requests / elapsed), ("updates/s", total / elapsed)],
+        ["metric", "value"]
+    )
+
+
+# ============================================
+# ORDER STATUS CONFLICTS
+# ============================================
+
+def bench_status_conflicts(args):
+    """Concurrent conflicting status transitions: one winner per order and step"""
+    from concurrent.futures import ThreadPoolExecutor
+    from database import SessionLocal
+    import order_status
+    import threading
+
+    reset_database()
+    order_ids = seed_orders(args.orders, seed_catalog(5, 1))
+    path = ["CONFIRMED", "PREPARING", "OUT_FOR_DELIVERY", "DELIVERED"]
+    # All threads race on the same step at the same time
+    step_barrier = threading.Barrier(args.threads)
+
+    def worker(_):
+        wins = conflicts = 0
+        db = SessionLocal()
+        try:
+            for new_status in path:
+                step_barrier.wait()
+                for i in range(0, len(order_ids), args.batch):
+                    result = order_status.transition_orders(db, order_ids[i:i + args.batch], new_status)
+                    wins += len(result["updated"])
+                    conflicts += len(result["conflicts"])
+        finally:
+            db.close()
+        return wins, conflicts
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(worker, range(args.threads)))
+    elapsed = time.perf_counter() - started
+
+    wins = sum(w for w, _ in results)
+    conflicts = sum(c for _, c in results)
+    expected = args.orders * len(path)
+    report(
+        f"{args.threads} threads racing {args.orders} orders through {len(path)} transitions",
+        [
+            ("transitions", wins),
+            ("expected", expected),
+            ("conflicts", conflicts),
+            ("transitions/s", wins / elapsed),
+            ("attempts/s", (wins + conflicts) / elapsed)
+        ],
+        ["metric", "value"]
+    )
+    if wins != expected:
+        raise SystemExit("❌ lost or duplicated transitions")
+
+
+# ============================================
+# CART QUOTES
+# ============================================
+
+def bench_quotes(args):
+    """POST /cart/quote throughput, plus the pricing function on its own"""
+    import asyncio
+    import random
+    import httpx
+    from fastapi.testclient import TestClient
+    reset_database()
+    ids = seed_catalog(args.restaurants, args.items)
+
+    from main import app
+    import pricing
+    client = TestClient(app)
+    headers = bench_user()
+
+    rng = random.Random(7)
+    carts = []
+    for _ in range(200):
+        restaurant_id = rng.choice(ids)
+        first_item = (restaurant_id - 1) * args.items + 1
+        carts.append({
+            "restaurantId": restaurant_id,
+            "items": [
+                {"menuItemId": first_item + rng.randrange(args.items), "quantity": rng.randint(1, 3)}
+                for _ in range(args.lines)
+            ],
+            "promoCode": rng.choice([None, "SAVE10", "FREEDELIVERY"])
+        })
+
+    # Warm the price tables, as a running service would have them
+    for cart in carts:
+        client.post("/cart/quote", json=cart, headers=headers).raise_for_status()
+
+    async def run_http():
+        # In-process ASGI calls; TestClient's thread hop per request would dominate
+        transport = httpx.ASGITransport(app=app)
+        semaphore = asyncio.Semaphore(args.concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            async def one(i):
+                async with semaphore:
+                    (await http.post("/cart/quote", json=carts[i % len(carts)], headers=headers)).raise_for_status()
+            await asyncio.gather(*(one(i) for i in range(args.requests)))
+
+    started = time.perf_counter()
+    asyncio.run(run_http())
+    http_rate = args.requests / (time.perf_counter() - started)
+
+    tables = [pricing.price_tables.get(cart["restaurantId"]) for cart in carts]
+    lines = [[(item["menuItemId"], item["quantity"]) for item in cart["items"]] for cart in carts]
+    started = time.perf_counter()
+    for i in range(args.requests * 10):
+        j = i % len(carts)
+        pricing.quote(tables[j], lines[j], carts[j]["promoCode"], 1)
+    direct_rate = args.requests * 10 / (time.perf_counter() - started)
+
+    report(
+        f"{args.lines}-line carts over {len(ids)} restaurants x {args.items} items",
+        [("http quotes/s", http_rate), ("pricing quotes/s", direct_rate)],
+        ["metric", "value"]
+    )
+
+
+# ============================================
+# CONCURRENT SIGNUPS
+# ============================================
+
+def _signup_payloads(count: int, duplicates: float, prefix: str) -> tuple:
+    """Signup payloads where a share reuses an earlier email or username, and the identity count"""
+    import random
+    rng = random.Random(7)
+    identities = max(1, int(count * (1 - duplicates)))
+    payloads = []
+    for i in range(count):
+        n = i if i < identities else rng.randrange(identities)
+        if i < identities or rng.random() < 0.5:
+            email, username = f"{prefix}{n}@example.com", f"{prefix}{n}"
+        else:
+            email, username = f"{prefix}other{i}@example.com", f"{prefix}{n}"  # only the username collides
+        payloads.append({"email": email, "username": username, "password": "bench-password"})
+    rng.shuffle(payloads)
+    return payloads, identities
+
+
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _repository_signups(approach: str, payloads: list, threads: int) -> tuple:
+    """Register payloads from many threads straight through the repository
+
+    precheck: SELECT by email, SELECT by username, INSERT (the old handler)
+    constraint: INSERT only, duplicates reported by the unique constraints
+    Returns (created, rejected, unhandled errors, per-signup ms).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from models import User
+    from repositories import DuplicateError, open_repository
+
+    def one(payload):
+        started = time.perf_counter()
+        outcome = "created"
+        with open_repository() as repo:
+            try:
+                if approach == "precheck" and (
+                    repo.get_user_by_email(payload["email"]) or repo.get_user_by_username(payload["username"])
+                ):
+                    outcome = "rejected"
+                else:
+                    repo.add_user(User(email=payload["email"], username=payload["username"], hashed_password="!"))
+            except DuplicateError:
+                outcome = "rejected"
+            except Exception:
+                outcome = "error"  # would have been a 500
+        return outcome, (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(one, payloads))
+    outcomes = [outcome for outcome, _ in results]
+    return outcomes.count("created"), outcomes.count("rejected"), outcomes.count("error"), [ms for _, ms in results]
+
+
+def bench_signups(args):
+    """Concurrent POST /auth/register, part of them racing for the same email/username"""
+    import asyncio
+    import statistics
+    import httpx
+    reset_database()
+
+    from main import app
+    import deadlines
+
+    # Requests queue behind bcrypt on small machines; measure them instead
+    # of the default deadline answering 504
+    deadlines.ROUTE_DEADLINES_MS["POST /auth/register"] = deadlines.MAX_DEADLINE_MS
+
+    # Every identity is registered by several concurrent requests: one
+    # winner, the rest must get a 400, never a 500
+    payloads, identities = _signup_payloads(args.requests, args.duplicates, "user")
+
+    latencies = []
+    statuses = {}
+
+    async def run_http():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        semaphore = asyncio.Semaphore(args.concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+            async def one(payload):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await http.post("/auth/register", json=payload)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            await asyncio.gather(*(one(payload) for payload in payloads))
+
+    started = time.perf_counter()
+    asyncio.run(run_http())
+    elapsed = time.perf_counter() - started
+
+    report(
+        f"POST /auth/register: {args.requests} signups ({identities} identities), {args.concurrency} concurrent",
+        [
+            ("created (200)", statuses.get(200, 0)),
+            ("rejected (400)", statuses.get(400, 0)),
+            ("errors (5xx)", sum(n for code, n in statuses.items() if code >= 500)),
+            ("signups/s", args.requests / elapsed),
+            ("p50 ms", statistics.median(latencies)),
+            ("p95 ms", _percentile(latencies, 0.95))
+        ],
+        ["metric", "value"]
+    )
+    if any(code >= 500 for code in statuses) or statuses.get(200, 0) != identities:
+        raise SystemExit("❌ signups failed or created the wrong number of users")
+
+    # Database side alone (bcrypt dominates the HTTP numbers): the old
+    # pre-check queries against the constraint-only insert
+    rows = []
+    for approach in ("precheck", "constraint"):
+        signups, expected = _signup_payloads(args.db_signups, args.duplicates, approach)
+        started = time.perf_counter()
+        created, rejected, errors, latencies = _repository_signups(approach, signups, args.threads)
+        elapsed = time.perf_counter() - started
+        rows.append((
+            approach, created, rejected, errors, len(signups) / elapsed,
+            statistics.median(latencies), _percentile(latencies, 0.95)
+        ))
+    report(
+        f"Repository signups: {args.db_signups} per approach, {args.threads} threads",
+        rows,
+        ["approach", "created", "rejected", "errors", "signups/s", "p50 ms", "p95 ms"]
+    )
+
+
+# ============================================
+# ENTRY POINT
+# ============================================
+
+BENCHMARKS = {
+    "memory": bench_memory,
+    "batch-menus": bench_batch_menus,
+    "menu-updates": bench_menu_updates,
+    "status-conflicts": bench_status_conflicts,
+    "quotes": bench_quotes,
+    "signups": bench_signups,
+}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "_memory_worker":
+        print(_memory_worker(sys.argv[2], int(sys.argv[3]), int(sys.argv[4])))
+        return
+
+    parser = argparse.ArgumentParser(description="Order service benchmarks")
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    memory = sub.add_parser("memory", help=bench_memory.__doc__)
+    memory.add_argument("--items", type=int, default=500_000)
+    memory.add_argument("--per-restaurant", type=int, default=50)
+
+    batch = sub.add_parser("batch-menus", help=bench_batch_menus.__doc__)
+    batch.add_argument("--restaurants", type=int, default=20)
+    batch.add_argument("--items", type=int, default=30)
+    batch.add_argument("--repeat", type=int, default=20)
+
+    updates = sub.add_parser("menu-updates", help=bench_menu_updates.__doc__)
+    updates.add_argument("--restaurants", type=int, default=50)
+    updates.add_argument("--items", type=int, default=100)
+    updates.add_argument("--requests", type=int, default=200)
+    updates.add_argument("--batch", type=int, default=50)
+
+    conflicts = sub.add_parser("status-conflicts", help=bench_status_conflicts.__doc__)
+    conflicts.add_argument("--orders", type=int, default=2000)
+    conflicts.add_argument("--threads", type=int, default=8)
+    conflicts.add_argument("--batch", type=int, default=100)
+
+    quotes = sub.add_parser("quotes", help=bench_quotes.__doc__)
+    quotes.add_argument("--restaurants", type=int, default=50)
+    quotes.add_argument("--items", type=int, default=100)
+    quotes.add_argument("--lines", type=int, default=5)
+    quotes.add_argument("--requests", type=int, default=2000)
+    quotes.add_argument("--concurrency", type=int, default=32)
+
+    signups = sub.add_parser("signups", help=bench_signups.__doc__)
+    signups.add_argument("--requests", type=int, default=200)
+    signups.add_argument("--duplicates", type=float, default=0.25, help="share of requests reusing a taken identity")
+    signups.add_argument("--concurrency", type=int, default=32)
+    signups.add_argument("--db-signups", type=int, default=5000)
+    signups.add_argument("--threads", type=int, default=16)
+
+    args = parser.parse_args()
+    started = time.perf_counter()
+    BENCHMARKS[args.benchmark](args)
+    print(f"\n⏱  {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
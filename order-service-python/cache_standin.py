@@ -0,0 +1,150 @@
+"""
+Local stand-in for the shared cache store
+Run: python cache_standin.py [--port 6380]
+
+A single-process server speaking enough of the Redis protocol (RESP2) for
+shared_cache.py: GET/SET with expiry, DEL, SADD/SMEMBERS, PEXPIRE and
+PUBLISH/SUBSCRIBE. Meant for running several order-service instances
+locally (SHARED_CACHE_URL=redis://localhost:6380/0) without a Redis
+install; stop it to exercise the local-only fallback.
+"""
+
+from typing import Dict, List, Optional, Set
+import argparse
+import asyncio
+import time
+
+
+class Store:
+    def __init__(self):
+        self.values: Dict[bytes, object] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+
+    def _alive(self, key: bytes) -> bool:
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.values
+
+    def _expire_in(self, key: bytes, milliseconds: int):
+        self.expires[key] = time.monotonic() + milliseconds / 1000
+
+    def execute(self, args: List[bytes], writer: asyncio.StreamWriter) -> bytes:
+        command = args[0].upper()
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command in (b"CLIENT", b"SELECT"):
+            return b"+OK\r\n"
+        if command == b"GET":
+            value = self.values.get(args[1]) if self._alive(args[1]) else None
+            return bulk(value if isinstance(value, bytes) else None)
+        if command == b"SET":
+            key, value = args[1], args[2]
+            self.values[key] = value
+            self.expires.pop(key, None)
+            options = [arg.upper() for arg in args[3:]]
+            if b"PX" in options:
+                self._expire_in(key, int(args[3 + options.index(b"PX") + 1]))
+            elif b"EX" in options:
+                self._expire_in(key, int(args[3 + options.index(b"EX") + 1]) * 1000)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            removed = 0
+            for key in args[1:]:
+                if self._alive(key):
+                    removed += 1
+                self.values.pop(key, None)
+                self.expires.pop(key, None)
+            return integer(removed)
+        if command == b"SADD":
+            members = self.values.get(args[1]) if self._alive(args[1]) else None
+            if not isinstance(members, set):
+                members = self.values[args[1]] = set()
+            before = len(members)
+            members.update(args[2:])
+            return integer(len(members) - before)
+        if command == b"SMEMBERS":
+            members = self.values.get(args[1]) if self._alive(args[1]) else None
+            return array(sorted(members) if isinstance(members, set) else [])
+        if command == b"PEXPIRE":
+            if not self._alive(args[1]):
+                return integer(0)
+            self._expire_in(args[1], int(args[2]))
+            return integer(1)
+        if command == b"PUBLISH":
+            subscribers = list(self.channels.get(args[1], ()))
+            for subscriber in subscribers:
+                subscriber.write(array([b"message", args[1], args[2]]))
+            return integer(len(subscribers))
+        if command == b"SUBSCRIBE":
+            replies = b""
+            for count, channel in enumerate(args[1:], start=1):
+                self.channels.setdefault(channel, set()).add(writer)
+                replies += b"*3\r\n" + bulk(b"subscribe") + bulk(channel) + integer(count)
+            return replies
+        return b"-ERR unknown command '" + command + b"'\r\n"
+
+    def disconnect(self, writer: asyncio.StreamWriter):
+        for subscribers in self.channels.values():
+            subscribers.discard(writer)
+
+
+def bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def integer(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+
+def array(items: List[bytes]) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(bulk(item) for item in items)
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()  # inline command, e.g. from telnet
+    args = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+async def serve(host: str, port: int):
+    store = Store()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                if args:
+                    writer.write(store.execute(args, writer))
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            store.disconnect(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"🗄️ Cache stand-in listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
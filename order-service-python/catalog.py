@@ -0,0 +1,81 @@
+"""
+Catalog encoding helpers
+
+dumps() encodes response bodies exactly like FastAPI's JSONResponse, so
+pre-encoded catalog responses (see main.py) are byte-identical to the
+regular ones.
+
+MenuBlock stores one restaurant's menu column-wise (typed arrays for
+ids/prices/scores, tuples for text, repeated strings interned); bench.py
+compares its memory footprint with caching ORM instances or dicts.
+"""
+
+from array import array
+from typing import Iterable, List, Optional
+import json
+import sys
+
+from models import MenuItem
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+def dumps(content) -> bytes:
+    """Encode exactly like FastAPI's JSONResponse"""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class MenuBlock:
+    """One restaurant's menu stored column-wise"""
+
+    __slots__ = ("ids", "prices", "scores", "available", "names", "descriptions", "categories", "images")
+
+    def __init__(self, items: Iterable[MenuItem]):
+        ids, prices, scores, available = array("q"), array("d"), array("d"), bytearray()
+        names, descriptions, categories, images = [], [], [], []
+        for item in items:
+            ids.append(item.id)
+            prices.append(item.price)
+            scores.append(item.popularity_score or 0.0)
+            available.append(1 if item.is_available else 0)
+            names.append(item.name)
+            descriptions.append(item.description)
+            categories.append(_intern(item.category))
+            images.append(_intern(item.image))
+
+        self.ids = ids
+        self.prices = prices
+        self.scores = scores
+        self.available = available
+        self.names = tuple(names)
+        self.descriptions = tuple(descriptions)
+        self.categories = tuple(categories)
+        self.images = tuple(images)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row(self, i: int) -> dict:
+        return {
+            "id": self.ids[i],
+            "name": self.names[i],
+            "description": self.descriptions[i],
+            "price": self.prices[i],
+            "category": self.categories[i],
+            "image": self.images[i]
+        }
+
+    def rows(self, sort: Optional[str] = None) -> List[dict]:
+        """Available items as response dicts (sort=popular by score)"""
+        indices = [i for i in range(len(self.ids)) if self.available[i]]
+        if sort == "popular":
+            indices.sort(key=lambda i: (-self.scores[i], self.ids[i]))
+        return [self.row(i) for i in indices]
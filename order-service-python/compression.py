@@ -0,0 +1,114 @@
+"""
+Response compression
+Negotiated brotli/gzip encoding for responses above a size threshold
+
+Brotli is used when the optional `brotli` package is installed and the
+client accepts it, gzip otherwise. Responses that already carry a
+Content-Encoding (e.g. precompressed catalog bodies) pass through as-is.
+"""
+
+from typing import Optional
+import gzip
+import os
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Cheap levels for per-request work, high (not max: br 11 is ~30x slower
+# than 9 for little gain) for bodies compressed once per cache rebuild
+DYNAMIC_LEVELS = {"br": 4, "gzip": 6}
+STATIC_LEVELS = {"br": 9, "gzip": 9}
+
+
+def supported_encodings() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header"""
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    level = (STATIC_LEVELS if static else DYNAMIC_LEVELS)[encoding]
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing single-body responses over MIN_SIZE"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                passthrough = "content-encoding" in Headers(raw=message["headers"])
+                return
+
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if passthrough or message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming, already encoded or too small: send unchanged
+                await send(start_message)
+                start_message = None
+                passthrough = True
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            start_message = None
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,243 @@
+"""
+Request deadlines
+Per-request time budget enforced on handlers, DB statements and outbound calls
+
+Every request gets the route's budget from ROUTE_DEADLINES_MS; a caller
+can shorten it (never extend it) with the X-Request-Timeout-Ms header.
+DeadlineMiddleware keeps it in a context variable and
+
+- cancels the handler and answers 504 once the deadline passes,
+- cancels the handler as soon as the client disconnects,
+- (PostgreSQL) starts every transaction with SET LOCAL statement_timeout
+  set to the remaining budget, so a slow query gives its pool connection
+  back instead of running on for a client that gave up,
+- caps outbound HTTP timeouts through remaining() / http_timeout().
+
+Blocking code cannot be interrupted mid-call, which is why the DB side
+relies on the server-side statement timeout. SQLite (local development)
+has no statement timeout and only gets the handler-level deadline.
+"""
+
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional
+import asyncio
+import json
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import profiler
+
+DEADLINE_HEADER = "x-request-timeout-ms"
+DEFAULT_DEADLINE_MS = int(os.getenv("DEFAULT_DEADLINE_MS", "5000"))
+MAX_DEADLINE_MS = int(os.getenv("MAX_DEADLINE_MS", "600000"))
+
+# "METHOD /route/template" -> default budget when the caller sends none
+ROUTE_DEADLINES_MS = {
+    "GET /restaurants": 2000,
+    "GET /restaurants/{restaurant_id}": 2000,
+    "GET /restaurants/{restaurant_id}/menu": 2000,
+    "GET /restaurants/{restaurant_id}/detail": 2000,
+    "GET /menus": 3000,
+    "POST /cart/quote": 3000,
+    "POST /orders": 8000,
+    "POST /orders/status/bulk": 15000,
+    "GET /restaurants/{restaurant_id}/analytics": 15000,
+    "POST /admin/users/import": 600000,
+    "GET /admin/profile": (profiler.MAX_DURATION_SECONDS + 15) * 1000,  # sampling time + headroom
+    "POST /migrate-database": 60000,
+    "POST /fix-users": 60000,
+    "POST /seed-database": 60000,
+}
+
+# Absolute deadline (time.monotonic()) of the request being served
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of its time budget"""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request (None outside a request)"""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def http_timeout(default: float) -> float:
+    """Outbound timeout: the default, capped at what is left of the deadline"""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(default, left)
+
+
+# ============================================
+# METRICS
+# ============================================
+
+class DeadlineStats:
+    def __init__(self):
+        self.requests = 0
+        self.exceeded: Dict[str, int] = defaultdict(int)
+        self.disconnected: Dict[str, int] = defaultdict(int)
+        self.db_timeouts: Dict[str, int] = defaultdict(int)
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "exceeded": sum(self.exceeded.values()),
+            "clientDisconnects": sum(self.disconnected.values()),
+            "dbTimeouts": sum(self.db_timeouts.values()),
+            "byRoute": {
+                route: {
+                    "exceeded": self.exceeded.get(route, 0),
+                    "clientDisconnects": self.disconnected.get(route, 0),
+                    "dbTimeouts": self.db_timeouts.get(route, 0)
+                }
+                for route in sorted(set(self.exceeded) | set(self.disconnected) | set(self.db_timeouts))
+            }
+        }
+
+
+stats = DeadlineStats()
+
+# Route template of the current request, for the per-route counters
+current_route: ContextVar[str] = ContextVar("deadline_route", default="")
+
+
+def is_statement_timeout(error: Exception) -> bool:
+    """PostgreSQL query_canceled (57014), raised by statement_timeout"""
+    return getattr(getattr(error, "orig", None), "pgcode", None) == "57014"
+
+
+def record_db_timeout():
+    stats.db_timeouts[current_route.get()] += 1
+
+
+# ============================================
+# DATABASE
+# ============================================
+
+@event.listens_for(Session, "after_begin")
+def _set_statement_timeout(session, transaction, connection):
+    left = remaining()
+    if left is None:
+        return
+    if left <= 0:
+        raise DeadlineExceeded()
+    if connection.dialect.name == "postgresql":
+        # SET LOCAL ends with the transaction, pooled connections stay clean
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(left * 1000))}")
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+def route_template(routes: Iterable[BaseRoute], scope: Scope) -> str:
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+    return f"{scope['method']} {scope['path']}"
+
+
+def budget_ms(route: str, header: Optional[str]) -> int:
+    """Route budget, shortened by the caller's header (never extended)"""
+    budget = min(ROUTE_DEADLINES_MS.get(route, DEFAULT_DEADLINE_MS), MAX_DEADLINE_MS)
+    if header:
+        try:
+            return max(1, min(int(header), budget))
+        except ValueError:
+            pass
+    return budget
+
+
+class DeadlineMiddleware:
+    """ASGI middleware running each request under its deadline"""
+
+    def __init__(self, app: ASGIApp, routes: Iterable[BaseRoute] = ()):
+        self.app = app
+        self.routes = routes  # the router's live list, filled as routes are declared
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = route_template(self.routes, scope)
+        budget = budget_ms(route, Headers(scope=scope).get(DEADLINE_HEADER)) / 1000
+        deadline_token = current_deadline.set(time.monotonic() + budget)
+        route_token = current_route.set(route)
+        stats.requests += 1
+
+        started = finished = False
+        disconnected = asyncio.Event()
+        inbox: asyncio.Queue = asyncio.Queue()
+
+        async def watch_client():
+            # Forward request messages; after the body, receive() only
+            # returns once the client goes away
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                await inbox.put(message)
+                if disconnected.is_set():
+                    return
+
+        async def send_tracked(message: Message):
+            nonlocal started, finished
+            if message["type"] == "http.response.start":
+                started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = True
+            await send(message)
+
+        watcher = asyncio.create_task(watch_client())
+        handler = asyncio.create_task(self.app(scope, inbox.get, send_tracked))
+        disconnect_wait = asyncio.create_task(disconnected.wait())
+        try:
+            done, _ = await asyncio.wait({handler, disconnect_wait}, timeout=budget, return_when=asyncio.FIRST_COMPLETED)
+            if finished:
+                await handler  # response already sent, let it wind down
+            elif disconnected.is_set():
+                # Nobody is waiting for the response (handlers may also have
+                # failed on seeing the disconnect)
+                handler.cancel()
+                await asyncio.gather(handler, return_exceptions=True)
+                stats.disconnected[route] += 1
+            elif handler in done:
+                handler.result()
+            else:
+                handler.cancel()
+                await asyncio.gather(handler, return_exceptions=True)
+                stats.exceeded[route] += 1
+                if not started:
+                    await send_error(send, budget)
+        finally:
+            watcher.cancel()
+            disconnect_wait.cancel()
+            current_deadline.reset(deadline_token)
+            current_route.reset(route_token)
+
+
+async def send_error(send: Send, budget: float):
+    body = json.dumps({"detail": f"Deadline exceeded ({budget * 1000:.0f} ms)"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 504,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
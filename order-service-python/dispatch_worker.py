@@ -0,0 +1,258 @@
+"""
+Pending-order dispatch worker
+Run: python dispatch_worker.py
+
+With ORDER_DISPATCH_MODE=queue, create_order only inserts the order and
+this worker hands new orders to the internal comm service. Each worker
+claims a batch of undispatched PENDING orders with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers can run side
+by side without picking the same order, and notifies them concurrently.
+
+A claim stays valid for DISPATCH_VISIBILITY_TIMEOUT seconds. If the worker
+dies or the notification fails, the order becomes claimable again after
+that (up to DISPATCH_MAX_ATTEMPTS), which makes delivery at-least-once;
+dispatched_at is set as soon as a notification succeeds. Orders whose last
+attempt failed are logged as errors and counted as "exhausted" in the
+queue stats; they stay PENDING until someone looks at them.
+
+Database or pool errors do not stop the worker: the loop logs them and
+retries with exponential backoff (up to DISPATCH_MAX_BACKOFF seconds).
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Tuple
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.orm import Session
+import asyncio
+import logging
+import os
+import signal
+import time
+
+import httpx
+
+from database import ShardSessions
+from models import Order
+import structured_logging
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_MODE = os.getenv("ORDER_DISPATCH_MODE", "inline")  # inline, queue
+INTERNAL_COMM_URL = os.getenv("INTERNAL_COMM_URL", "http://localhost:9000")
+
+BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", "100"))
+CONCURRENCY = int(os.getenv("DISPATCH_CONCURRENCY", "20"))
+VISIBILITY_TIMEOUT_SECONDS = float(os.getenv("DISPATCH_VISIBILITY_TIMEOUT", "60"))
+POLL_INTERVAL_SECONDS = float(os.getenv("DISPATCH_POLL_INTERVAL", "0.5"))
+MAX_ATTEMPTS = int(os.getenv("DISPATCH_MAX_ATTEMPTS", "10"))
+STATS_INTERVAL_SECONDS = float(os.getenv("DISPATCH_STATS_INTERVAL", "30"))
+MAX_BACKOFF_SECONDS = float(os.getenv("DISPATCH_MAX_BACKOFF", "30"))
+
+
+async def notify_new_order(client: httpx.AsyncClient, order_id: int, restaurant_id: int, timeout: float = 5.0):
+    """Tell the internal comm service about a new order"""
+    response = await client.post(
+        f"{INTERNAL_COMM_URL}/notify",
+        json={
+            "type": "NEW_ORDER",
+            "orderId": order_id,
+            "restaurantId": restaurant_id
+        },
+        timeout=timeout
+    )
+    response.raise_for_status()
+
+
+def _claimable(table, now: datetime):
+    return (
+        (table.c.status == "PENDING")
+        & table.c.dispatched_at.is_(None)
+        & (func.coalesce(table.c.dispatch_attempts, 0) < MAX_ATTEMPTS)
+        & or_(
+            table.c.dispatch_claimed_at.is_(None),
+            table.c.dispatch_claimed_at < now - timedelta(seconds=VISIBILITY_TIMEOUT_SECONDS)
+        )
+    )
+
+
+def claim_batch(db: Session, batch_size: int = BATCH_SIZE) -> List[Tuple[int, int, int]]:
+    """Claim up to batch_size orders, returns (order_id, restaurant_id, attempt) triples"""
+    table = Order.__table__
+    now = datetime.utcnow()
+
+    # Rows locked by another worker's claim are skipped, not waited on.
+    # SQLite has no row locks; the repeated condition on the UPDATE keeps
+    # claims exclusive there too.
+    candidates = select(table.c.id).where(
+        _claimable(table, now)
+    ).order_by(table.c.created_at).limit(batch_size).with_for_update(skip_locked=True)
+
+    rows = db.execute(
+        table.update().where(
+            table.c.id.in_(candidates), _claimable(table, now)
+        ).values(
+            dispatch_claimed_at=now,
+            dispatch_attempts=func.coalesce(table.c.dispatch_attempts, 0) + 1
+        ).returning(table.c.id, table.c.restaurant_id, table.c.dispatch_attempts)
+    ).all()
+    db.commit()
+    return [(row.id, row.restaurant_id, row.dispatch_attempts) for row in rows]
+
+
+def mark_dispatched(db: Session, order_ids: List[int]):
+    if not order_ids:
+        return
+    db.query(Order).filter(Order.id.in_(order_ids)).update(
+        {Order.dispatched_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+
+
+def queue_depth(db: Session) -> dict:
+    """Undispatched PENDING orders, the age of the oldest one, and how many ran out of attempts"""
+    exhausted = case((func.coalesce(Order.dispatch_attempts, 0) >= MAX_ATTEMPTS, 1), else_=0)
+    count, oldest, given_up = db.query(
+        func.count(Order.id), func.min(Order.created_at), func.sum(exhausted)
+    ).filter(
+        Order.status == "PENDING",
+        Order.dispatched_at.is_(None)
+    ).one()
+    return {
+        "depth": count,
+        "oldestAgeSeconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0.0,
+        "exhausted": int(given_up or 0)
+    }
+
+
+def total_queue_depth() -> dict:
+    """queue_depth summed over every order shard"""
+    depths = [_with_session(queue_depth, shard=index) for index in range(len(ShardSessions))]
+    return {
+        "depth": sum(d["depth"] for d in depths),
+        "oldestAgeSeconds": max(d["oldestAgeSeconds"] for d in depths),
+        "exhausted": sum(d["exhausted"] for d in depths),
+        "shards": [d["depth"] for d in depths]
+    }
+
+
+def _with_session(fn, *args, shard: int = 0):
+    db = ShardSessions[shard]()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+class DispatchWorker:
+    """Claim/notify loop with bounded concurrency"""
+
+    def __init__(self, batch_size: int = BATCH_SIZE, concurrency: int = CONCURRENCY):
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.stopping = False
+        self.claimed = 0
+        self.dispatched = 0
+        self.failed = 0
+        self.exhausted = 0
+        self.errors = 0
+        self.claims = 0
+        self.claim_seconds = 0.0
+        self.last_claim_ms = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "claimed": self.claimed,
+            "dispatched": self.dispatched,
+            "failed": self.failed,
+            "exhausted": self.exhausted,
+            "errors": self.errors,
+            "lastClaimMs": round(self.last_claim_ms, 2),
+            "avgClaimMs": round(self.claim_seconds / self.claims * 1000, 2) if self.claims else 0.0
+        }
+
+    async def _notify(self, client: httpx.AsyncClient, order_id: int, restaurant_id: int, attempt: int) -> bool:
+        async with self.semaphore:
+            try:
+                await notify_new_order(client, order_id, restaurant_id)
+                return True
+            except Exception as e:
+                if attempt >= MAX_ATTEMPTS:
+                    self.exhausted += 1
+                    logger.error(
+                        "Giving up on dispatching order %d after %d attempts: %s", order_id, attempt, e,
+                        extra={"orderId": order_id, "attempts": attempt}
+                    )
+                else:
+                    logger.warning("Failed to dispatch order %d: %s", order_id, e, extra={"orderId": order_id})
+                return False
+
+    async def run_once(self, client: httpx.AsyncClient) -> int:
+        """Claim and process one batch per order shard, returns the number claimed"""
+        claimed = 0
+        for shard in range(len(ShardSessions)):
+            claimed += await self._run_shard(client, shard)
+        return claimed
+
+    async def _run_shard(self, client: httpx.AsyncClient, shard: int) -> int:
+        started = time.perf_counter()
+        batch = await asyncio.to_thread(_with_session, claim_batch, self.batch_size, shard=shard)
+        self.last_claim_ms = (time.perf_counter() - started) * 1000
+        self.claims += 1
+        self.claim_seconds += self.last_claim_ms / 1000
+        if not batch:
+            return 0
+
+        self.claimed += len(batch)
+        results = await asyncio.gather(*(
+            self._notify(client, order_id, restaurant_id, attempt) for order_id, restaurant_id, attempt in batch
+        ))
+        done = [order_id for (order_id, _, _), ok in zip(batch, results) if ok]
+        await asyncio.to_thread(_with_session, mark_dispatched, done, shard=shard)
+        self.dispatched += len(done)
+        self.failed += len(batch) - len(done)
+        return len(batch)
+
+    async def run(self):
+        logger.info("🚚 Dispatch worker started", extra={"batchSize": self.batch_size, "pid": os.getpid()})
+        next_report = time.monotonic() + STATS_INTERVAL_SECONDS
+        backoff = POLL_INTERVAL_SECONDS
+        async with httpx.AsyncClient() as client:
+            while not self.stopping:
+                try:
+                    claimed = await self.run_once(client)
+                    if time.monotonic() >= next_report:
+                        next_report = time.monotonic() + STATS_INTERVAL_SECONDS
+                        await self._report()
+                except Exception:
+                    # e.g. database down or pool exhausted: claims expire and are retried
+                    self.errors += 1
+                    logger.exception("Dispatch loop failed, retrying in %gs", backoff)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+                    continue
+                backoff = POLL_INTERVAL_SECONDS
+                if claimed < self.batch_size * len(ShardSessions):
+                    await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        logger.info("🛑 Dispatch worker stopped")
+
+    async def _report(self):
+        depth = await asyncio.to_thread(total_queue_depth)
+        logger.info("📊 Dispatch queue", extra={"queue": depth, "worker": self.stats()})
+        if depth["exhausted"]:
+            logger.warning(
+                "⚠️ %d orders ran out of dispatch attempts", depth["exhausted"],
+                extra={"exhausted": depth["exhausted"]}
+            )
+
+
+async def main():
+    worker = DispatchWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: setattr(worker, "stopping", True))
+    await worker.run()
+
+
+if __name__ == "__main__":
+    structured_logging.setup()
+    asyncio.run(main())
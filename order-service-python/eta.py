@@ -0,0 +1,236 @@
+"""
+Delivery ETA engine
+Per-restaurant, per-hour-of-day durations learned from delivered orders
+
+A periodic job loads the recent DELIVERED orders of every shard as numpy
+columns and computes, per restaurant and local hour of day, the median
+(p50) and p80 of:
+
+- preparation: created_at → out_for_delivery_at
+- delivery:    out_for_delivery_at → updated_at (when it was delivered)
+- total:       created_at → updated_at
+
+Grouping is one lexsort plus index arithmetic, no Python loop per order.
+Hours with few samples are blended toward the restaurant's all-day value
+(and that toward the global one), so sparse data cannot produce wild ETAs.
+
+The result is an EtaTable: a restaurant id → row map and small uint16
+minute arrays of shape (restaurants, 24). Requests only index into it;
+restaurants without history fall back to their hand-written delivery_time.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import os
+import re
+import time
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import Order
+import sharding
+
+logger = logging.getLogger(__name__)
+
+WINDOW_DAYS = int(os.getenv("ETA_WINDOW_DAYS", "28"))
+REFRESH_INTERVAL_SECONDS = int(os.getenv("ETA_REFRESH_INTERVAL", "600"))
+UTC_OFFSET_MINUTES = int(os.getenv("ETA_UTC_OFFSET_MINUTES", "330"))  # IST
+PRIOR_WEIGHT = float(os.getenv("ETA_PRIOR_WEIGHT", "5"))
+EPOCH = datetime(1970, 1, 1)  # timestamps are naive UTC
+MAX_MINUTES = 240  # longer "deliveries" are data errors (e.g. late status updates)
+
+
+def local_hour(ts: datetime) -> int:
+    return int((ts + timedelta(minutes=UTC_OFFSET_MINUTES)).hour)
+
+
+class EtaTable:
+    """Compact lookup: minutes[phase][quantile] is a (restaurants, 24) uint16 array"""
+
+    def __init__(self, rows: Dict[int, int], minutes: Dict[str, Dict[str, np.ndarray]], samples: np.ndarray, built_at: datetime):
+        self.rows = rows
+        self.minutes = minutes
+        self.samples = samples
+        self.built_at = built_at
+
+    def estimate(self, restaurant_id: int, at: datetime = None) -> Optional[dict]:
+        row = self.rows.get(restaurant_id)
+        if row is None:
+            return None
+        hour = local_hour(at or datetime.utcnow())
+        total = self.minutes["total"]
+        return {
+            "minMinutes": int(total["p50"][row, hour]),
+            "maxMinutes": int(total["p80"][row, hour]),
+            "prepMinutes": int(self.minutes["prep"]["p50"][row, hour]),
+            "deliveryMinutes": int(self.minutes["delivery"]["p50"][row, hour]),
+            "samples": int(self.samples[row, hour]),
+            "source": "history"
+        }
+
+    def stats(self) -> dict:
+        return {
+            "restaurants": len(self.rows),
+            "orders": int(self.samples.sum()),
+            "bytes": sum(a.nbytes for q in self.minutes.values() for a in q.values()) + self.samples.nbytes,
+            "builtAt": self.built_at.isoformat()
+        }
+
+
+EMPTY = EtaTable({}, {}, np.zeros((0, 24), dtype=np.uint32), datetime.utcnow())
+current = EMPTY
+
+# Set once the first build after startup has run (card refreshes wait for it)
+first_build = asyncio.Event()
+
+
+# ============================================
+# BATCH COMPUTATION
+# ============================================
+
+def _fetch(db: Session, since: datetime) -> List[tuple]:
+    return db.query(
+        Order.restaurant_id, Order.created_at, Order.out_for_delivery_at, Order.updated_at
+    ).filter(
+        Order.status == "DELIVERED",
+        Order.created_at >= since
+    ).all()
+
+
+def _epoch_minutes(values) -> np.ndarray:
+    """datetimes (or None) → float minutes since the epoch, NaN for None"""
+    return np.fromiter(
+        ((v - EPOCH).total_seconds() / 60 if v is not None else np.nan for v in values),
+        dtype=np.float64, count=len(values)
+    )
+
+
+def _grouped_quantiles(keys: np.ndarray, values: np.ndarray, groups: int, q: float) -> np.ndarray:
+    """q-quantile of values per key in [0, groups), NaN where a key has no values"""
+    valid = ~np.isnan(values)
+    keys, values = keys[valid], values[valid]
+    result = np.full(groups, np.nan)
+    if not len(values):
+        return result
+
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    result[keys[starts]] = values[starts + ((counts - 1) * q).astype(np.int64)]
+    return result
+
+
+def _blend(values: np.ndarray, counts: np.ndarray, prior: np.ndarray) -> np.ndarray:
+    """Shrink sparse estimates toward a prior: (n·x + k·prior) / (n + k)"""
+    values = np.where(np.isnan(values), prior, values)
+    return (counts * values + PRIOR_WEIGHT * prior) / (counts + PRIOR_WEIGHT)
+
+
+def compute_table(orders: List[tuple], built_at: datetime = None) -> EtaTable:
+    """Build an EtaTable from (restaurant_id, created_at, out_for_delivery_at, updated_at) rows"""
+    built_at = built_at or datetime.utcnow()
+    if not orders:
+        return EtaTable({}, {}, np.zeros((0, 24), dtype=np.uint32), built_at)
+
+    restaurant_ids, created, picked_up, delivered = zip(*orders)
+    restaurant_ids = np.asarray(restaurant_ids, dtype=np.int64)
+    created = _epoch_minutes(created)
+    picked_up = _epoch_minutes(picked_up)
+    delivered = _epoch_minutes(delivered)
+
+    durations = {
+        "prep": picked_up - created,
+        "delivery": delivered - picked_up,
+        "total": delivered - created,
+    }
+    for values in durations.values():
+        values[(values < 0) | (values > MAX_MINUTES)] = np.nan
+
+    unique_ids, rows = np.unique(restaurant_ids, return_inverse=True)
+    hours = (((created + UTC_OFFSET_MINUTES) // 60) % 24).astype(np.int64)
+    restaurants = len(unique_ids)
+    keys = rows * 24 + hours
+
+    samples = np.bincount(keys[~np.isnan(durations["total"])], minlength=restaurants * 24).reshape(restaurants, 24)
+
+    minutes = {}
+    for phase, values in durations.items():
+        counts = np.bincount(keys[~np.isnan(values)], minlength=restaurants * 24).reshape(restaurants, 24)
+        minutes[phase] = {}
+        for name, q in (("p50", 0.5), ("p80", 0.8)):
+            overall = np.nanquantile(values, q) if (~np.isnan(values)).any() else 0.0
+            per_restaurant = _blend(
+                _grouped_quantiles(rows, values, restaurants, q), counts.sum(axis=1), np.full(restaurants, overall)
+            )
+            per_hour = _blend(
+                _grouped_quantiles(keys, values, restaurants * 24, q).reshape(restaurants, 24),
+                counts, per_restaurant[:, None]
+            )
+            minutes[phase][name] = np.clip(np.rint(per_hour), 0, MAX_MINUTES).astype(np.uint16)
+
+    return EtaTable({int(rid): row for row, rid in enumerate(unique_ids)}, minutes, samples.astype(np.uint32), built_at)
+
+
+def refresh(window_days: int = WINDOW_DAYS) -> EtaTable:
+    """Recompute the table from every order shard and publish it"""
+    global current
+    since = datetime.utcnow() - timedelta(days=window_days)
+    orders = [row for rows in sharding.for_each_shard(lambda db: _fetch(db, since)) for row in rows]
+    current = compute_table(orders)
+    return current
+
+
+async def run_refresh_loop(interval: int = REFRESH_INTERVAL_SECONDS):
+    """Background task: rebuild the ETA table periodically"""
+    while True:
+        try:
+            started = time.perf_counter()
+            table = await asyncio.to_thread(refresh)
+            logger.info("⏱️ ETA table rebuilt", extra={
+                **table.stats(), "durationMs": round((time.perf_counter() - started) * 1000, 1)
+            })
+        except Exception:
+            logger.exception("ETA refresh failed")
+        first_build.set()
+        await asyncio.sleep(interval)
+
+
+# ============================================
+# SERVING
+# ============================================
+
+def _parse_range(text: Optional[str]) -> Optional[tuple]:
+    numbers = [int(n) for n in re.findall(r"\d+", text or "")]
+    if not numbers:
+        return None
+    return numbers[0], numbers[-1]
+
+
+def restaurant_eta(restaurant_id: int, delivery_time: Optional[str] = None) -> Optional[dict]:
+    """Live ETA for a restaurant, falling back to its hand-written range"""
+    estimate = current.estimate(restaurant_id)
+    if estimate is not None:
+        return estimate
+    fallback = _parse_range(delivery_time)
+    if fallback is None:
+        return None
+    return {"minMinutes": fallback[0], "maxMinutes": fallback[1], "source": "default"}
+
+
+def order_eta(order, delivery_time: Optional[str] = None) -> Optional[datetime]:
+    """Expected delivery time of an open order (None once it is closed)"""
+    if order.status in ("DELIVERED", "CANCELLED") or order.created_at is None:
+        return None
+    estimate = current.estimate(order.restaurant_id, order.created_at)
+    if estimate is None:
+        fallback = _parse_range(delivery_time)
+        if fallback is None:
+            return None
+        return order.created_at + timedelta(minutes=fallback[1])
+    if order.out_for_delivery_at is not None:
+        return order.out_for_delivery_at + timedelta(minutes=estimate["deliveryMinutes"])
+    return order.created_at + timedelta(minutes=estimate["maxMinutes"])
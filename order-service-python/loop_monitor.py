@@ -0,0 +1,137 @@
+"""
+Event-loop lag monitor
+Measures how late the event loop wakes up and reports what blocked it
+
+A heartbeat coroutine sleeps for a fixed tick and records how much later
+than scheduled it actually resumed. A watchdog thread checks the heartbeat
+independently; if the loop has not ticked for longer than the stall
+threshold it grabs the loop thread's current stack, i.e. the code that is
+blocking it, together with the route being served.
+
+The route comes from the blocking task's context where the interpreter
+exposes it (Task.get_context, Python 3.12+). Otherwise it is only known
+while a single request is in flight; with several, the stall is reported
+without a route rather than blamed on an arbitrary one.
+"""
+
+from contextvars import ContextVar
+from typing import List, Optional
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+TICK_SECONDS = float(os.getenv("LOOP_MONITOR_TICK_MS", "100")) / 1000
+STALL_THRESHOLD_SECONDS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "200")) / 1000
+
+# Route currently executing on the loop thread, set by middleware
+current_route: ContextVar[Optional[str]] = ContextVar("current_route", default=None)
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Continuous loop-lag measurement plus a blocking-call detector"""
+
+    def __init__(self, tick: float = TICK_SECONDS, threshold: float = STALL_THRESHOLD_SECONDS):
+        self.tick = tick
+        self.threshold = threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.ticks = 0
+        self.stalls = 0
+        self.last_stall = None
+        self._last_beat = time.monotonic()
+        self._loop = None
+        self._loop_thread_id = None
+        self._reported_beat = None
+        self._in_flight: List[str] = []
+        self._in_flight_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def route_started(self, route: str):
+        """Tag the current request context (pair with route_finished)"""
+        current_route.set(route)
+        with self._in_flight_lock:
+            self._in_flight.append(route)
+
+    def route_finished(self, route: str):
+        with self._in_flight_lock:
+            self._in_flight.remove(route)
+
+    def _blocking_route(self) -> Optional[str]:
+        # The task running on the loop right now is the one blocking it;
+        # its context carries the route set by the middleware.
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        context = None
+        if task is not None:
+            context = task.get_context() if hasattr(task, "get_context") else getattr(task, "_context", None)
+        if context is not None:
+            return context.get(current_route)
+        with self._in_flight_lock:
+            return self._in_flight[0] if len(self._in_flight) == 1 else None
+
+    async def _heartbeat(self):
+        while not self._stop.is_set():
+            scheduled = time.monotonic() + self.tick
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            lag = max(0.0, now - scheduled)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.ticks += 1
+            self._last_beat = now
+
+    def _watchdog(self):
+        while not self._stop.wait(self.tick):
+            beat = self._last_beat
+            blocked_for = time.monotonic() - beat - self.tick
+            if blocked_for < self.threshold or beat == self._reported_beat:
+                continue
+
+            # Report each stall once, with the stack of the blocking code
+            self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            route = self._blocking_route()
+            self.stalls += 1
+            self.last_stall = {
+                "blockedMs": round(blocked_for * 1000, 1),
+                "route": route,
+                "stack": stack
+            }
+            logger.warning(
+                "⚠️  Event loop blocked for %.0f ms (route: %s)", blocked_for * 1000, route or "unknown",
+                extra=self.last_stall
+            )
+
+    def stats(self) -> dict:
+        return {
+            "lagMs": round(self.last_lag * 1000, 2),
+            "maxLagMs": round(self.max_lag * 1000, 2),
+            "avgLagMs": round(self.total_lag / self.ticks * 1000, 2) if self.ticks else 0.0,
+            "stalls": self.stalls,
+            "stallThresholdMs": self.threshold * 1000,
+            "lastStall": self.last_stall
+        }
+
+
+monitor = LoopMonitor()
@@ -5,29 +5,68 @@ Language: Python (FastAPI)
 Purpose: Manages restaurants, menus, orders, and authentication
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 from datetime import datetime
+from sqlalchemy import bindparam, func
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
 import os
+import asyncio
+import logging
 import httpx
 
 # Import database and models
-from database import get_db, engine, Base
-from models import User, Restaurant, MenuItem, Order as OrderModel
+from database import engine, is_sharded
+from models import User, Restaurant, RestaurantCard, MenuItem, Order as OrderModel
+from repositories import Repository, DuplicateError, get_db, get_repository, open_repository
 from auth import (
     get_password_hash,
     verify_password,
     create_access_token,
     verify_token
 )
+import analytics
+import archive
+import repositories
+import sharding
+import catalog
+import partitioning
+import order_status
+import order_summary
+import deadlines
+import dispatch_worker
+import eta
+import popularity
+import pricing
+import profiler
+import restaurant_cards
+import structured_logging
+import user_import
+import warmup
+from loop_monitor import monitor as loop_monitor
+from singleflight import SingleFlight
+from compression import CompressionMiddleware
+from deadlines import DeadlineExceeded, DeadlineMiddleware
+from response_cache import ResponseCache, menu_tags, restaurant_tags
+from shared_cache import TwoLevelCache, invalidation_bus, shared_tier
+from structured_logging import AccessLogMiddleware
 
-# Create tables on startup
-Base.metadata.create_all(bind=engine)
+# JSON lines through a queue and writer thread, see structured_logging.py
+structured_logging.setup()
+logger = logging.getLogger("order-service")
+
+# Create tables on startup (orders is range-partitioned on PostgreSQL)
+if repositories.is_memory():
+    repositories.seed_memory(repositories.memory_repository)
+else:
+    partitioning.create_tables(engine)
+    sharding.create_tables()
 
 app = FastAPI(title="Order Service", version="2.0.0")
 
@@ -40,11 +79,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Negotiated brotli/gzip for larger responses
+app.add_middleware(CompressionMiddleware)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    deadlines.stats.exceeded[deadlines.current_route.get()] += 1
+    return JSONResponse(status_code=504, content={"detail": "Deadline exceeded"})
+
+@app.exception_handler(OperationalError)
+async def statement_timeout_handler(request: Request, exc: OperationalError):
+    """statement_timeout (set from the request deadline) cancelled a query"""
+    if not deadlines.is_statement_timeout(exc):
+        raise exc
+    deadlines.record_db_timeout()
+    return JSONResponse(status_code=504, content={"detail": "Deadline exceeded"})
+
 # Security
 security = HTTPBearer()
 
 # Configuration
-INTERNAL_COMM_URL = os.getenv("INTERNAL_COMM_URL", "http://localhost:9000")
+
+# NULL parameters leave the column unchanged, so one statement covers every
+# mix of price/availability changes in an executemany batch
+MENU_ITEM_UPDATE = MenuItem.__table__.update().where(
+    MenuItem.__table__.c.id == bindparam("item_id"),
+    MenuItem.__table__.c.restaurant_id == bindparam("rid"),
+).values(
+    price=func.coalesce(bindparam("price"), MenuItem.__table__.c.price),
+    is_available=func.coalesce(bindparam("available"), MenuItem.__table__.c.is_available),
+)
+
+# Upper bound on restaurant ids per batch menu request
+MAX_BATCH_RESTAURANTS = int(os.getenv("MAX_BATCH_RESTAURANTS", "50"))
+
+# Shared in-flight fetches for public catalog reads
+catalog_flight = SingleFlight()
+
+# Serialized + precompressed catalog bodies with ETag/Last-Modified
+catalog_responses = ResponseCache()
+
+# Authenticated user lookups (local LRU + shared tier)
+user_cache = TwoLevelCache("user", shared_tier, ttl=float(os.getenv("USER_CACHE_TTL", "60")))
+
+# Invalidations are applied here and relayed to every other instance
+invalidation_bus.register("menu", catalog_responses.invalidate_menu)
+invalidation_bus.register("menu", popularity.invalidate)
+invalidation_bus.register("menu", pricing.price_tables.invalidate)
+invalidation_bus.register("restaurant", catalog_responses.invalidate_restaurant)
+invalidation_bus.register("user", user_cache.drop)
+invalidation_bus.register("users", lambda _: user_cache.local.clear())
+invalidation_bus.register("all", catalog_responses.clear)
+invalidation_bus.register("all", restaurant_cards.request_full_refresh)
+invalidation_bus.register("all", pricing.price_tables.clear)
+invalidation_bus.register("all", lambda _: user_cache.local.clear())
 
 # ============================================
 # PYDANTIC SCHEMAS
@@ -56,7 +144,6 @@ class UserCreate(BaseModel):
     password: str
     full_name: Optional[str] = None
     phone: Optional[str] = None
-    role: Optional[str] = "customer"  # customer, restaurant, delivery, admin
 
 class UserLogin(BaseModel):
     email: EmailStr
@@ -73,6 +160,12 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class UserRoleUpdate(BaseModel):
+    role: str  # customer, restaurant, delivery, admin
+
+class RestaurantOwnerUpdate(BaseModel):
+    userId: Optional[int] = None  # None removes the owner
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -103,6 +196,14 @@ class MenuItemResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class MenuItemUpdate(BaseModel):
+    id: int
+    price: Optional[float] = None
+    isAvailable: Optional[bool] = None
+
+class MenuUpdate(BaseModel):
+    items: List[MenuItemUpdate]
+
 class OrderItemCreate(BaseModel):
     menuItemId: int
     quantity: int
@@ -111,8 +212,29 @@ class OrderItemCreate(BaseModel):
 class OrderCreate(BaseModel):
     restaurantId: int
     items: List[OrderItemCreate]
-    totalAmount: float
+    totalAmount: Optional[float] = None  # not needed with a quoteToken
     deliveryAddress: str
+    quoteToken: Optional[str] = None  # from POST /cart/quote
+
+class CartItem(BaseModel):
+    menuItemId: int
+    quantity: int
+
+class CartQuoteRequest(BaseModel):
+    restaurantId: int
+    items: List[CartItem]
+    promoCode: Optional[str] = None
+
+class OrderRating(BaseModel):
+    rating: int  # 1-5
+
+class OrderStatusUpdate(BaseModel):
+    status: str
+    version: Optional[int] = None  # optimistic concurrency check
+
+class BulkOrderStatusUpdate(BaseModel):
+    orderIds: List[int]
+    status: str
 
 class OrderResponse(BaseModel):
     id: int
@@ -123,6 +245,7 @@ class OrderResponse(BaseModel):
     status: str
     deliveryAddress: str
     createdAt: datetime
+    estimatedDeliveryAt: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -133,7 +256,7 @@ class OrderResponse(BaseModel):
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    repo: Repository = Depends(get_repository)
 ) -> User:
     """Verify JWT token and return current user"""
     token = credentials.credentials
@@ -152,7 +275,10 @@ async def get_current_user(
             detail="Invalid authentication credentials"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = user_from_cache(user_cache.get_local(user_id))
+    if user is None:
+        # Shared tier and database lookups block, keep them off the event loop
+        user = await asyncio.to_thread(load_user, repo, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -161,43 +287,85 @@ async def get_current_user(
     
     return user
 
+def user_from_cache(cached: Optional[dict]) -> Optional[User]:
+    if cached is None:
+        return None
+    return User(**dict(cached, created_at=datetime.fromisoformat(cached["created_at"])))
+
+def load_user(repo: Repository, user_id: int) -> Optional[User]:
+    """User by id through the two-level cache (blocking; password hash is not cached)"""
+    cached = user_from_cache(user_cache.get(user_id))
+    if cached is not None:
+        return cached
+    
+    user = repo.get_user(user_id)
+    if user:
+        user_cache.put(user_id, {
+            "id": user.id,
+            "email": user.email,
+            "username": user.username,
+            "full_name": user.full_name,
+            "phone": user.phone,
+            "role": user.role,
+            "is_active": user.is_active,
+            "created_at": user.created_at.isoformat()
+        }, tags=["users", f"user:{user.id}"])
+    return user
+
+def require_role(*roles: str):
+    """Dependency factory: allow only users with one of the given roles"""
+    async def checker(current_user: User = Depends(get_current_user)) -> User:
+        if current_user.role not in roles:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions"
+            )
+        return current_user
+    return checker
+
+def owned_restaurant_ids(db: Session, user: User) -> Optional[List[int]]:
+    """Restaurants a restaurant-role user manages (None: every restaurant)"""
+    if user.role != "restaurant":
+        return None
+    return [restaurant_id for (restaurant_id,) in db.query(Restaurant.id).filter(Restaurant.owner_id == user.id).all()]
+
+def require_managed_restaurant(db: Session, restaurant_id: int, user: User) -> Restaurant:
+    """The restaurant, if it exists and the user may manage it"""
+    restaurant = db.query(Restaurant).filter(Restaurant.id == restaurant_id).first()
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    if user.role == "restaurant" and restaurant.owner_id != user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your restaurant")
+    return restaurant
+
 # ============================================
 # AUTH ENDPOINTS
 # ============================================
 
 @app.post("/auth/register", response_model=Token)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    """Register a new user"""
+async def register(user_data: UserCreate, repo: Repository = Depends(get_repository)):
+    """Register a new customer (taken email/username are caught by the unique constraints)
+
+    Other roles are granted by an admin, see PUT /admin/users/{user_id}/role.
+    """
     
-    # Check if email already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
+    # bcrypt takes a few hundred ms; keep it off the event loop
+    hashed_password = await asyncio.to_thread(get_password_hash, user_data.password)
     
-    # Check if username already exists
-    existing_username = db.query(User).filter(User.username == user_data.username).first()
-    if existing_username:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already taken"
-        )
-    
-    # Create new user
     new_user = User(
         email=user_data.email,
         username=user_data.username,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=hashed_password,
         full_name=user_data.full_name,
         phone=user_data.phone,
-        role=user_data.role if hasattr(user_data, 'role') else 'customer'
+        role="customer"
     )
     
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    try:
+        repo.add_user(new_user)
+    except DuplicateError as e:
+        detail = "Email already registered" if e.field == "email" else "Username already taken"
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
     
     # Create access token
     access_token = create_access_token(data={"user_id": new_user.id})
@@ -208,13 +376,20 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         "user": new_user
     }
 
+def authenticate(repo: Repository, email: str, password: str) -> Optional[User]:
+    """User with these credentials, None if unknown or wrong (blocking: lookup + bcrypt)"""
+    user = repo.get_user_by_email(email)
+    if not user or not verify_password(password, user.hashed_password):
+        return None
+    return user
+
 @app.post("/auth/login", response_model=Token)
-async def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, repo: Repository = Depends(get_repository)):
     """Login user"""
     
-    # Find user by email
-    user = db.query(User).filter(User.email == credentials.email).first()
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    # bcrypt takes a few hundred ms; keep it and the lookup off the event loop
+    user = await asyncio.to_thread(authenticate, repo, credentials.email, credentials.password)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -238,64 +413,315 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 # RESTAURANT ENDPOINTS (Public)
 # ============================================
 
-@app.get("/restaurants")
-async def get_restaurants(db: Session = Depends(get_db)):
-    """Fetch all restaurants"""
-    restaurants = db.query(Restaurant).filter(Restaurant.is_open == True).all()
-    
-    # Convert to response format
-    return [{
+def restaurant_to_dict(r: Restaurant, card: Optional[RestaurantCard] = None) -> dict:
+    return {
         "id": r.id,
         "name": r.name,
         "cuisine": r.cuisine,
-        "rating": r.rating,
+        "rating": card.rating if card else r.rating,
+        "ratingCount": card.rating_count if card else 0,
+        "orderCount": card.order_count if card else 0,
         "deliveryTime": r.delivery_time,
+        "eta": eta.restaurant_eta(r.id, r.delivery_time),
         "image": r.image,
         "isOpen": r.is_open,
         "address": r.address,
         "phone": r.phone
-    } for r in restaurants]
+    }
+
+def card_to_dict(card: RestaurantCard) -> dict:
+    """Same shape as restaurant_to_dict, ETA as of the last card refresh"""
+    return {
+        "id": card.restaurant_id,
+        "name": card.name,
+        "cuisine": card.cuisine,
+        "rating": card.rating,
+        "ratingCount": card.rating_count,
+        "orderCount": card.order_count,
+        "deliveryTime": card.delivery_time,
+        "eta": {
+            "minMinutes": card.eta_min, "maxMinutes": card.eta_max, "source": card.eta_source
+        } if card.eta_max is not None else None,
+        "image": card.image,
+        "isOpen": card.is_open,
+        "address": card.address,
+        "phone": card.phone
+    }
+
+# Fallback ordering of restaurant_to_dict results (no cards yet, memory backend)
+RESTAURANT_SORT_KEYS = {
+    "rating": lambda r: -(r["rating"] or 0.0),
+    "popular": lambda r: -r["orderCount"],
+    "eta": lambda r: r["eta"]["maxMinutes"] if r["eta"] else float("inf"),
+}
+
+def menu_item_to_dict(item: MenuItem) -> dict:
+    return {
+        "id": item.id,
+        "name": item.name,
+        "description": item.description,
+        "price": item.price,
+        "category": item.category,
+        "image": item.image
+    }
+
+# Catalog loaders run in a worker thread with their own repository so that
+# concurrent identical requests can share one fetch (see singleflight.py)
+
+def require_restaurant(repo: Repository, restaurant_id: int) -> Restaurant:
+    restaurant = repo.get_restaurant(restaurant_id)
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    return restaurant
+
+def restaurant_list(repo: Repository, sort: Optional[str]) -> List[dict]:
+    cards = repo.list_restaurant_cards(sort)
+    if cards:
+        return [card_to_dict(card) for card in cards]
+    
+    # Cards not built yet: same list computed from the restaurants
+    restaurants = [restaurant_to_dict(r) for r in sorted(repo.list_open_restaurants(), key=lambda r: r.id)]
+    if sort:
+        restaurants.sort(key=RESTAURANT_SORT_KEYS[sort])
+    return restaurants
+
+def load_restaurants(sort: Optional[str]) -> List[dict]:
+    with open_repository() as repo:
+        return restaurant_list(repo, sort)
+
+def load_restaurant(restaurant_id: int) -> dict:
+    with open_repository() as repo:
+        restaurant = require_restaurant(repo, restaurant_id)
+        return restaurant_to_dict(restaurant, repo.get_restaurant_card(restaurant_id))
+
+def load_menu(restaurant_id: int, sort: Optional[str]) -> List[dict]:
+    with open_repository() as repo:
+        require_restaurant(repo, restaurant_id)
+        return [menu_item_to_dict(item) for item in repo.list_menu(restaurant_id, sort)]
+
+def load_menus(restaurant_ids: tuple) -> dict:
+    """Menus for several restaurants with one IN query, grouped by restaurant"""
+    with open_repository() as repo:
+        found = repo.get_restaurants(restaurant_ids)
+        grouped = repo.list_menus([restaurant_id for restaurant_id in restaurant_ids if restaurant_id in found])
+        
+        return {
+            "menus": [
+                {"restaurantId": restaurant_id, "items": [menu_item_to_dict(item) for item in menu]}
+                for restaurant_id, menu in grouped.items()
+            ],
+            "notFound": [restaurant_id for restaurant_id in restaurant_ids if restaurant_id not in found]
+        }
+
+def load_restaurant_detail(restaurant_id: int) -> dict:
+    with open_repository() as repo:
+        restaurant = require_restaurant(repo, restaurant_id)
+        return {
+            "restaurant": restaurant_to_dict(restaurant, repo.get_restaurant_card(restaurant_id)),
+            "menu": [menu_item_to_dict(item) for item in repo.list_menu(restaurant_id)]
+        }
+
+def build_catalog(repo: Repository, restaurant_ids: List[int], lists: bool):
+    """Bodies of every cached catalog read for restaurant_ids, with bulk queries (see warmup.py)
+
+    Produces the same bytes as the loaders above, keyed like the endpoints.
+    """
+    restaurants = repo.get_restaurants(restaurant_ids)
+    cards = repo.get_restaurant_cards(restaurants)
+    menus = repo.list_menus(list(restaurants))
+    
+    bodies = {}
+    prices = []
+    for restaurant_id, restaurant in restaurants.items():
+        menu = menus[restaurant_id]
+        popular = sorted(menu, key=lambda item: (-(item.popularity_score or 0.0), item.id))
+        restaurant_dict = restaurant_to_dict(restaurant, cards.get(restaurant_id))
+        items = [menu_item_to_dict(item) for item in menu]
+        bodies[("restaurant", restaurant_id)] = catalog.dumps(restaurant_dict)
+        bodies[("menu", restaurant_id, None)] = catalog.dumps(items)
+        bodies[("menu", restaurant_id, "popular")] = catalog.dumps([menu_item_to_dict(item) for item in popular])
+        bodies[("detail", restaurant_id)] = catalog.dumps({"restaurant": restaurant_dict, "menu": items})
+        prices.append((restaurant, menu))
+    if lists:
+        for sort in restaurant_cards.SORTS:
+            bodies[("restaurants", sort)] = catalog.dumps(restaurant_list(repo, sort))
+    return bodies, prices
+
+catalog_warmer = warmup.CatalogWarmer(catalog_responses, pricing.price_tables, build_catalog)
+
+def parse_restaurant_ids(raw: str) -> tuple:
+    """Parse '1,2,3' into a sorted, de-duplicated tuple (the cache key)"""
+    try:
+        ids = {int(part) for part in raw.split(",") if part.strip()}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="restaurant_ids must be comma-separated integers")
+    
+    if not ids:
+        raise HTTPException(status_code=400, detail="restaurant_ids is required")
+    if len(ids) > MAX_BATCH_RESTAURANTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_RESTAURANTS} restaurant_ids per request"
+        )
+    return tuple(sorted(ids))
+
+async def menu_changed(restaurant_id: int):
+    """Drop every cached view of one restaurant's menu on all instances (call after commit)"""
+    await invalidation_bus.invalidate_async("menu", restaurant_id, tags=menu_tags(restaurant_id))
+
+async def restaurants_changed(restaurant_ids: List[int]):
+    """Drop cached restaurant views and lists on all instances (card refreshes)"""
+    for restaurant_id in restaurant_ids:
+        await invalidation_bus.invalidate_async("restaurant", restaurant_id, tags=restaurant_tags(restaurant_id))
+
+def build_cached_body(key: tuple, loader, *args):
+    body = catalog_responses.get_shared(key)
+    if body is None:
+        body = catalog_responses.put(key, catalog.dumps(loader(*args)))
+    return body
+
+async def cached_catalog_response(request: Request, key: tuple, loader, *args):
+    """Serve a catalog read from cached bytes, rebuilding through single-flight"""
+    body = catalog_responses.get(key)
+    if body is None:
+        body = await catalog_flight.do(key, build_cached_body, key, loader, *args)
+    return body.respond(request.headers)
+
+@app.get("/restaurants")
+async def get_restaurants(request: Request, sort: Optional[str] = None):
+    """Fetch open restaurants (sort=rating|popular|eta)"""
+    if sort not in restaurant_cards.SORTS:
+        raise HTTPException(status_code=400, detail="sort must be 'rating', 'popular' or 'eta'")
+    
+    return await cached_catalog_response(request, ("restaurants", sort), load_restaurants, sort)
 
 @app.get("/restaurants/{restaurant_id}")
-async def get_restaurant(restaurant_id: int, db: Session = Depends(get_db)):
+async def get_restaurant(restaurant_id: int, request: Request):
     """Fetch restaurant by ID"""
-    restaurant = db.query(Restaurant).filter(Restaurant.id == restaurant_id).first()
+    return await cached_catalog_response(request, ("restaurant", restaurant_id), load_restaurant, restaurant_id)
+
+@app.get("/restaurants/{restaurant_id}/menu")
+async def get_restaurant_menu(restaurant_id: int, request: Request, sort: Optional[str] = None):
+    """Fetch restaurant menu (sort=popular orders by recent demand)"""
+    if sort not in (None, "popular"):
+        raise HTTPException(status_code=400, detail="sort must be 'popular'")
     
-    if not restaurant:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
+    return await cached_catalog_response(request, ("menu", restaurant_id, sort), load_menu, restaurant_id, sort)
+
+@app.get("/restaurants/{restaurant_id}/detail")
+async def get_restaurant_detail(restaurant_id: int, request: Request):
+    """Restaurant and its menu in one response"""
+    return await cached_catalog_response(request, ("detail", restaurant_id), load_restaurant_detail, restaurant_id)
+
+@app.get("/menus")
+async def get_menus(restaurant_ids: str, request: Request):
+    """Batch menu fetch: /menus?restaurant_ids=1,2,3 (grouped in ascending id order)"""
+    ids = parse_restaurant_ids(restaurant_ids)
+    return await cached_catalog_response(request, ("menus", ids), load_menus, ids)
+
+@app.patch("/restaurants/{restaurant_id}/menu")
+async def update_restaurant_menu(
+    restaurant_id: int,
+    update: MenuUpdate,
+    current_user: User = Depends(require_role("restaurant", "admin")),
+    db: Session = Depends(get_db)
+):
+    """Bulk price/availability changes applied in one batched UPDATE"""
+    if not update.items:
+        raise HTTPException(status_code=400, detail="No menu item changes given")
+    for change in update.items:
+        if change.price is None and change.isAvailable is None:
+            raise HTTPException(status_code=400, detail=f"Menu item {change.id}: nothing to update")
+        if change.price is not None and change.price <= 0:
+            raise HTTPException(status_code=400, detail=f"Menu item {change.id}: price must be positive")
+    
+    require_managed_restaurant(db, restaurant_id, current_user)
+    
+    # Last change wins if an item appears more than once
+    changes = {change.id: change for change in update.items}
+    existing = {
+        row.id for row in db.query(MenuItem.id).filter(
+            MenuItem.restaurant_id == restaurant_id,
+            MenuItem.id.in_(changes)
+        ).all()
+    }
+    
+    if existing:
+        db.execute(MENU_ITEM_UPDATE, [{
+            "item_id": item_id,
+            "rid": restaurant_id,
+            "price": changes[item_id].price,
+            "available": changes[item_id].isAvailable
+        } for item_id in existing])
+        db.commit()
+        await menu_changed(restaurant_id)
     
     return {
-        "id": restaurant.id,
-        "name": restaurant.name,
-        "cuisine": restaurant.cuisine,
-        "rating": restaurant.rating,
-        "deliveryTime": restaurant.delivery_time,
-        "image": restaurant.image,
-        "isOpen": restaurant.is_open,
-        "address": restaurant.address,
-        "phone": restaurant.phone
+        "updated": len(existing),
+        "notFound": sorted(set(changes) - existing)
     }
 
-@app.get("/restaurants/{restaurant_id}/menu")
-async def get_restaurant_menu(restaurant_id: int, db: Session = Depends(get_db)):
-    """Fetch restaurant menu"""
+@app.get("/restaurants/{restaurant_id}/popular")
+async def get_popular_items(
+    restaurant_id: int,
+    limit: int = Query(popularity.TOP_K, ge=1, le=popularity.MAX_LIMIT),
+    db: Session = Depends(get_db)
+):
+    """Most popular menu items, served from the cached top-K ranking"""
     restaurant = db.query(Restaurant).filter(Restaurant.id == restaurant_id).first()
     if not restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
-    menu_items = db.query(MenuItem).filter(
-        MenuItem.restaurant_id == restaurant_id,
-        MenuItem.is_available == True
-    ).all()
+    return popularity.get_popular_items(db, restaurant_id, limit)
+
+@app.get("/restaurants/{restaurant_id}/analytics")
+async def get_restaurant_analytics(
+    restaurant_id: int,
+    granularity: str = "hour",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: User = Depends(require_role("restaurant", "admin")),
+    db: Session = Depends(get_db)
+):
+    """Sales dashboard served from precomputed hourly/daily rollups"""
+    if granularity not in analytics.GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity must be 'hour' or 'day'")
+    
+    require_managed_restaurant(db, restaurant_id, current_user)
     
-    return [{ 
-        "id": item.id,
-        "name": item.name,
-        "description": item.description,
-        "price": item.price,
-        "category": item.category,
-        "image": item.image
-    } for item in menu_items]
+    return analytics.get_restaurant_analytics(db, restaurant_id, granularity, since, until)
+
+# ============================================
+# CART QUOTES (Protected)
+# ============================================
+
+def cart_lines(pairs) -> dict:
+    """Total quantity per menu item from (id, quantity) pairs"""
+    lines = {}
+    for item_id, quantity in pairs:
+        lines[item_id] = lines.get(item_id, 0) + quantity
+    return lines
+
+@app.post("/cart/quote")
+async def quote_cart(cart: CartQuoteRequest, current_user: User = Depends(get_current_user)):
+    """Price a cart (items, promo, fees, tax) and issue a signed quote token"""
+    table = pricing.price_tables.get(cart.restaurantId)
+    if table is None:
+        table = await catalog_flight.do(("prices", cart.restaurantId), pricing.price_tables.load, cart.restaurantId)
+    if table is None:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    
+    try:
+        quote = pricing.quote(
+            table,
+            [(item.menuItemId, item.quantity) for item in cart.items],
+            cart.promoCode,
+            current_user.id
+        )
+    except pricing.QuoteError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Plain JSON types only, so skip jsonable_encoder
+    return Response(catalog.dumps(quote), media_type="application/json")
 
 # ============================================
 # ORDER ENDPOINTS (Protected)
@@ -305,43 +731,51 @@ async def get_restaurant_menu(restaurant_id: int, db: Session = Depends(get_db))
 async def create_order(
     order: OrderCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    repo: Repository = Depends(get_repository)
 ):
     """Create new order (requires authentication)"""
     
     # Get restaurant
-    restaurant = db.query(Restaurant).filter(Restaurant.id == order.restaurantId).first()
-    if not restaurant:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
+    restaurant = require_restaurant(repo, order.restaurantId)
+    
+    # A quote token carries server-side prices; the cart must still match it
+    if order.quoteToken:
+        quote = pricing.verify(order.quoteToken, current_user.id)
+        if not quote:
+            raise HTTPException(status_code=400, detail="Invalid or expired quote")
+        items, total_amount = pricing.quoted_order(quote)
+        ordered = cart_lines((item.menuItemId, item.quantity) for item in order.items)
+        if quote["r"] != order.restaurantId or ordered != cart_lines((i["menuItemId"], i["quantity"]) for i in items):
+            raise HTTPException(status_code=400, detail="Cart changed since the quote was issued")
+    elif order.totalAmount is None:
+        raise HTTPException(status_code=400, detail="totalAmount or quoteToken is required")
+    else:
+        items, total_amount = [item.dict() for item in order.items], order.totalAmount
     
     # Create order
     new_order = OrderModel(
         user_id=current_user.id,
         restaurant_id=order.restaurantId,
-        items=[item.dict() for item in order.items],
-        total_amount=order.totalAmount,
+        items=items,
+        total_amount=total_amount,
         delivery_address=order.deliveryAddress,
-        status="PENDING"
+        status="PENDING",
+        # In queue mode the dispatch worker notifies internal comm instead
+        dispatched_at=None if dispatch_worker.DISPATCH_MODE == "queue" else datetime.utcnow()
     )
     
-    db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
+    # Also records the analytics rollup and item popularity
+    repo.add_order(new_order)
     
     # Notify internal comm service (async)
-    try:
-        async with httpx.AsyncClient() as client:
-            await client.post(
-                f"{INTERNAL_COMM_URL}/notify",
-                json={
-                    "type": "NEW_ORDER",
-                    "orderId": new_order.id,
-                    "restaurantId": restaurant.id
-                },
-                timeout=5.0
-            )
-    except Exception as e:
-        print(f"Failed to notify internal comm: {e}")
+    if dispatch_worker.DISPATCH_MODE != "queue":
+        try:
+            async with httpx.AsyncClient() as client:
+                await dispatch_worker.notify_new_order(
+                    client, new_order.id, restaurant.id, timeout=deadlines.http_timeout(5.0)
+                )
+        except Exception as e:
+            logger.warning("Failed to notify internal comm: %s", e, extra={"orderId": new_order.id})
     
     return {
         "id": new_order.id,
@@ -351,23 +785,23 @@ async def create_order(
         "totalAmount": new_order.total_amount,
         "status": new_order.status,
         "deliveryAddress": new_order.delivery_address,
-        "createdAt": new_order.created_at
+        "createdAt": new_order.created_at,
+        "estimatedDeliveryAt": eta.order_eta(new_order, restaurant.delivery_time)
     }
 
 @app.get("/orders", response_model=List[OrderResponse])
 async def get_user_orders(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    repo: Repository = Depends(get_repository)
 ):
     """Get all orders for current user"""
     
-    orders = db.query(OrderModel).filter(
-        OrderModel.user_id == current_user.id
-    ).order_by(OrderModel.created_at.desc()).all()
+    orders = repo.list_user_orders(current_user.id)
+    restaurants = repo.get_restaurants(order.restaurant_id for order in orders)
     
     result = []
     for order in orders:
-        restaurant = db.query(Restaurant).filter(Restaurant.id == order.restaurant_id).first()
+        restaurant = restaurants.get(order.restaurant_id)
         result.append({
             "id": order.id,
             "restaurantId": order.restaurant_id,
@@ -376,28 +810,42 @@ async def get_user_orders(
             "totalAmount": order.total_amount,
             "status": order.status,
             "deliveryAddress": order.delivery_address,
-            "createdAt": order.created_at
+            "createdAt": order.created_at,
+            "estimatedDeliveryAt": eta.order_eta(order, restaurant.delivery_time if restaurant else None)
         })
     
     return result
 
+@app.get("/orders/summary")
+async def get_order_summary(
+    current_user: User = Depends(get_current_user),
+    repo: Repository = Depends(get_repository)
+):
+    """Order count, spend and favourite restaurants of the current user"""
+    summary = repo.get_order_summary(current_user.id)
+    names = {}
+    if summary is not None:
+        ids = [restaurant_id for restaurant_id, _ in order_summary.favourites(summary)]
+        names = {r.id: r.name for r in repo.get_restaurants(ids).values()}
+    return order_summary.summary_to_dict(summary, names)
+
 @app.get("/orders/{order_id}")
 async def get_order(
     order_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    repo: Repository = Depends(get_repository)
 ):
     """Get specific order"""
     
-    order = db.query(OrderModel).filter(
-        OrderModel.id == order_id,
-        OrderModel.user_id == current_user.id
-    ).first()
+    order = repo.get_order(order_id, current_user.id)
     
+    if not order and isinstance(repo, repositories.SqlRepository):
+        # Closed orders past retention live in the cold archive
+        order = archive.load_archived_order(repo.orders_db(current_user.id), order_id, current_user.id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    restaurant = db.query(Restaurant).filter(Restaurant.id == order.restaurant_id).first()
+    restaurant = repo.get_restaurant(order.restaurant_id)
     
     return {
         "id": order.id,
@@ -408,39 +856,178 @@ async def get_order(
         "status": order.status,
         "deliveryAddress": order.delivery_address,
         "createdAt": order.created_at,
+        "estimatedDeliveryAt": eta.order_eta(order, restaurant.delivery_time if restaurant else None),
         "paymentStatus": order.payment_status
     }
 
+@app.post("/orders/{order_id}/rating")
+async def rate_order(
+    order_id: int,
+    body: OrderRating,
+    current_user: User = Depends(get_current_user),
+    repo: Repository = Depends(get_repository)
+):
+    """Rate a delivered order (once); feeds the restaurant's card rating"""
+    if not 1 <= body.rating <= 5:
+        raise HTTPException(status_code=400, detail="rating must be between 1 and 5")
+    
+    if not repo.rate_order(order_id, current_user.id, body.rating):
+        order = repo.get_order(order_id, current_user.id)
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        if order.status != "DELIVERED":
+            raise HTTPException(status_code=400, detail="Only delivered orders can be rated")
+        raise HTTPException(status_code=409, detail="Order already rated")
+    
+    return {"id": order_id, "rating": body.rating}
+
+def status_row_to_dict(row) -> dict:
+    return {
+        "id": row.id,
+        "status": row.status,
+        "version": row.version,
+        "updatedAt": row.updated_at
+    }
+
+@app.put("/orders/{order_id}/status")
+async def update_order_status(
+    order_id: int,
+    update: OrderStatusUpdate,
+    current_user: User = Depends(require_role("restaurant", "delivery", "admin")),
+    db: Session = Depends(get_db)
+):
+    """Move one order to its next status (conditional UPDATE)
+
+    Restaurant users can only move orders of restaurants they own.
+    """
+    if update.status not in order_status.STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status '{update.status}'")
+    
+    result = sharding.transition_orders(
+        db, [order_id], update.status, update.version,
+        restaurant_ids=owned_restaurant_ids(db, current_user)
+    )
+    
+    if result["updated"]:
+        return status_row_to_dict(result["updated"][0])
+    if result["notFound"]:
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    current = result["conflicts"][0]
+    if update.version is not None and current.version != update.version:
+        detail = f"Order was modified (version {current.version}, expected {update.version})"
+    else:
+        detail = f"Cannot move order from {current.status} to {update.status}"
+    raise HTTPException(status_code=409, detail=detail)
+
+@app.post("/orders/status/bulk")
+async def bulk_update_order_status(
+    update: BulkOrderStatusUpdate,
+    current_user: User = Depends(require_role("restaurant", "delivery", "admin")),
+    db: Session = Depends(get_db)
+):
+    """Move many orders to one status; orders in the wrong state are reported
+
+    Orders of restaurants a restaurant user does not own count as not found.
+    """
+    if update.status not in order_status.STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status '{update.status}'")
+    if not update.orderIds:
+        raise HTTPException(status_code=400, detail="orderIds is required")
+    if len(update.orderIds) > order_status.MAX_BULK_TRANSITIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {order_status.MAX_BULK_TRANSITIONS} orders per request"
+        )
+    
+    result = sharding.transition_orders(
+        db, update.orderIds, update.status, restaurant_ids=owned_restaurant_ids(db, current_user)
+    )
+    
+    return {
+        "updated": [status_row_to_dict(row) for row in result["updated"]],
+        "conflicts": [
+            {"id": row.id, "status": row.status, "version": row.version}
+            for row in result["conflicts"]
+        ],
+        "notFound": result["notFound"]
+    }
+
 # ============================================
 # DATABASE MIGRATION ENDPOINT
 # ============================================
 
+# (table, column, DDL) for columns added after the initial schema
+COLUMN_MIGRATIONS = [
+    ("users", "role", "ALTER TABLE users ADD COLUMN role VARCHAR DEFAULT 'customer'"),
+    ("menu_items", "popularity_score", "ALTER TABLE menu_items ADD COLUMN popularity_score FLOAT DEFAULT 0"),
+    ("menu_items", "popularity_epoch", "ALTER TABLE menu_items ADD COLUMN popularity_epoch INTEGER DEFAULT 0"),
+    ("orders", "version", "ALTER TABLE orders ADD COLUMN version INTEGER NOT NULL DEFAULT 1"),
+    # Existing orders were notified inline, so they start out as dispatched
+    ("orders", "dispatched_at",
+     "ALTER TABLE orders ADD COLUMN dispatched_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'); "
+     "ALTER TABLE orders ALTER COLUMN dispatched_at DROP DEFAULT"),
+    ("orders", "dispatch_claimed_at", "ALTER TABLE orders ADD COLUMN dispatch_claimed_at TIMESTAMP"),
+    ("orders", "dispatch_attempts", "ALTER TABLE orders ADD COLUMN dispatch_attempts INTEGER DEFAULT 0"),
+    ("orders", "out_for_delivery_at", "ALTER TABLE orders ADD COLUMN out_for_delivery_at TIMESTAMP"),
+    ("archived_orders", "total_amount", "ALTER TABLE archived_orders ADD COLUMN total_amount FLOAT"),
+    # Archived rows are kept in the table; files became an optional export
+    ("archived_orders", "record",
+     "ALTER TABLE archived_orders ADD COLUMN record JSON; "
+     "ALTER TABLE archived_orders ALTER COLUMN archive_file DROP NOT NULL"),
+    ("orders", "rating", "ALTER TABLE orders ADD COLUMN rating INTEGER"),
+    ("restaurant_sales_rollups", "rating_count",
+     "ALTER TABLE restaurant_sales_rollups ADD COLUMN rating_count INTEGER DEFAULT 0"),
+    ("restaurant_sales_rollups", "rating_total",
+     "ALTER TABLE restaurant_sales_rollups ADD COLUMN rating_total INTEGER DEFAULT 0"),
+    ("restaurants", "updated_at",
+     "ALTER TABLE restaurants ADD COLUMN updated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'); "
+     "ALTER TABLE restaurants ALTER COLUMN updated_at DROP DEFAULT"),
+    ("menu_items", "updated_at",
+     "ALTER TABLE menu_items ADD COLUMN updated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'); "
+     "ALTER TABLE menu_items ALTER COLUMN updated_at DROP DEFAULT"),
+    ("restaurants", "owner_id", "ALTER TABLE restaurants ADD COLUMN owner_id INTEGER REFERENCES users (id)"),
+]
+
+INDEX_MIGRATIONS = [
+    "CREATE INDEX IF NOT EXISTS ix_menu_items_popularity ON menu_items (restaurant_id, popularity_score)",
+    "CREATE INDEX IF NOT EXISTS ix_restaurants_updated_at ON restaurants (updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_menu_items_updated_at ON menu_items (updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_restaurants_owner_id ON restaurants (owner_id)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_dispatch_queue ON orders (created_at) "
+    "WHERE status = 'PENDING' AND dispatched_at IS NULL",
+]
+
 @app.post("/migrate-database")
 async def migrate_database_endpoint():
     """Add missing columns to existing tables"""
     try:
         from sqlalchemy import text
         
-        # Add role column to users table if it doesn't exist
+        added = []
         with engine.connect() as conn:
-            # Check if role column exists
-            result = conn.execute(text("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='users' AND column_name='role'
-            """))
+            for table, column, ddl in COLUMN_MIGRATIONS:
+                # Check if column exists
+                result = conn.execute(text("""
+                    SELECT column_name 
+                    FROM information_schema.columns 
+                    WHERE table_name=:table AND column_name=:column
+                """), {"table": table, "column": column})
+                
+                if result.fetchone() is None:
+                    conn.execute(text(ddl))
+                    added.append(f"{table}.{column}")
             
-            if result.fetchone() is None:
-                # Add role column
-                conn.execute(text("""
-                    ALTER TABLE users ADD COLUMN role VARCHAR DEFAULT 'customer'
-                """))
-                conn.commit()
-                return {"message": "Migration successful - added role column", "status": "success"}
-            else:
-                return {"message": "Role column already exists", "status": "skipped"}
+            for ddl in INDEX_MIGRATIONS:
+                conn.execute(text(ddl))
+            conn.commit()
+        
+        if added:
+            return {"message": f"Migration successful - added {', '.join(added)}", "status": "success"}
+        return {"message": "All columns already exist", "status": "skipped"}
                 
     except Exception as e:
+        logger.exception("Migration failed")
         return {"message": f"Migration failed: {str(e)}", "status": "error"}
 
 @app.post("/fix-users")
@@ -454,14 +1041,17 @@ async def fix_users_endpoint():
             try:
                 conn.execute(text("ALTER TABLE users ADD COLUMN role VARCHAR DEFAULT 'customer'"))
                 conn.commit()
+                await invalidation_bus.invalidate_async("users", tags=["users"])
                 return {"message": "Added role column successfully", "status": "success"}
             except Exception as e:
                 # Column might already exist, update existing users
                 conn.execute(text("UPDATE users SET role = 'customer' WHERE role IS NULL"))
                 conn.commit()
+                await invalidation_bus.invalidate_async("users", tags=["users"])
                 return {"message": "Updated existing users with default role", "status": "success"}
                 
     except Exception as e:
+        logger.exception("Fixing users failed")
         return {"message": f"Fix failed: {str(e)}", "status": "error"}
 
 # ============================================
@@ -478,6 +1068,7 @@ async def seed_database_endpoint(db: Session = Depends(get_db)):
         
         # Always recreate demo user to fix role column
         seed_demo_user(db)
+        await invalidation_bus.invalidate_async("all", tags=["catalog", "users"])
         
         # Check if restaurants already seeded
         if db.query(Restaurant).count() == 0:
@@ -498,22 +1089,225 @@ async def seed_database_endpoint(db: Session = Depends(get_db)):
             }
     
     except Exception as e:
+        logger.exception("Seeding failed")
         raise HTTPException(status_code=500, detail=f"Seeding failed: {str(e)}")
 
+# ============================================
+# PROFILING (Admin)
+# ============================================
+
+def profile_response(profile: "profiler.Profile", fmt: str):
+    if fmt == "speedscope":
+        return JSONResponse(
+            profile.to_speedscope(),
+            headers={"Content-Disposition": "attachment; filename=profile.speedscope.json"}
+        )
+    return PlainTextResponse(profile.to_collapsed())
+
+@app.get("/admin/profile")
+async def profile_worker(
+    seconds: float = 10,
+    format: str = "collapsed",
+    current_user: User = Depends(require_role("admin"))
+):
+    """Sample this worker for N seconds and return a flamegraph-ready profile"""
+    if format not in profiler.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'speedscope'")
+    if not 0 < seconds <= profiler.MAX_DURATION_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {profiler.MAX_DURATION_SECONDS}")
+    if not profiler.acquire_session():
+        raise HTTPException(status_code=409, detail="A profiling session is already running")
+    
+    sampler = profiler.SamplingProfiler()
+    try:
+        sampler.start()
+        await asyncio.sleep(seconds)
+    finally:
+        # Also on cancellation (disconnect, deadline), or the thread samples forever
+        profile = sampler.stop(name=f"order-service pid {os.getpid()}")
+        profiler.release_session()
+    
+    return profile_response(profile, format)
+
+@app.get("/admin/profile/{profile_id}")
+async def get_request_profile(
+    profile_id: str,
+    format: str = "collapsed",
+    current_user: User = Depends(require_role("admin"))
+):
+    """Download a profile captured with the X-Profile request header"""
+    profile = profiler.get_stored(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile_response(profile, format)
+
+@app.get("/admin/dispatch-queue")
+async def get_dispatch_queue(
+    current_user: User = Depends(require_role("admin")),
+    db: Session = Depends(get_db)
+):
+    """Depth and age of the pending-order dispatch queue (all order shards)"""
+    if not is_sharded():
+        return {"mode": dispatch_worker.DISPATCH_MODE, **dispatch_worker.queue_depth(db)}
+    return {"mode": dispatch_worker.DISPATCH_MODE, **await asyncio.to_thread(dispatch_worker.total_queue_depth)}
+
+@app.post("/admin/users/import")
+async def import_users_endpoint(
+    request: Request,
+    format: str = "csv",
+    current_user: User = Depends(require_role("admin"))
+):
+    """Bulk-register users from a CSV or JSONL request body"""
+    if format not in ("csv", "jsonl"):
+        raise HTTPException(status_code=400, detail="format must be csv or jsonl")
+    try:
+        text = (await request.body()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be UTF-8 text")
+    return await asyncio.to_thread(user_import.import_users, text, format)
+
+@app.put("/admin/users/{user_id}/role", response_model=UserResponse)
+async def set_user_role(
+    user_id: int,
+    update: UserRoleUpdate,
+    current_user: User = Depends(require_role("admin")),
+    db: Session = Depends(get_db)
+):
+    """Grant a role; the only way to get anything but customer"""
+    if update.role not in user_import.ROLES:
+        raise HTTPException(status_code=400, detail=f"role must be one of {', '.join(user_import.ROLES)}")
+    
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user.role = update.role
+    db.commit()
+    db.refresh(user)
+    await invalidation_bus.invalidate_async("user", user_id, tags=[f"user:{user_id}"])
+    return user
+
+@app.put("/admin/restaurants/{restaurant_id}/owner")
+async def set_restaurant_owner(
+    restaurant_id: int,
+    update: RestaurantOwnerUpdate,
+    current_user: User = Depends(require_role("admin")),
+    db: Session = Depends(get_db)
+):
+    """Assign the restaurant-role user who manages a restaurant"""
+    restaurant = db.query(Restaurant).filter(Restaurant.id == restaurant_id).first()
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    
+    if update.userId is not None:
+        owner = db.query(User).filter(User.id == update.userId).first()
+        if not owner:
+            raise HTTPException(status_code=404, detail="User not found")
+        if owner.role != "restaurant":
+            raise HTTPException(status_code=400, detail="Owner must have the restaurant role")
+    
+    restaurant.owner_id = update.userId
+    db.commit()
+    return {"restaurantId": restaurant_id, "ownerId": update.userId}
+
+def is_admin_token(authorization: Optional[str]) -> bool:
+    """Blocking (cache miss: shared tier, database), run in a worker thread"""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return False
+    payload = verify_token(authorization[7:])
+    if not payload or payload.get("user_id") is None:
+        return False
+    with open_repository() as repo:
+        user = load_user(repo, payload["user_id"])
+        return user is not None and user.role == "admin"
+
+@app.middleware("http")
+async def track_loop_route(request: Request, call_next):
+    """Tag the request context so loop stalls can name the blocking route"""
+    route = f"{request.method} {request.url.path}"
+    loop_monitor.route_started(route)
+    try:
+        return await call_next(request)
+    finally:
+        loop_monitor.route_finished(route)
+
+@app.middleware("http")
+async def profile_single_request(request: Request, call_next):
+    """Profile one request when an admin sends 'X-Profile: 1'"""
+    if "x-profile" not in request.headers:
+        return await call_next(request)
+    
+    is_admin = await asyncio.to_thread(is_admin_token, request.headers.get("authorization"))
+    if not is_admin or not profiler.acquire_session():
+        return await call_next(request)
+    
+    sampler = profiler.SamplingProfiler()
+    try:
+        sampler.start()
+        response = await call_next(request)
+    finally:
+        profile = sampler.stop(name=f"{request.method} {request.url.path}")
+        profiler.release_session()
+    
+    response.headers["X-Profile-Id"] = profiler.store(profile)
+    return response
+
+# Per-request time budget (route default, shortened by X-Request-Timeout-Ms).
+# Added after the @app.middleware functions so it sees disconnects first.
+app.add_middleware(DeadlineMiddleware, routes=app.router.routes)
+
+# Request ids and the access log, around everything (incl. deadline 504s)
+app.add_middleware(AccessLogMiddleware)
+
 # ============================================
 # HEALTH CHECK
 # ============================================
 
 @app.get("/health")
 async def health_check():
+    """Ready once the catalog caches are warm (503 while warming up)"""
+    if not catalog_warmer.ready:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "warming_up", "service": "order-service", "version": "2.0.0"}
+        )
     return {"status": "healthy", "service": "order-service", "version": "2.0.0"}
 
+@app.get("/metrics")
+async def metrics():
+    """In-process counters for this worker"""
+    return {
+        "singleflight": catalog_flight.stats(),
+        "catalogCache": catalog_responses.stats(),
+        "catalogWarmup": catalog_warmer.stats(),
+        "userCache": user_cache.stats(),
+        "sharedCache": shared_tier.stats(),
+        "invalidation": invalidation_bus.stats(),
+        "etaTable": eta.current.stats(),
+        "restaurantCards": restaurant_cards.last_refresh,
+        "deadlines": deadlines.stats.to_dict(),
+        "logging": structured_logging.stats(),
+        "eventLoop": loop_monitor.stats()
+    }
+
 # ============================================
 # STARTUP EVENT
 # ============================================
 
 @app.on_event("startup")
 async def startup_event():
-    print("🚀 Order Service started with database support")
-    print("📊 Database tables ready")
-    print("🔐 Authentication enabled")
+    logger.info("🚀 Order Service started with database support", extra={
+        "repositoryBackend": repositories.BACKEND,
+        "sharded": is_sharded(),
+        "sharedCache": shared_tier.enabled
+    })
+    loop_monitor.start()
+    invalidation_bus.start()
+    if repositories.is_memory():
+        asyncio.create_task(catalog_warmer.run(refresh=False))
+        return
+    asyncio.create_task(catalog_warmer.run(after=restaurant_cards.first_refresh))
+    asyncio.create_task(analytics.run_compaction_loop())
+    asyncio.create_task(archive.run_archive_loop())
+    asyncio.create_task(eta.run_refresh_loop())
+    asyncio.create_task(restaurant_cards.run_refresh_loop(on_changed=restaurants_changed, after=eta.first_build))
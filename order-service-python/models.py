@@ -2,7 +2,7 @@
 Database Models (SQLAlchemy ORM)
 """
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -36,7 +36,9 @@ class Restaurant(Base):
     is_open = Column(Boolean, default=True)
     address = Column(Text)
     phone = Column(String)
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)  # restaurant-role user who manages it
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # see warmup.py
     
     # Relationships
     menu_items = relationship("MenuItem", back_populates="restaurant", cascade="all, delete-orphan")
@@ -54,10 +56,17 @@ class MenuItem(Base):
     category = Column(String)  # e.g., "Main Course", "Desserts"
     image = Column(String)
     is_available = Column(Boolean, default=True)
+    popularity_score = Column(Float, default=0.0)  # forward-decayed order volume, see popularity.py
+    popularity_epoch = Column(Integer, default=0)  # landmark epoch popularity_score is relative to
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # see warmup.py
     
     # Relationships
     restaurant = relationship("Restaurant", back_populates="menu_items")
+    
+    __table_args__ = (
+        Index("ix_menu_items_popularity", "restaurant_id", "popularity_score"),
+    )
 
 
 class Order(Base):
@@ -71,9 +80,113 @@ class Order(Base):
     delivery_address = Column(Text, nullable=False)
     status = Column(String, default="PENDING")  # PENDING, CONFIRMED, PREPARING, OUT_FOR_DELIVERY, DELIVERED, CANCELLED
     payment_status = Column(String, default="PENDING")  # PENDING, PAID, FAILED
+    version = Column(Integer, default=1, nullable=False)  # bumped on every status change
+    dispatched_at = Column(DateTime)  # set once internal comm accepted the order, see dispatch_worker.py
+    dispatch_claimed_at = Column(DateTime)
+    dispatch_attempts = Column(Integer, default=0)
+    out_for_delivery_at = Column(DateTime)  # end of preparation, see eta.py
+    rating = Column(Integer)  # 1-5, given by the customer once delivered
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="orders")
     restaurant = relationship("Restaurant", back_populates="orders")
+    
+    __table_args__ = (
+        # Partial index: only undispatched PENDING orders (the work queue)
+        Index(
+            "ix_orders_dispatch_queue", "created_at",
+            postgresql_where=text("status = 'PENDING' AND dispatched_at IS NULL"),
+            sqlite_where=text("status = 'PENDING' AND dispatched_at IS NULL"),
+        ),
+    )
+
+
+class RestaurantSalesRollup(Base):
+    __tablename__ = "restaurant_sales_rollups"
+    
+    # Append-only delta rows; compaction merges them into one row per bucket
+    id = Column(Integer, primary_key=True, index=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=False)
+    granularity = Column(String, nullable=False)  # hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    order_count = Column(Integer, default=0)
+    item_count = Column(Integer, default=0)
+    revenue = Column(Float, default=0.0)
+    delivered_count = Column(Integer, default=0)
+    cancelled_count = Column(Integer, default=0)
+    rating_count = Column(Integer, default=0)
+    rating_total = Column(Integer, default=0)  # sum of the ratings, average = total / count
+    
+    __table_args__ = (
+        Index("ix_sales_rollups_bucket", "restaurant_id", "granularity", "bucket_start"),
+    )
+
+
+class ArchivedOrder(Base):
+    __tablename__ = "archived_orders"
+    
+    # Closed orders moved out of the orders table (see archive.py)
+    order_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    restaurant_id = Column(Integer, nullable=False)
+    status = Column(String)
+    total_amount = Column(Float)  # for order_summary.py rebuilds
+    created_at = Column(DateTime)
+    record = Column(JSON)  # the full orders row, see archive.order_to_record
+    archive_file = Column(String)  # optional export file (ORDER_ARCHIVE_DIR)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class OrderIdSequence(Base):
+    __tablename__ = "order_id_sequence"
+    
+    # Global order id allocator when orders are sharded (see sharding.py)
+    name = Column(String, primary_key=True)
+    next_id = Column(Integer, nullable=False)
+
+
+class UserOrderSummary(Base):
+    __tablename__ = "user_order_summaries"
+    
+    # One row per user, kept next to the user's orders (see order_summary.py)
+    user_id = Column(Integer, primary_key=True)
+    order_count = Column(Integer, default=0, nullable=False)
+    active_count = Column(Integer, default=0, nullable=False)
+    delivered_count = Column(Integer, default=0, nullable=False)
+    cancelled_count = Column(Integer, default=0, nullable=False)
+    total_spent = Column(Float, default=0.0, nullable=False)  # excludes cancelled orders
+    restaurant_counts = Column(JSON)  # {"restaurant_id": non-cancelled orders}
+    first_order_at = Column(DateTime)
+    last_order_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class RestaurantCard(Base):
+    __tablename__ = "restaurant_cards"
+    
+    # Denormalized listing row per restaurant, refreshed by restaurant_cards.py
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), primary_key=True)
+    name = Column(String, nullable=False)
+    cuisine = Column(String)
+    image = Column(String)
+    address = Column(Text)
+    phone = Column(String)
+    is_open = Column(Boolean, default=True, nullable=False)
+    rating = Column(Float, default=0.0, nullable=False)  # listed rating blended with customer ratings
+    rating_count = Column(Integer, default=0, nullable=False)
+    order_count = Column(Integer, default=0, nullable=False)  # all non-cancelled orders
+    recent_orders = Column(Integer, default=0, nullable=False)  # non-cancelled orders in the popularity window
+    eta_min = Column(Integer)
+    eta_max = Column(Integer)
+    eta_source = Column(String)  # history, default
+    delivery_time = Column(String)  # hand-written fallback range
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # One index per list order, open restaurants only are listed
+        Index("ix_restaurant_cards_rating", "is_open", "rating"),
+        Index("ix_restaurant_cards_popular", "is_open", "recent_orders"),
+        Index("ix_restaurant_cards_eta", "is_open", "eta_max"),
+    )
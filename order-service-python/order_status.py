@@ -0,0 +1,110 @@
+"""
+Order status state machine
+Validated transitions applied with conditional UPDATEs
+
+PENDING → CONFIRMED → PREPARING → OUT_FOR_DELIVERY → DELIVERED, with
+CANCELLED reachable until the order leaves the kitchen. A transition is a
+single `UPDATE ... WHERE status IN (<allowed sources>) [AND version = n]`,
+so concurrent writers never read-modify-write: exactly one of several
+conflicting updates wins and the others are reported as conflicts.
+"""
+
+from datetime import datetime
+from typing import Iterable, Optional
+from sqlalchemy.orm import Session
+
+from models import Order
+import analytics
+import order_summary
+
+STATUSES = ("PENDING", "CONFIRMED", "PREPARING", "OUT_FOR_DELIVERY", "DELIVERED", "CANCELLED")
+
+TRANSITIONS = {
+    "PENDING": {"CONFIRMED", "CANCELLED"},
+    "CONFIRMED": {"PREPARING", "CANCELLED"},
+    "PREPARING": {"OUT_FOR_DELIVERY", "CANCELLED"},
+    "OUT_FOR_DELIVERY": {"DELIVERED"},
+    "DELIVERED": set(),
+    "CANCELLED": set(),
+}
+
+TERMINAL_STATUSES = {status for status, targets in TRANSITIONS.items() if not targets}
+
+MAX_BULK_TRANSITIONS = 500
+
+
+def can_transition(current: str, new: str) -> bool:
+    return new in TRANSITIONS.get(current, set())
+
+
+def allowed_sources(new_status: str) -> set:
+    """Statuses an order may be in to move to new_status"""
+    return {status for status, targets in TRANSITIONS.items() if new_status in targets}
+
+
+def transition_orders(
+    db: Session,
+    order_ids: Iterable[int],
+    new_status: str,
+    expected_version: Optional[int] = None,
+    rollup_db: Optional[Session] = None,
+    restaurant_ids: Optional[Iterable[int]] = None
+) -> dict:
+    """Move orders to new_status with one conditional UPDATE
+
+    Returns the updated rows plus conflicts (order exists but was not in an
+    allowed status / had another version) and ids that do not exist.
+    rollup_db is where analytics rollups live if db is an order shard.
+    restaurant_ids limits the update to those restaurants' orders; orders
+    of other restaurants are reported as not found.
+    """
+    rollup_db = rollup_db or db
+    if new_status not in STATUSES:
+        raise ValueError(f"Unknown status '{new_status}'")
+
+    ids = sorted(set(order_ids))
+    table = Order.__table__
+
+    scope = table.c.id.in_(ids)
+    if restaurant_ids is not None:
+        scope &= table.c.restaurant_id.in_(list(restaurant_ids))
+    condition = scope & table.c.status.in_(allowed_sources(new_status))
+    if expected_version is not None:
+        condition &= table.c.version == expected_version
+
+    now = datetime.utcnow()
+    values = {"status": new_status, "version": table.c.version + 1, "updated_at": now}
+    if new_status == "OUT_FOR_DELIVERY":
+        # Splits preparation from delivery time for the ETA model
+        values["out_for_delivery_at"] = now
+
+    rows = db.execute(
+        table.update().where(condition).values(**values).returning(
+            table.c.id, table.c.user_id, table.c.restaurant_id, table.c.total_amount,
+            table.c.status, table.c.version, table.c.created_at, table.c.updated_at
+        )
+    ).all()
+
+    # Sources are never terminal, so the old status does not matter here
+    for row in rows:
+        analytics.record_status_change(rollup_db, row, None, new_status)
+    order_summary.record_status_changes(db, rows, new_status)
+    db.commit()
+    if rollup_db is not db:
+        rollup_db.commit()
+
+    updated_ids = {row.id for row in rows}
+    failed = [order_id for order_id in ids if order_id not in updated_ids]
+    current = {}
+    if failed:
+        current = {
+            row.id: row for row in db.query(Order.id, Order.status, Order.version).filter(
+                scope & Order.id.in_(failed)
+            ).all()
+        }
+
+    return {
+        "updated": rows,
+        "conflicts": [current[order_id] for order_id in failed if order_id in current],
+        "notFound": [order_id for order_id in failed if order_id not in current]
+    }
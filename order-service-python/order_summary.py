@@ -0,0 +1,252 @@
+"""
+Per-user order summaries
+Counts, spend and favourite restaurants maintained on every order write
+
+Each user has one user_order_summaries row on the database (shard) that
+holds their orders. Creating an order and changing its status update the
+row in the same transaction as the order itself, so GET /orders/summary
+is a primary-key lookup however long the user's history is.
+
+A new order is one upsert that increments the row in SQL; status changes
+lock the rows (SELECT ... FOR UPDATE) while they are changed. Only the
+user's own concurrent orders contend for a row. Archived orders keep
+counting, since archiving does not touch the summary.
+
+Run: python order_summary.py rebuild   (backfill / repair, every shard)
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import JSON, DateTime, bindparam, case, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import Order, ArchivedOrder, UserOrderSummary
+
+FAVOURITES = 3
+
+ACTIVE_STATUSES = ("PENDING", "CONFIRMED", "PREPARING", "OUT_FOR_DELIVERY")
+
+
+def _lock_rows(db: Session, user_ids: Iterable[int]) -> Dict[int, UserOrderSummary]:
+    """Summary rows for user_ids, created if missing and locked until commit"""
+    user_ids = sorted(set(user_ids))  # fixed lock order, no deadlocks between bulk updates
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    db.execute(
+        dialect.insert(UserOrderSummary.__table__).on_conflict_do_nothing(index_elements=["user_id"]),
+        [{
+            "user_id": user_id, "order_count": 0, "active_count": 0, "delivered_count": 0,
+            "cancelled_count": 0, "total_spent": 0.0, "restaurant_counts": {}
+        } for user_id in user_ids]
+    )
+    rows = db.query(UserOrderSummary).filter(
+        UserOrderSummary.user_id.in_(user_ids)
+    ).with_for_update().all()
+    return {row.user_id: row for row in rows}
+
+
+def _count_restaurant(summary: UserOrderSummary, restaurant_id: int, delta: int):
+    # Reassign so the JSON column is flagged as changed
+    counts = dict(summary.restaurant_counts or {})
+    key = str(restaurant_id)
+    counts[key] = counts.get(key, 0) + delta
+    if counts[key] <= 0:
+        del counts[key]
+    summary.restaurant_counts = counts
+
+
+def apply_created(summary: UserOrderSummary, order: Order):
+    created_at = order.created_at or datetime.utcnow()
+    summary.order_count += 1
+    summary.active_count += 1
+    summary.total_spent += order.total_amount
+    _count_restaurant(summary, order.restaurant_id, 1)
+    if summary.first_order_at is None or created_at < summary.first_order_at:
+        summary.first_order_at = created_at
+    if summary.last_order_at is None or created_at > summary.last_order_at:
+        summary.last_order_at = created_at
+
+
+def apply_closed(summary: UserOrderSummary, order, new_status: str):
+    """An active order was delivered or cancelled"""
+    summary.active_count -= 1
+    if new_status == "DELIVERED":
+        summary.delivered_count += 1
+    else:
+        summary.cancelled_count += 1
+        summary.total_spent -= order.total_amount
+        _count_restaurant(summary, order.restaurant_id, -1)
+
+
+# apply_created() as one statement per dialect: insert the first summary
+# or increment the existing one, without reading it first
+_UPSERT_COLUMNS = """
+    INSERT INTO user_order_summaries AS s (
+        user_id, order_count, active_count, delivered_count, cancelled_count,
+        total_spent, restaurant_counts, first_order_at, last_order_at, updated_at
+    ) VALUES (:user_id, 1, 1, 0, 0, :amount, :counts, :created_at, :created_at, :now)
+    ON CONFLICT (user_id) DO UPDATE SET
+        order_count = s.order_count + 1,
+        active_count = s.active_count + 1,
+        total_spent = s.total_spent + :amount,
+        updated_at = :now,
+"""
+
+_CREATED_UPSERT = {
+    "postgresql": _UPSERT_COLUMNS + """
+        restaurant_counts = jsonb_set(
+            COALESCE(s.restaurant_counts::jsonb, '{}'::jsonb), ARRAY[:key],
+            to_jsonb(COALESCE((s.restaurant_counts ->> :key)::int, 0) + 1)
+        )::json,
+        first_order_at = LEAST(COALESCE(s.first_order_at, :created_at), :created_at),
+        last_order_at = GREATEST(COALESCE(s.last_order_at, :created_at), :created_at)
+    """,
+    "sqlite": _UPSERT_COLUMNS + """
+        restaurant_counts = json_set(
+            COALESCE(s.restaurant_counts, '{}'), :path,
+            COALESCE(json_extract(s.restaurant_counts, :path), 0) + 1
+        ),
+        first_order_at = MIN(COALESCE(s.first_order_at, :created_at), :created_at),
+        last_order_at = MAX(COALESCE(s.last_order_at, :created_at), :created_at)
+    """,
+}
+
+
+def record_order_created(db: Session, order: Order):
+    """Add a new order to its user's summary with one upsert (caller commits)"""
+    created_at = order.created_at or datetime.utcnow()
+    key = str(order.restaurant_id)
+    statement = text(_CREATED_UPSERT[db.get_bind().dialect.name]).bindparams(
+        bindparam("counts", type_=JSON),
+        bindparam("created_at", type_=DateTime),
+        bindparam("now", type_=DateTime),
+    )
+    db.execute(statement, {
+        "user_id": order.user_id,
+        "amount": order.total_amount,
+        "counts": {key: 1},
+        "key": key,
+        "path": f'$."{key}"',
+        "created_at": created_at,
+        "now": datetime.utcnow(),
+    })
+
+
+def record_order_removed(db: Session, order: Order):
+    """Take back record_order_created for an order that was deleted again (caller commits)
+
+    first_order_at/last_order_at keep the removed order's time until the
+    next rebuild.
+    """
+    summary = _lock_rows(db, [order.user_id])[order.user_id]
+    summary.order_count -= 1
+    summary.active_count -= 1
+    summary.total_spent -= order.total_amount
+    _count_restaurant(summary, order.restaurant_id, -1)
+
+
+def record_status_changes(db: Session, rows: List, new_status: str):
+    """Book transitioned orders (with user_id, restaurant_id, total_amount) (caller commits)
+
+    Transition sources are never terminal, so only moves into DELIVERED or
+    CANCELLED change a summary.
+    """
+    if new_status not in ("DELIVERED", "CANCELLED") or not rows:
+        return
+    summaries = _lock_rows(db, (row.user_id for row in rows))
+    for row in rows:
+        apply_closed(summaries[row.user_id], row, new_status)
+
+
+def summary_to_dict(summary: Optional[UserOrderSummary], restaurant_names: Dict[int, str] = None) -> dict:
+    if summary is None:
+        return {
+            "orderCount": 0, "activeCount": 0, "deliveredCount": 0, "cancelledCount": 0,
+            "totalSpent": 0.0, "favouriteRestaurants": [], "firstOrderAt": None, "lastOrderAt": None
+        }
+    return {
+        "orderCount": summary.order_count,
+        "activeCount": summary.active_count,
+        "deliveredCount": summary.delivered_count,
+        "cancelledCount": summary.cancelled_count,
+        "totalSpent": round(summary.total_spent, 2),
+        "favouriteRestaurants": [
+            {"restaurantId": restaurant_id, "name": (restaurant_names or {}).get(restaurant_id), "orderCount": count}
+            for restaurant_id, count in favourites(summary)
+        ],
+        "firstOrderAt": summary.first_order_at,
+        "lastOrderAt": summary.last_order_at
+    }
+
+
+def favourites(summary: UserOrderSummary, limit: int = FAVOURITES) -> List[tuple]:
+    """(restaurant id, order count) pairs, most ordered first"""
+    counts = [(int(key), count) for key, count in (summary.restaurant_counts or {}).items()]
+    return sorted(counts, key=lambda pair: (-pair[1], pair[0]))[:limit]
+
+
+# ============================================
+# REBUILD
+# ============================================
+
+def rebuild_summaries(db: Session) -> int:
+    """Recompute every summary on this database from orders and the archive index
+
+    Run while order writes are paused (like the other rebuild jobs): orders
+    written during the rebuild may be counted twice or not at all.
+    """
+    summaries: Dict[int, dict] = {}
+    restaurant_counts = defaultdict(dict)
+
+    for model in (Order, ArchivedOrder):
+        active = case((model.status.in_(ACTIVE_STATUSES), 1), else_=0)
+        delivered = case((model.status == "DELIVERED", 1), else_=0)
+        cancelled = case((model.status == "CANCELLED", 1), else_=0)
+        spent = case((model.status != "CANCELLED", model.total_amount), else_=0.0)
+        per_user = db.execute(
+            select(
+                model.user_id, func.count(), func.sum(active), func.sum(delivered), func.sum(cancelled),
+                func.sum(spent), func.min(model.created_at), func.max(model.created_at)
+            ).group_by(model.user_id)
+        ).all()
+        for user_id, count, active_count, delivered_count, cancelled_count, total, first, last in per_user:
+            summary = summaries.setdefault(user_id, {
+                "user_id": user_id, "order_count": 0, "active_count": 0, "delivered_count": 0,
+                "cancelled_count": 0, "total_spent": 0.0, "first_order_at": first, "last_order_at": last
+            })
+            summary["order_count"] += count
+            summary["active_count"] += active_count or 0
+            summary["delivered_count"] += delivered_count or 0
+            summary["cancelled_count"] += cancelled_count or 0
+            summary["total_spent"] += total or 0.0
+            summary["first_order_at"] = min(filter(None, (summary["first_order_at"], first)), default=None)
+            summary["last_order_at"] = max(filter(None, (summary["last_order_at"], last)), default=None)
+
+        per_restaurant = db.execute(
+            select(model.user_id, model.restaurant_id, func.count()).where(
+                model.status != "CANCELLED"
+            ).group_by(model.user_id, model.restaurant_id)
+        ).all()
+        for user_id, restaurant_id, count in per_restaurant:
+            counts = restaurant_counts[user_id]
+            counts[str(restaurant_id)] = counts.get(str(restaurant_id), 0) + count
+
+    db.query(UserOrderSummary).delete()
+    if summaries:
+        db.bulk_insert_mappings(UserOrderSummary, [
+            dict(summary, restaurant_counts=restaurant_counts.get(user_id, {}), updated_at=datetime.utcnow())
+            for user_id, summary in summaries.items()
+        ])
+    db.commit()
+    return len(summaries)
+
+
+if __name__ == "__main__":
+    import sys
+    import sharding
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("Usage: python order_summary.py rebuild")
+    rebuilt = sharding.for_each_shard(rebuild_summaries)
+    print(f"✅ Rebuilt {sum(rebuilt)} order summaries on {len(rebuilt)} shard(s)")
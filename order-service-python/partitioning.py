@@ -0,0 +1,248 @@
+"""
+Orders table partitioning
+Monthly range partitions on orders.created_at (PostgreSQL only)
+
+On PostgreSQL a fresh database gets `orders` as a partitioned table with
+one partition per month plus a DEFAULT catch-all, so history queries and
+index maintenance only touch the months they need and old months can be
+dropped once archived. Other databases (SQLite for local development and
+tests) keep the plain single table created from the ORM model.
+"""
+
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+import os
+import re
+
+from database import Base
+from models import Order
+
+MONTHS_AHEAD = int(os.getenv("ORDER_PARTITION_MONTHS_AHEAD", "3"))
+
+# Mirrors models.Order; the primary key must include the partition key
+PARTITIONED_ORDERS_DDL = """
+CREATE TABLE orders (
+    id SERIAL,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    restaurant_id INTEGER NOT NULL REFERENCES restaurants(id),
+    items JSON,
+    total_amount DOUBLE PRECISION NOT NULL,
+    delivery_address TEXT NOT NULL,
+    status VARCHAR,
+    payment_status VARCHAR,
+    version INTEGER NOT NULL DEFAULT 1,
+    dispatched_at TIMESTAMP,
+    dispatch_claimed_at TIMESTAMP,
+    dispatch_attempts INTEGER DEFAULT 0,
+    out_for_delivery_at TIMESTAMP,
+    rating INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    updated_at TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at)
+"""
+
+PARTITIONED_ORDERS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_orders_id ON orders (id)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_user_created ON orders (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_dispatch_queue ON orders (created_at) "
+    "WHERE status = 'PENDING' AND dispatched_at IS NULL",
+    "CREATE TABLE IF NOT EXISTS orders_default PARTITION OF orders DEFAULT",
+]
+
+
+# Columns added after the first release, in case the legacy table predates them
+LEGACY_COLUMN_FIXUPS = [
+    "ALTER TABLE orders_legacy ADD COLUMN IF NOT EXISTS version INTEGER DEFAULT 1",
+    # Orders placed before the dispatch queue were notified inline already
+    "ALTER TABLE orders_legacy ADD COLUMN IF NOT EXISTS dispatched_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')",
+    "ALTER TABLE orders_legacy ADD COLUMN IF NOT EXISTS dispatch_claimed_at TIMESTAMP",
+    "ALTER TABLE orders_legacy ADD COLUMN IF NOT EXISTS dispatch_attempts INTEGER DEFAULT 0",
+    "ALTER TABLE orders_legacy ADD COLUMN IF NOT EXISTS out_for_delivery_at TIMESTAMP",
+    "ALTER TABLE orders_legacy ADD COLUMN IF NOT EXISTS rating INTEGER",
+]
+
+# Copied as-is unless listed here
+LEGACY_COLUMN_COPY = {
+    "version": "COALESCE(version, 1)",
+    "created_at": "COALESCE(created_at, now() AT TIME ZONE 'utc')",
+}
+
+
+def copy_legacy_orders_sql() -> str:
+    """INSERT ... SELECT of every models.Order column from orders_legacy"""
+    columns = [column.name for column in Order.__table__.columns]
+    return (
+        f"INSERT INTO orders ({', '.join(columns)}) "
+        f"SELECT {', '.join(LEGACY_COLUMN_COPY.get(column, column) for column in columns)} "
+        "FROM orders_legacy"
+    )
+
+
+def is_postgres(engine: Engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def is_partitioned(engine: Engine) -> bool:
+    """True if orders is a PostgreSQL partitioned table"""
+    if not is_postgres(engine):
+        return False
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = 'orders'"
+        )).first() is not None
+
+
+def _month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(ts: datetime, months: int) -> datetime:
+    month = ts.month - 1 + months
+    return ts.replace(year=ts.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"orders_y{month.year}m{month.month:02d}"
+
+
+def create_tables(engine: Engine):
+    """Create all tables, using a partitioned orders table on PostgreSQL"""
+    if not is_postgres(engine):
+        Base.metadata.create_all(bind=engine)
+        return
+
+    others = [t for t in Base.metadata.sorted_tables if t.name != "orders"]
+    Base.metadata.create_all(bind=engine, tables=others)
+
+    if not inspect(engine).has_table("orders"):
+        with engine.begin() as conn:
+            conn.execute(text(PARTITIONED_ORDERS_DDL))
+            for ddl in PARTITIONED_ORDERS_INDEXES:
+                conn.execute(text(ddl))
+
+    ensure_partitions(engine)
+
+
+# Tables held by every order shard (see sharding.py)
+SHARD_TABLES = ("orders", "archived_orders", "user_order_summaries")
+
+
+def create_shard_tables(engine: Engine):
+    """Create the order tables of one shard
+
+    Users and restaurants live on the main database, so shard tables carry
+    no foreign keys (SQLite does not enforce the model's REFERENCES).
+    """
+    tables = [Base.metadata.tables[name] for name in SHARD_TABLES]
+    if not is_postgres(engine):
+        Base.metadata.create_all(bind=engine, tables=tables)
+        return
+
+    Base.metadata.create_all(bind=engine, tables=[t for t in tables if t.name != "orders"])
+    if not inspect(engine).has_table("orders"):
+        with engine.begin() as conn:
+            conn.execute(text(re.sub(r" REFERENCES \w+\(id\)", "", PARTITIONED_ORDERS_DDL)))
+            for ddl in PARTITIONED_ORDERS_INDEXES:
+                conn.execute(text(ddl))
+
+    ensure_partitions(engine)
+
+
+def ensure_partitions(engine: Engine, months_ahead: int = MONTHS_AHEAD, now: datetime = None) -> list:
+    """Create monthly partitions from the current month up to N months ahead"""
+    if not is_partitioned(engine):
+        return []
+
+    start = _month_start(now or datetime.utcnow())
+    created = []
+    with engine.begin() as conn:
+        for offset in range(months_ahead + 1):
+            month = _add_months(start, offset)
+            name = partition_name(month)
+            exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+            if exists:
+                continue
+            conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF orders "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"
+            ))
+            created.append(name)
+    return created
+
+
+def drop_empty_partitions(engine: Engine, before: datetime) -> list:
+    """Drop monthly partitions that end before 'before' and hold no rows"""
+    if not is_partitioned(engine):
+        return []
+
+    dropped = []
+    with engine.begin() as conn:
+        names = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'orders' AND c.relname LIKE 'orders_y%'"
+        )).scalars().all()
+
+        for name in names:
+            month = datetime.strptime(name, "orders_y%Ym%m")
+            if _add_months(month, 1) > before:
+                continue
+            if conn.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first():
+                continue
+            conn.execute(text(f"ALTER TABLE orders DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def convert_existing_orders(engine: Engine) -> int:
+    """One-off migration of a plain orders table to the partitioned layout
+
+    Runs in a single transaction: the old table is renamed, the partitioned
+    table and all monthly partitions covering existing rows are created,
+    rows are copied with their ids and the id sequence is advanced.
+    """
+    if not is_postgres(engine) or is_partitioned(engine):
+        return 0
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE orders RENAME TO orders_legacy"))
+        for ddl in LEGACY_COLUMN_FIXUPS:
+            conn.execute(text(ddl))
+        conn.execute(text("ALTER SEQUENCE IF EXISTS orders_id_seq RENAME TO orders_legacy_id_seq"))
+        conn.execute(text("ALTER INDEX IF EXISTS ix_orders_id RENAME TO ix_orders_legacy_id"))
+        conn.execute(text(PARTITIONED_ORDERS_DDL))
+        for ddl in PARTITIONED_ORDERS_INDEXES:
+            conn.execute(text(ddl))
+
+        oldest, newest = conn.execute(text(
+            "SELECT min(created_at), max(created_at) FROM orders_legacy"
+        )).one()
+        month = _month_start(oldest or datetime.utcnow())
+        last = _month_start(max(newest or month, datetime.utcnow()))
+        while month <= last:
+            conn.execute(text(
+                f"CREATE TABLE {partition_name(month)} PARTITION OF orders "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"
+            ))
+            month = _add_months(month, 1)
+
+        copied = conn.execute(text(copy_legacy_orders_sql())).rowcount
+        conn.execute(text(
+            "SELECT setval('orders_id_seq', COALESCE((SELECT max(id) FROM orders), 0) + 1, false)"
+        ))
+        conn.execute(text("DROP TABLE orders_legacy"))
+
+    ensure_partitions(engine)
+    return copied
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    print(f"✅ Converted orders table, copied {convert_existing_orders(engine)} rows")
+    print(f"✅ Partitions ready: {ensure_partitions(engine) or 'no new partitions needed'}")
@@ -0,0 +1,261 @@
+"""
+Menu item popularity
+Time-decayed popularity scores maintained incrementally from new orders
+
+Scores use forward decay: an order placed at time t adds
+quantity * exp((t - L) / TAU) to the item's stored score, L being a
+landmark time. Every item decays at the same rate, so ranking by the
+stored value is ranking by recent demand, and each new order is a single
+additive UPDATE with no read-modify-write. The live score is
+stored * exp(-(now - L) / TAU).
+
+The weights grow without bound, so the landmark moves forward every
+RENORMALIZE_TAUS decay constants (a landmark "epoch") and weights never
+exceed e^RENORMALIZE_TAUS, far below the float limit (e^709). Each row
+records the epoch its score is relative to. On the first order of a new
+epoch, rescale_scores() multiplies the older scores by the landmark shift
+with one guarded UPDATE (each row converts exactly once, whichever
+process gets there first); increments apply the same conversion to their
+own row, so a score is never added to one of another scale.
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import bindparam, case, event
+from sqlalchemy.orm import Session
+import math
+import os
+import threading
+import time
+
+from database import SessionLocal, ShardSessions
+from models import MenuItem, Order
+
+HALF_LIFE_DAYS = float(os.getenv("POPULARITY_HALF_LIFE_DAYS", "7"))
+TAU_SECONDS = HALF_LIFE_DAYS * 86400 / math.log(2)
+
+# Landmark of epoch 0; epoch n starts n * EPOCH_SECONDS later
+EPOCH = datetime(2025, 1, 1)
+RENORMALIZE_TAUS = 64
+EPOCH_SECONDS = RENORMALIZE_TAUS * TAU_SECONDS
+
+# A score one epoch old shrinks by this when rescaled; older ones become 0
+# (less than e^-128 of their weight, below any score that matters)
+EPOCH_CARRY = math.exp(-RENORMALIZE_TAUS)
+
+TOP_K = int(os.getenv("POPULARITY_TOP_K", "10"))
+MAX_LIMIT = 100  # largest ?limit= served
+CACHE_TTL_SECONDS = float(os.getenv("POPULARITY_CACHE_TTL", "60"))
+
+
+def epoch_of(ts: datetime) -> int:
+    return int((ts - EPOCH).total_seconds() // EPOCH_SECONDS)
+
+
+def landmark(epoch: int) -> datetime:
+    return EPOCH + timedelta(seconds=epoch * EPOCH_SECONDS)
+
+
+def decay_weight(ts: datetime, epoch: Optional[int] = None) -> float:
+    """Forward-decay weight for an event at ts, relative to epoch (default: ts's own)"""
+    if epoch is None:
+        epoch = epoch_of(ts)
+    return math.exp((ts - landmark(epoch)).total_seconds() / TAU_SECONDS)
+
+
+def current_score(stored: float, epoch: int = 0, now: datetime = None) -> float:
+    """Convert a stored score (relative to epoch) to its value at 'now'"""
+    elapsed = ((now or datetime.utcnow()) - landmark(epoch or 0)).total_seconds()
+    return (stored or 0.0) * math.exp(-elapsed / TAU_SECONDS)
+
+
+def rescaled(stored: float, stored_epoch: int, epoch: int) -> float:
+    """A stored score converted to a later epoch"""
+    shift = epoch - (stored_epoch or 0)
+    if shift <= 0:
+        return stored or 0.0
+    return (stored or 0.0) * EPOCH_CARRY if shift == 1 else 0.0
+
+
+_score = MenuItem.__table__.c.popularity_score
+_epoch = MenuItem.__table__.c.popularity_epoch
+
+# Stored score converted to :epoch, in SQL (mirrors rescaled())
+_rescaled_score = case(
+    (_epoch == bindparam("epoch"), _score),
+    (_epoch == bindparam("epoch") - 1, _score * EPOCH_CARRY),
+    else_=0.0
+)
+
+# Score bumps are not catalog edits: updated_at is left alone so the
+# catalog refresher (warmup.py) does not rebuild on every order
+_increment_stmt = MenuItem.__table__.update().where(
+    MenuItem.__table__.c.id == bindparam("item_id"),
+    MenuItem.__table__.c.restaurant_id == bindparam("rid"),
+).values(
+    popularity_score=_rescaled_score + bindparam("delta"),
+    popularity_epoch=bindparam("epoch"),
+    updated_at=MenuItem.__table__.c.updated_at
+)
+
+_rescale_stmt = MenuItem.__table__.update().where(
+    (_epoch < bindparam("epoch")) | _epoch.is_(None)
+).values(
+    popularity_score=_rescaled_score,
+    popularity_epoch=bindparam("epoch"),
+    updated_at=MenuItem.__table__.c.updated_at
+)
+
+# Latest epoch this process has rescaled the table to (and committed)
+_rescaled_epoch = {"epoch": None}
+
+
+def rescale_scores(db: Session, epoch: int):
+    """Move every score older than epoch to it (caller commits; no-op once committed)"""
+    if _rescaled_epoch["epoch"] is not None and _rescaled_epoch["epoch"] >= epoch:
+        return
+    db.execute(_rescale_stmt, {"epoch": epoch})
+    db.info["popularity_rescaled_epoch"] = epoch
+
+
+@event.listens_for(Session, "after_commit")
+def _rescale_committed(session: Session):
+    epoch = session.info.pop("popularity_rescaled_epoch", None)
+    if epoch is not None:
+        _rescaled_epoch["epoch"] = max(epoch, _rescaled_epoch["epoch"] or epoch)
+        _top_k.clear()
+
+
+@event.listens_for(Session, "after_rollback")
+def _rescale_rolled_back(session: Session):
+    # Rolled back with the transaction: the next order runs the UPDATE again
+    session.info.pop("popularity_rescaled_epoch", None)
+
+
+def record_order_items(db: Session, restaurant_id: int, items: List[dict], ordered_at: datetime = None):
+    """Add an order's item quantities to popularity scores (caller commits)"""
+    ordered_at = ordered_at or datetime.utcnow()
+    epoch = max(epoch_of(ordered_at), epoch_of(datetime.utcnow()))
+    rescale_scores(db, epoch)
+    weight = decay_weight(ordered_at, epoch)
+
+    deltas = {}
+    for item in items:
+        item_id = item.get("menuItemId")
+        if item_id is not None:
+            deltas[item_id] = deltas.get(item_id, 0.0) + int(item.get("quantity", 0)) * weight
+
+    if deltas:
+        db.execute(_increment_stmt, [
+            {"item_id": item_id, "rid": restaurant_id, "delta": delta, "epoch": epoch}
+            for item_id, delta in deltas.items()
+        ])
+
+
+def rebuild_scores(db: Session) -> int:
+    """Recompute every score from the orders of every shard (backfill)
+
+    Archived orders are past the retention window, where their weight is
+    negligible, so they are not read.
+    """
+    db.query(MenuItem).update(
+        {MenuItem.popularity_score: 0.0, MenuItem.popularity_epoch: epoch_of(datetime.utcnow())},
+        synchronize_session=False
+    )
+
+    count = 0
+    for factory in ShardSessions:
+        shard_db = db if factory is SessionLocal else factory()
+        try:
+            for order in shard_db.query(Order).filter(Order.status != "CANCELLED").yield_per(1000):
+                record_order_items(db, order.restaurant_id, order.items or [], order.created_at)
+                count += 1
+        finally:
+            if shard_db is not db:
+                shard_db.close()
+
+    db.commit()
+    _top_k.clear()
+    return count
+
+
+# ============================================
+# TOP-K CACHE
+# ============================================
+
+class TopKCache:
+    """Per-restaurant cache of the K most popular available items
+
+    A request for more than K items reloads the entry with that many, so
+    the cache holds the longest ranking asked for within the TTL.
+    """
+
+    def __init__(self, k: int = TOP_K, ttl: float = CACHE_TTL_SECONDS):
+        self.k = k
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, restaurant_id: int, limit: int = None) -> List[dict]:
+        limit = limit or self.k
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(restaurant_id)
+        # (expires, ranking, rows asked for); a shorter ranking is complete
+        if entry and entry[0] > now and (entry[2] >= limit or len(entry[1]) < entry[2]):
+            return entry[1][:limit]
+
+        fetch = max(self.k, limit)
+
+        items = db.query(MenuItem).filter(
+            MenuItem.restaurant_id == restaurant_id,
+            MenuItem.is_available == True
+        ).order_by(
+            MenuItem.popularity_score.desc(), MenuItem.id
+        ).limit(fetch).all()
+
+        now_utc = datetime.utcnow()
+        ranked = [{
+            "id": item.id,
+            "name": item.name,
+            "description": item.description,
+            "price": item.price,
+            "category": item.category,
+            "image": item.image,
+            "popularity": round(current_score(item.popularity_score, item.popularity_epoch, now_utc), 3)
+        } for item in items]
+
+        with self._lock:
+            self._entries[restaurant_id] = (now + self.ttl, ranked, fetch)
+        return ranked[:limit]
+
+    def invalidate(self, restaurant_id: int):
+        with self._lock:
+            self._entries.pop(restaurant_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_top_k = TopKCache()
+
+
+def get_popular_items(db: Session, restaurant_id: int, limit: int = TOP_K) -> List[dict]:
+    """Most popular items for a restaurant, served from the top-K cache"""
+    return _top_k.get(db, restaurant_id, limit)
+
+
+def invalidate(restaurant_id: int):
+    """Drop a restaurant's cached ranking (call after commit)"""
+    _top_k.invalidate(restaurant_id)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"✅ Rebuilt popularity scores from {rebuild_scores(db)} orders")
+    finally:
+        db.close()
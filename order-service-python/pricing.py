@@ -0,0 +1,323 @@
+"""
+Cart pricing
+Quotes priced from cached menu price tables and precompiled fee/promo rules
+
+A quote needs one dict lookup per cart line: each restaurant's available
+items and prices are loaded once into a PriceTable (kept in a local LRU,
+dropped on menu changes), and the fee/promotion rules are compiled into
+plain functions when the module loads. All arithmetic is in paise.
+
+Every quote carries a signed token (HMAC-SHA256 over the priced cart,
+user and expiry). create_order accepts the token and books the quoted
+prices and total as-is instead of pricing the cart again.
+
+Rules come from DEFAULT_RULES, or from the JSON file in PRICING_RULES_FILE.
+"""
+
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from auth import SECRET_KEY
+from repositories import open_repository
+from shared_cache import LRUCache
+
+PRICE_TABLE_TTL_SECONDS = float(os.getenv("PRICE_TABLE_TTL", "300"))
+QUOTE_TTL_SECONDS = int(os.getenv("QUOTE_TTL", "900"))
+MAX_QUANTITY = int(os.getenv("MAX_ITEM_QUANTITY", "50"))
+
+# Amounts in rupees
+DEFAULT_RULES = {
+    "taxRate": 0.05,  # GST on food, charged on the discounted subtotal
+    "fees": [
+        {"code": "DELIVERY", "label": "Delivery fee", "amount": 40, "waiveAtOrAbove": 499},
+        {"code": "PACKAGING", "label": "Packaging", "perItem": 5, "max": 50},
+        {"code": "SMALL_ORDER", "label": "Small order fee", "amount": 25, "below": 150},
+    ],
+    "promotions": [
+        {"code": "WELCOME50", "type": "flat", "value": 50, "minSubtotal": 200},
+        {"code": "SAVE10", "type": "percent", "value": 10, "maxDiscount": 100},
+        {"code": "FREEDELIVERY", "type": "waive", "fee": "DELIVERY", "minSubtotal": 299},
+    ],
+}
+
+_QUOTE_KEY = hashlib.sha256(b"cart-quote:" + SECRET_KEY.encode()).digest()
+
+
+class QuoteError(ValueError):
+    """The cart cannot be priced (unknown items, closed restaurant, bad promo)"""
+
+
+def to_paise(rupees: float) -> int:
+    return int(round(rupees * 100))
+
+
+def to_rupees(paise: int) -> float:
+    return paise / 100
+
+
+# ============================================
+# RULES
+# ============================================
+
+class Fee:
+    __slots__ = ("code", "label", "charge")
+
+    def __init__(self, code: str, label: str, charge: Callable[[int, int], int]):
+        self.code = code
+        self.label = label
+        self.charge = charge  # (subtotal, item count) -> paise
+
+
+class Promotion:
+    __slots__ = ("code", "min_subtotal", "restaurants", "discount", "waives")
+
+    def __init__(self, code, min_subtotal, restaurants, discount, waives):
+        self.code = code
+        self.min_subtotal = min_subtotal
+        self.restaurants = restaurants  # None = every restaurant
+        self.discount = discount  # subtotal -> paise
+        self.waives = waives  # fee code or None
+
+
+class RuleSet:
+    def __init__(self, tax_rate: float, fees: List[Fee], promotions: Dict[str, Promotion]):
+        self.tax_rate = tax_rate
+        self.fees = fees
+        self.promotions = promotions
+
+
+def _compile_fee(rule: dict) -> Fee:
+    if "perItem" in rule:
+        per_item = to_paise(rule["perItem"])
+        cap = to_paise(rule["max"]) if "max" in rule else None
+        charge = (lambda s, n: min(n * per_item, cap)) if cap is not None else (lambda s, n: n * per_item)
+    else:
+        amount = to_paise(rule["amount"])
+        if "waiveAtOrAbove" in rule:
+            limit = to_paise(rule["waiveAtOrAbove"])
+            charge = lambda s, n: 0 if s >= limit else amount
+        elif "below" in rule:
+            limit = to_paise(rule["below"])
+            charge = lambda s, n: amount if s < limit else 0
+        else:
+            charge = lambda s, n: amount
+    return Fee(rule["code"], rule.get("label", rule["code"]), charge)
+
+
+def _compile_promotion(rule: dict) -> Promotion:
+    kind = rule["type"]
+    if kind == "flat":
+        value = to_paise(rule["value"])
+        discount = lambda s: min(value, s)
+    elif kind == "percent":
+        rate = rule["value"] / 100
+        cap = to_paise(rule["maxDiscount"]) if "maxDiscount" in rule else None
+        discount = (lambda s: min(int(s * rate), cap)) if cap is not None else (lambda s: int(s * rate))
+    elif kind == "waive":
+        discount = lambda s: 0
+    else:
+        raise ValueError(f"Unknown promotion type '{kind}'")
+    return Promotion(
+        rule["code"].upper(),
+        to_paise(rule.get("minSubtotal", 0)),
+        frozenset(rule["restaurants"]) if rule.get("restaurants") else None,
+        discount,
+        rule.get("fee") if kind == "waive" else None
+    )
+
+
+def compile_rules(config: dict) -> RuleSet:
+    return RuleSet(
+        config.get("taxRate", 0.0),
+        [_compile_fee(rule) for rule in config.get("fees", [])],
+        {promo.code: promo for promo in map(_compile_promotion, config.get("promotions", []))}
+    )
+
+
+def load_rules() -> RuleSet:
+    path = os.getenv("PRICING_RULES_FILE")
+    if path:
+        with open(path) as f:
+            return compile_rules(json.load(f))
+    return compile_rules(DEFAULT_RULES)
+
+
+rules = load_rules()
+
+
+# ============================================
+# PRICE TABLES
+# ============================================
+
+class PriceTable:
+    """Available items of one restaurant: id -> (price in paise, name)"""
+
+    __slots__ = ("restaurant_id", "is_open", "items")
+
+    def __init__(self, restaurant_id: int, is_open: bool, items: Dict[int, Tuple[int, str]]):
+        self.restaurant_id = restaurant_id
+        self.is_open = is_open
+        self.items = items
+
+
+class PriceTables:
+    """LRU of price tables; load() runs in a worker thread"""
+
+    def __init__(self, ttl: float = PRICE_TABLE_TTL_SECONDS):
+        self.ttl = ttl
+        self._tables = LRUCache()
+
+    def get(self, restaurant_id: int) -> Optional[PriceTable]:
+        return self._tables.get(restaurant_id)
+
+    def load(self, restaurant_id: int) -> Optional[PriceTable]:
+        with open_repository() as repo:
+            restaurant = repo.get_restaurant(restaurant_id)
+            if not restaurant:
+                return None
+            return self.put(restaurant, repo.list_menu(restaurant_id))
+
+    def put(self, restaurant, items) -> PriceTable:
+        """Store the table for a restaurant and its available menu items"""
+        table = PriceTable(restaurant.id, bool(restaurant.is_open), {
+            item.id: (to_paise(item.price), item.name) for item in items
+        })
+        self._tables.put(restaurant.id, table, self.ttl)
+        return table
+
+    def expires_in(self, restaurant_id: int) -> Optional[float]:
+        return self._tables.expires_in(restaurant_id)
+
+    def invalidate(self, restaurant_id: int):
+        self._tables.discard(lambda key: key == restaurant_id)
+
+    def clear(self, _=None):
+        self._tables.clear()
+
+
+price_tables = PriceTables()
+
+
+# ============================================
+# QUOTES
+# ============================================
+
+def quote(table: PriceTable, lines: List[Tuple[int, int]], promo_code: Optional[str], user_id: int) -> dict:
+    """Price (menu item id, quantity) lines; raises QuoteError"""
+    if not table.is_open:
+        raise QuoteError("Restaurant is closed")
+    if not lines:
+        raise QuoteError("Cart is empty")
+
+    # Merge repeated items so the token describes the cart canonically
+    quantities: Dict[int, int] = {}
+    for item_id, quantity in lines:
+        if quantity < 1 or quantity > MAX_QUANTITY:
+            raise QuoteError(f"Quantity must be between 1 and {MAX_QUANTITY}")
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+
+    missing = [item_id for item_id in quantities if item_id not in table.items]
+    if missing:
+        raise QuoteError(f"Items not available: {', '.join(map(str, missing))}")
+
+    priced = []
+    subtotal = count = 0
+    for item_id, quantity in sorted(quantities.items()):
+        unit, name = table.items[item_id]
+        priced.append((item_id, quantity, unit, name))
+        subtotal += unit * quantity
+        count += quantity
+
+    promo = None
+    discount = 0
+    if promo_code:
+        promo = rules.promotions.get(promo_code.strip().upper())
+        if promo is None:
+            raise QuoteError(f"Unknown promo code '{promo_code}'")
+        if subtotal < promo.min_subtotal:
+            raise QuoteError(f"{promo.code} needs a subtotal of at least {to_rupees(promo.min_subtotal):.2f}")
+        if promo.restaurants is not None and table.restaurant_id not in promo.restaurants:
+            raise QuoteError(f"{promo.code} is not valid for this restaurant")
+        discount = promo.discount(subtotal)
+
+    fees = []
+    for fee in rules.fees:
+        amount = 0 if promo and promo.waives == fee.code else fee.charge(subtotal, count)
+        if amount:
+            fees.append((fee, amount))
+
+    tax = int(round((subtotal - discount) * rules.tax_rate))
+    total = subtotal - discount + sum(amount for _, amount in fees) + tax
+    expires = int(time.time()) + QUOTE_TTL_SECONDS
+
+    token = sign({
+        "u": user_id,
+        "r": table.restaurant_id,
+        "i": [[item_id, quantity, unit] for item_id, quantity, unit, _ in priced],
+        "t": total,
+        "p": promo.code if promo else None,
+        "x": expires
+    })
+
+    return {
+        "restaurantId": table.restaurant_id,
+        "items": [{
+            "menuItemId": item_id,
+            "name": name,
+            "quantity": quantity,
+            "unitPrice": to_rupees(unit),
+            "lineTotal": to_rupees(unit * quantity)
+        } for item_id, quantity, unit, name in priced],
+        "subtotal": to_rupees(subtotal),
+        "discount": to_rupees(discount),
+        "promoCode": promo.code if promo else None,
+        "fees": [{"code": fee.code, "label": fee.label, "amount": to_rupees(amount)} for fee, amount in fees],
+        "tax": to_rupees(tax),
+        "total": to_rupees(total),
+        "quoteToken": token,
+        "expiresAt": datetime.utcfromtimestamp(expires).isoformat()
+    }
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def sign(payload: dict) -> str:
+    body = _b64(json.dumps(payload, separators=(",", ":")).encode())
+    signature = hmac.new(_QUOTE_KEY, body.encode(), hashlib.sha256).digest()[:16]
+    return f"{body}.{_b64(signature)}"
+
+
+def verify(token: str, user_id: int) -> Optional[dict]:
+    """Payload of a valid, unexpired quote token issued to user_id"""
+    body, _, signature = token.partition(".")
+    expected = hmac.new(_QUOTE_KEY, body.encode(), hashlib.sha256).digest()[:16]
+    try:
+        if not hmac.compare_digest(_unb64(signature), expected):
+            return None
+        payload = json.loads(_unb64(body))
+    except ValueError:
+        return None
+    if payload.get("u") != user_id or payload.get("x", 0) < time.time():
+        return None
+    return payload
+
+
+def quoted_order(payload: dict) -> Tuple[List[dict], float]:
+    """Order items (with quoted unit prices) and total from a verified token"""
+    items = [
+        {"menuItemId": item_id, "quantity": quantity, "price": to_rupees(unit)}
+        for item_id, quantity, unit in payload["i"]
+    ]
+    return items, to_rupees(payload["t"])
@@ -0,0 +1,152 @@
+"""
+On-demand sampling profiler
+Samples the live process' thread stacks without restarting the worker
+
+A background thread wakes every few milliseconds, snapshots
+sys._current_frames() and counts identical stacks. Results can be
+exported as collapsed stacks (flamegraph.pl / speedscope import) or as a
+speedscope JSON file.
+"""
+
+from collections import Counter, deque
+from typing import Optional, Set
+import os
+import sys
+import threading
+import time
+import uuid
+
+SAMPLE_INTERVAL = float(os.getenv("PROFILER_INTERVAL_MS", "5")) / 1000
+MAX_DURATION_SECONDS = 60
+FORMATS = ("collapsed", "speedscope")
+
+# Only one profiling session at a time per worker
+_session_lock = threading.Lock()
+
+# Recent per-request profiles, fetched by id
+_recent = {}
+_recent_order = deque(maxlen=20)
+
+
+class Profile:
+    """Aggregated stack samples"""
+
+    def __init__(self, counts: Counter, duration: float, interval: float, name: str):
+        self.counts = counts
+        self.duration = duration
+        self.interval = interval
+        self.name = name
+
+    @property
+    def samples(self) -> int:
+        return sum(self.counts.values())
+
+    def to_collapsed(self) -> str:
+        """Brendan Gregg collapsed-stack format, one 'a;b;c count' per line"""
+        return "".join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in self.counts.most_common()
+        )
+
+    def to_speedscope(self) -> dict:
+        """speedscope.app sampled profile"""
+        frame_index = {}
+        frames = []
+        samples = []
+        weights = []
+
+        for stack, count in self.counts.items():
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame})
+                indices.append(frame_index[frame])
+            samples.append(indices)
+            weights.append(count * self.interval)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": samples,
+                "weights": weights
+            }],
+            "name": self.name,
+            "exporter": "order-service"
+        }
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """Sample the stacks of all (or selected) threads at a fixed interval"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, thread_ids: Optional[Set[int]] = None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, name: str = "order-service") -> Profile:
+        """Stop sampling (safe to call if start failed) and return the profile"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return Profile(self.counts, time.perf_counter() - self._started, self.interval, name)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stack.reverse()
+                self.counts[tuple(stack)] += 1
+
+
+def acquire_session() -> bool:
+    """Reserve the profiler; False if another session is running"""
+    return _session_lock.acquire(blocking=False)
+
+
+def release_session():
+    _session_lock.release()
+
+
+def store(profile: Profile) -> str:
+    """Keep a per-request profile for later download, returns its id"""
+    profile_id = uuid.uuid4().hex[:12]
+    if len(_recent_order) == _recent_order.maxlen:
+        _recent.pop(_recent_order[0], None)
+    _recent_order.append(profile_id)
+    _recent[profile_id] = profile
+    return profile_id
+
+
+def get_stored(profile_id: str) -> Optional[Profile]:
+    return _recent.get(profile_id)
@@ -0,0 +1,621 @@
+"""
+Repository layer
+Data access for users, restaurants, menu items and orders
+
+Handlers talk to a Repository instead of a Session, so the API can run on
+either backend, selected with REPOSITORY_BACKEND:
+
+- sql (default): SqlRepository over the SQLAlchemy session
+- memory: InMemoryRepository, dict-based with secondary indexes, seeded
+  from seed.py; for fast unit tests, load-test baselines and local runs
+  without a database
+
+Records are the ORM model classes in both backends (transient instances
+in memory), so response code does not care which backend produced them.
+Features that are inherently SQL (analytics rollups, archive, dispatch
+queue, status transitions, ...) keep using the session and answer 501 on
+the memory backend.
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import Float, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import itertools
+import logging
+import os
+import threading
+
+from fastapi import HTTPException
+
+import database
+from models import User, Restaurant, RestaurantCard, MenuItem, Order, UserOrderSummary
+import analytics
+import order_summary
+import popularity
+import restaurant_cards
+import sharding
+
+BACKEND = os.getenv("REPOSITORY_BACKEND", "sql")  # sql, memory
+
+logger = logging.getLogger(__name__)
+
+
+class DuplicateError(ValueError):
+    """A unique field (email, username) is already taken"""
+
+    def __init__(self, field: str):
+        super().__init__(f"Duplicate {field}")
+        self.field = field
+
+
+def duplicate_field(error: IntegrityError) -> Optional[str]:
+    """"email"/"username" for a users unique-constraint violation, else None"""
+    # PostgreSQL names the constraint (users_email_key / ix_users_email);
+    # SQLite only says "UNIQUE constraint failed: users.email"
+    diag = getattr(getattr(error, "orig", None), "diag", None)
+    text = getattr(diag, "constraint_name", None) or str(getattr(error, "orig", error))
+    for field in ("username", "email"):
+        if field in text:
+            return field
+    return None
+
+
+class Repository(ABC):
+    """Interface shared by every backend"""
+
+    # Users
+    @abstractmethod
+    def get_user(self, user_id: int) -> Optional[User]: ...
+
+    @abstractmethod
+    def get_user_by_email(self, email: str) -> Optional[User]: ...
+
+    @abstractmethod
+    def get_user_by_username(self, username: str) -> Optional[User]: ...
+
+    @abstractmethod
+    def add_user(self, user: User) -> User: ...
+
+    @abstractmethod
+    def taken_identities(self, emails: Iterable[str], usernames: Iterable[str]) -> Tuple[Set[str], Set[str]]: ...
+
+    @abstractmethod
+    def add_users(self, records: List[dict]) -> List[Optional[str]]: ...
+
+    # Restaurants
+    @abstractmethod
+    def get_restaurant(self, restaurant_id: int) -> Optional[Restaurant]: ...
+
+    @abstractmethod
+    def get_restaurants(self, restaurant_ids: Iterable[int]) -> Dict[int, Restaurant]: ...
+
+    @abstractmethod
+    def list_open_restaurants(self) -> List[Restaurant]: ...
+
+    @abstractmethod
+    def list_restaurant_cards(self, sort: Optional[str] = None) -> List[RestaurantCard]: ...
+
+    @abstractmethod
+    def get_restaurant_card(self, restaurant_id: int) -> Optional[RestaurantCard]: ...
+
+    @abstractmethod
+    def get_restaurant_cards(self, restaurant_ids: Iterable[int]) -> Dict[int, RestaurantCard]: ...
+
+    @abstractmethod
+    def changed_restaurants(self, since: datetime) -> Set[int]: ...
+
+    # Menu items (available only)
+    @abstractmethod
+    def list_menu(self, restaurant_id: int, sort: Optional[str] = None) -> List[MenuItem]: ...
+
+    @abstractmethod
+    def list_menus(self, restaurant_ids: Iterable[int]) -> Dict[int, List[MenuItem]]: ...
+
+    # Orders
+    @abstractmethod
+    def add_order(self, order: Order) -> Order: ...
+
+    @abstractmethod
+    def get_order(self, order_id: int, user_id: int) -> Optional[Order]: ...
+
+    @abstractmethod
+    def list_user_orders(self, user_id: int) -> List[Order]: ...
+
+    @abstractmethod
+    def get_order_summary(self, user_id: int) -> Optional[UserOrderSummary]: ...
+
+    @abstractmethod
+    def rate_order(self, order_id: int, user_id: int, rating: int) -> bool: ...
+
+
+# ============================================
+# SQLALCHEMY BACKEND
+# ============================================
+
+class SqlRepository(Repository):
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._shards: Dict[int, Session] = {}
+
+    def orders_db(self, user_id: int) -> Session:
+        """Session holding this user's orders (the main session unless sharded)"""
+        if not database.is_sharded():
+            return self.db
+        index = database.shard_index(user_id)
+        if index not in self._shards:
+            self._shards[index] = database.ShardSessions[index]()
+        return self._shards[index]
+
+    def close(self):
+        for shard_db in self._shards.values():
+            shard_db.close()
+        self._shards.clear()
+
+    def get_user(self, user_id):
+        return self.db.query(User).filter(User.id == user_id).first()
+
+    def get_user_by_email(self, email):
+        return self.db.query(User).filter(User.email == email).first()
+
+    def get_user_by_username(self, username):
+        return self.db.query(User).filter(User.username == username).first()
+
+    def add_user(self, user):
+        """One INSERT; the unique constraints reject taken emails/usernames"""
+        try:
+            self.db.add(user)
+            self.db.flush()
+        except IntegrityError as e:
+            self.db.rollback()
+            field = duplicate_field(e)
+            if field is None:
+                raise
+            raise DuplicateError(field)
+        # Detach before committing: commit would expire the attributes and
+        # reading them back would cost another SELECT
+        self.db.expunge(user)
+        self.db.commit()
+        return user
+
+    def taken_identities(self, emails, usernames):
+        """Emails and usernames already registered, in one query"""
+        emails, usernames = set(emails), set(usernames)
+        if not emails and not usernames:
+            return set(), set()
+        rows = self.db.query(User.email, User.username).filter(
+            or_(User.email.in_(emails), User.username.in_(usernames))
+        ).all()
+        return {row.email for row in rows} & emails, {row.username for row in rows} & usernames
+
+    def add_users(self, records):
+        """Insert user rows with one multi-row INSERT
+
+        Returns None per inserted record. If a concurrent signup took an
+        email/username since taken_identities, the statement is retried row
+        by row and the losing records get "email"/"username" instead.
+        """
+        table = User.__table__
+        now = datetime.utcnow()
+        rows = [dict(record, created_at=now) for record in records]
+        try:
+            self.db.execute(insert(table), rows)
+            self.db.commit()
+            return [None] * len(rows)
+        except IntegrityError:
+            self.db.rollback()
+
+        results = []
+        for row in rows:
+            try:
+                self.db.execute(insert(table), [row])
+                self.db.commit()
+                results.append(None)
+            except IntegrityError as e:
+                self.db.rollback()
+                field = duplicate_field(e)
+                if field is None:
+                    raise
+                results.append(field)
+        return results
+
+    def get_restaurant(self, restaurant_id):
+        return self.db.query(Restaurant).filter(Restaurant.id == restaurant_id).first()
+
+    def get_restaurants(self, restaurant_ids):
+        ids = set(restaurant_ids)
+        if not ids:
+            return {}
+        return {r.id: r for r in self.db.query(Restaurant).filter(Restaurant.id.in_(ids)).all()}
+
+    def list_open_restaurants(self):
+        return self.db.query(Restaurant).filter(Restaurant.is_open == True).all()
+
+    def list_restaurant_cards(self, sort=None):
+        return restaurant_cards.list_cards(self.db, sort)
+
+    def get_restaurant_card(self, restaurant_id):
+        return restaurant_cards.get_card(self.db, restaurant_id)
+
+    def get_restaurant_cards(self, restaurant_ids):
+        ids = set(restaurant_ids)
+        if not ids:
+            return {}
+        return {
+            card.restaurant_id: card
+            for card in self.db.query(RestaurantCard).filter(RestaurantCard.restaurant_id.in_(ids)).all()
+        }
+
+    def changed_restaurants(self, since):
+        restaurants = self.db.query(Restaurant.id).filter(Restaurant.updated_at >= since)
+        menus = self.db.query(MenuItem.restaurant_id).filter(MenuItem.updated_at >= since)
+        return {restaurant_id for (restaurant_id,) in restaurants.union(menus).all()}
+
+    def list_menu(self, restaurant_id, sort=None):
+        query = self.db.query(MenuItem).filter(
+            MenuItem.restaurant_id == restaurant_id,
+            MenuItem.is_available == True
+        )
+        if sort == "popular":
+            query = query.order_by(MenuItem.popularity_score.desc(), MenuItem.id)
+        else:
+            query = query.order_by(MenuItem.id)
+        return query.all()
+
+    def list_menus(self, restaurant_ids):
+        grouped = {restaurant_id: [] for restaurant_id in restaurant_ids}
+        if not grouped:
+            return grouped
+        items = self.db.query(MenuItem).filter(
+            MenuItem.restaurant_id.in_(grouped),
+            MenuItem.is_available == True
+        ).order_by(MenuItem.restaurant_id, MenuItem.id).all()
+        for item in items:
+            grouped[item.restaurant_id].append(item)
+        return grouped
+
+    def add_order(self, order):
+        """Insert an order together with everything derived from it
+
+        Unsharded, one transaction of four statements: INSERT the order,
+        upsert the user's summary, INSERT the two rollup deltas and UPDATE
+        the items' popularity (one batch), then COMMIT.
+
+        Sharded, the same statements run on two databases: order and
+        summary on the user's shard, rollups and popularity on the main
+        database, each written before either commits. The shard commits
+        first; if the main commit then fails, the order is deleted again
+        (and its summary taken back) before the error is raised, so a
+        failed request leaves no order behind. The id comes from the hi/lo
+        allocator, which costs a main-database round trip every
+        ORDER_ID_BLOCK orders.
+        """
+        orders_db = self.orders_db(order.user_id)
+        if orders_db is not self.db:
+            order.id = sharding.order_ids.next_id()
+        self._write_order(orders_db, order)
+        self._write_aggregates(order)
+        # Detach before committing: commit would expire the attributes and
+        # reading them back would cost another SELECT
+        orders_db.expunge(order)
+        if orders_db is self.db:
+            self.db.commit()
+            return order
+
+        orders_db.commit()
+        try:
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            self._remove_order(orders_db, order)
+            raise
+        return order
+
+    def _write_order(self, orders_db: Session, order: Order):
+        orders_db.add(order)
+        orders_db.flush()
+        order_summary.record_order_created(orders_db, order)
+
+    def _write_aggregates(self, order: Order):
+        analytics.record_order_created(self.db, order)
+        popularity.record_order_items(self.db, order.restaurant_id, order.items, order.created_at)
+        self.db.flush()
+
+    def _remove_order(self, orders_db: Session, order: Order):
+        """Compensate a sharded order whose main-database writes failed"""
+        try:
+            orders_db.query(Order).filter(Order.id == order.id).delete(synchronize_session=False)
+            order_summary.record_order_removed(orders_db, order)
+            orders_db.commit()
+        except Exception:
+            orders_db.rollback()
+            logger.exception("Could not remove order after a failed write", extra={"orderId": order.id})
+
+    def get_order(self, order_id, user_id):
+        return self.orders_db(user_id).query(Order).filter(
+            Order.id == order_id,
+            Order.user_id == user_id
+        ).first()
+
+    def list_user_orders(self, user_id):
+        return self.orders_db(user_id).query(Order).filter(
+            Order.user_id == user_id
+        ).order_by(Order.created_at.desc()).all()
+
+    def get_order_summary(self, user_id):
+        return self.orders_db(user_id).get(UserOrderSummary, user_id)
+
+    def rate_order(self, order_id, user_id, rating):
+        orders_db = self.orders_db(user_id)
+        table = Order.__table__
+        rated = orders_db.execute(
+            table.update().where(
+                table.c.id == order_id,
+                table.c.user_id == user_id,
+                table.c.status == "DELIVERED",
+                table.c.rating.is_(None)
+            ).values(
+                rating=rating,
+                updated_at=table.c.updated_at  # keep the delivery time the ETA model reads
+            ).returning(table.c.restaurant_id, table.c.created_at)
+        ).first()
+        if rated is None:
+            orders_db.rollback()
+            return False
+        if orders_db is not self.db:
+            orders_db.commit()
+        # Restaurant cards pick the rating up from the rollups
+        analytics.record_order_rated(self.db, rated, rating)
+        self.db.commit()
+        return True
+
+
+# ============================================
+# IN-MEMORY BACKEND
+# ============================================
+
+def _apply_defaults(record):
+    """Fill unset attributes from the model's Python-side column defaults
+
+    Also coerces Float columns, as the database would on a round trip.
+    """
+    for column in record.__table__.columns:
+        value = getattr(record, column.key, None)
+        if value is None and column.default is not None:
+            default = column.default
+            value = default.arg(None) if default.is_callable else default.arg
+            setattr(record, column.key, value)
+        if isinstance(column.type, Float) and isinstance(value, int):
+            setattr(record, column.key, float(value))
+    return record
+
+
+class InMemoryRepository(Repository):
+    """Dict storage with the same lookups the SQL indexes serve"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ids = {name: itertools.count(1) for name in ("users", "restaurants", "menu_items", "orders")}
+
+        self.users: Dict[int, User] = {}
+        self.users_by_email: Dict[str, User] = {}
+        self.users_by_username: Dict[str, User] = {}
+
+        self.restaurants: Dict[int, Restaurant] = {}
+        self.menu_items: Dict[int, MenuItem] = {}
+        self.menu_by_restaurant: Dict[int, List[MenuItem]] = {}
+
+        self.orders: Dict[int, Order] = {}
+        self.orders_by_user: Dict[int, List[Order]] = {}
+        self.order_summaries: Dict[int, UserOrderSummary] = {}
+        self.popularity_epoch: Optional[int] = None  # scores last rescaled to (see popularity.py)
+
+    def _insert(self, table: str, record):
+        _apply_defaults(record)
+        if record.id is None:
+            record.id = next(self._ids[table])
+        return record
+
+    # Users
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    def get_user_by_email(self, email):
+        return self.users_by_email.get(email)
+
+    def get_user_by_username(self, username):
+        return self.users_by_username.get(username)
+
+    def add_user(self, user):
+        with self._lock:
+            if user.email in self.users_by_email:
+                raise DuplicateError("email")
+            if user.username in self.users_by_username:
+                raise DuplicateError("username")
+            self._insert("users", user)
+            self.users[user.id] = user
+            self.users_by_email[user.email] = user
+            self.users_by_username[user.username] = user
+        return user
+
+    def taken_identities(self, emails, usernames):
+        with self._lock:
+            return set(emails) & self.users_by_email.keys(), set(usernames) & self.users_by_username.keys()
+
+    def add_users(self, records):
+        results = []
+        for record in records:
+            try:
+                self.add_user(User(**record))
+                results.append(None)
+            except DuplicateError as e:
+                results.append(e.field)
+        return results
+
+    # Restaurants and menus
+
+    def add_restaurant(self, restaurant: Restaurant) -> Restaurant:
+        with self._lock:
+            self._insert("restaurants", restaurant)
+            self.restaurants[restaurant.id] = restaurant
+            self.menu_by_restaurant.setdefault(restaurant.id, [])
+        return restaurant
+
+    def add_menu_item(self, item: MenuItem) -> MenuItem:
+        with self._lock:
+            self._insert("menu_items", item)
+            self.menu_items[item.id] = item
+            self.menu_by_restaurant.setdefault(item.restaurant_id, []).append(item)
+        return item
+
+    def get_restaurant(self, restaurant_id):
+        return self.restaurants.get(restaurant_id)
+
+    def get_restaurants(self, restaurant_ids):
+        return {i: self.restaurants[i] for i in set(restaurant_ids) if i in self.restaurants}
+
+    def list_open_restaurants(self):
+        with self._lock:
+            return [r for r in self.restaurants.values() if r.is_open]
+
+    def list_restaurant_cards(self, sort=None):
+        return []  # no card table, callers build the list from the restaurants
+
+    def get_restaurant_card(self, restaurant_id):
+        return None
+
+    def get_restaurant_cards(self, restaurant_ids):
+        return {}
+
+    def changed_restaurants(self, since):
+        return set()  # the catalog only changes through this process, which invalidates directly
+
+    def list_menu(self, restaurant_id, sort=None):
+        with self._lock:
+            items = [item for item in self.menu_by_restaurant.get(restaurant_id, []) if item.is_available]
+        if sort == "popular":
+            items.sort(key=lambda item: (-(item.popularity_score or 0.0), item.id))
+        return items
+
+    def list_menus(self, restaurant_ids):
+        return {restaurant_id: self.list_menu(restaurant_id) for restaurant_id in restaurant_ids}
+
+    # Orders
+
+    def add_order(self, order):
+        with self._lock:
+            self._insert("orders", order)
+            self.orders[order.id] = order
+            # Newest first, matching list_user_orders
+            self.orders_by_user.setdefault(order.user_id, []).insert(0, order)
+            summary = self.order_summaries.get(order.user_id)
+            if summary is None:
+                summary = self.order_summaries[order.user_id] = _apply_defaults(
+                    UserOrderSummary(user_id=order.user_id, restaurant_counts={})
+                )
+            order_summary.apply_created(summary, order)
+
+            epoch = max(popularity.epoch_of(order.created_at), popularity.epoch_of(datetime.utcnow()))
+            if epoch != self.popularity_epoch:
+                for item in self.menu_items.values():
+                    item.popularity_score = popularity.rescaled(item.popularity_score, item.popularity_epoch, epoch)
+                    item.popularity_epoch = epoch
+                self.popularity_epoch = epoch
+            weight = popularity.decay_weight(order.created_at, epoch)
+            for line in order.items or []:
+                item = self.menu_items.get(line.get("menuItemId"))
+                if item is not None and item.restaurant_id == order.restaurant_id:
+                    item.popularity_score = (
+                        popularity.rescaled(item.popularity_score, item.popularity_epoch, epoch)
+                        + int(line.get("quantity", 0)) * weight
+                    )
+                    item.popularity_epoch = epoch
+        return order
+
+    def get_order(self, order_id, user_id):
+        order = self.orders.get(order_id)
+        return order if order is not None and order.user_id == user_id else None
+
+    def list_user_orders(self, user_id):
+        with self._lock:
+            return list(self.orders_by_user.get(user_id, []))
+
+    def get_order_summary(self, user_id):
+        return self.order_summaries.get(user_id)
+
+    def rate_order(self, order_id, user_id, rating):
+        with self._lock:
+            order = self.get_order(order_id, user_id)
+            if order is None or order.status != "DELIVERED" or order.rating is not None:
+                return False
+            order.rating = rating
+            return True
+
+
+def seed_memory(repo: InMemoryRepository, with_demo_user: bool = True):
+    """Load the seed.py catalog (and demo user) into an in-memory repository"""
+    from seed import RESTAURANTS, MENUS
+    from auth import get_password_hash
+
+    for data in RESTAURANTS:
+        restaurant = repo.add_restaurant(Restaurant(**data))
+        for item_data in MENUS.get(restaurant.name, []):
+            repo.add_menu_item(MenuItem(restaurant_id=restaurant.id, **item_data))
+
+    if with_demo_user:
+        repo.add_user(User(
+            email="demo@fooddelivery.com",
+            username="demouser",
+            hashed_password=get_password_hash("demo123"),
+            full_name="Demo User",
+            phone="+91 9999999999",
+            role="customer"
+        ))
+
+
+# ============================================
+# BACKEND SELECTION
+# ============================================
+
+memory_repository = InMemoryRepository() if BACKEND == "memory" else None
+
+
+def is_memory() -> bool:
+    return BACKEND == "memory"
+
+
+@contextmanager
+def open_repository():
+    """Repository for code running outside a request (threads, jobs)"""
+    if is_memory():
+        yield memory_repository
+        return
+    db = database.SessionLocal()
+    repo = SqlRepository(db)
+    try:
+        yield repo
+    finally:
+        repo.close()
+        db.close()
+
+
+async def get_repository():
+    """FastAPI dependency
+
+    Async so FastAPI does not hop to the threadpool to enter and exit it;
+    sessions connect lazily, so opening one does no I/O.
+    """
+    with open_repository() as repo:
+        yield repo
+
+
+def get_db():
+    """Session dependency for SQL-only features"""
+    if is_memory():
+        raise HTTPException(status_code=501, detail="Not available with the in-memory backend")
+    yield from database.get_db()
@@ -0,0 +1,185 @@
+"""
+Catalog response cache
+Serialized, precompressed catalog bodies with ETag/Last-Modified handling
+
+Cacheable catalog responses are serialized and compressed once per
+rebuild. Requests are answered straight from the cached bytes, and
+revalidations (If-None-Match / If-Modified-Since) get a 304 without any
+database or serialization work.
+
+Bodies live in a local LRU and, when configured, in the shared tier (see
+shared_cache.py), tagged per restaurant so menu changes can be dropped
+across all instances.
+"""
+
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Hashable, Optional
+import hashlib
+import os
+import time
+
+from fastapi import Response
+
+import compression
+from shared_cache import LRUCache, SharedTier, shared_tier
+
+CACHE_TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL", "30"))
+CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+# Cache key prefixes whose body includes menu items
+MENU_ROUTES = ("menu", "menus", "detail")
+
+
+class CachedBody:
+    """One response body with its precompressed variants and validators"""
+
+    __slots__ = ("raw", "encoded", "etag", "last_modified", "http_date")
+
+    def __init__(self, raw: bytes, last_modified: float):
+        self.raw = raw
+        self.etag = f'W/"{hashlib.blake2b(raw, digest_size=12).hexdigest()}"'
+        self.last_modified = int(last_modified)
+        self.http_date = formatdate(self.last_modified, usegmt=True)
+        self.encoded = {}
+        if len(raw) >= compression.MIN_SIZE:
+            for encoding in compression.supported_encodings():
+                self.encoded[encoding] = compression.compress(raw, encoding, static=True)
+
+    def not_modified(self, headers) -> bool:
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            own = self.etag[2:]
+            return "*" in tags or any(tag.removeprefix("W/") == own for tag in tags)
+
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= self.last_modified
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def respond(self, headers) -> Response:
+        response_headers = {
+            "ETag": self.etag,
+            "Last-Modified": self.http_date,
+            "Cache-Control": CACHE_CONTROL,
+            "Vary": "Accept-Encoding"
+        }
+        if self.not_modified(headers):
+            return Response(status_code=304, headers=response_headers)
+
+        encoding = compression.negotiate(headers.get("accept-encoding"))
+        if encoding in self.encoded:
+            response_headers["Content-Encoding"] = encoding
+            return Response(self.encoded[encoding], media_type="application/json", headers=response_headers)
+        return Response(self.raw, media_type="application/json", headers=response_headers)
+
+
+class ResponseCache:
+    """TTL cache of CachedBody entries keyed like the single-flight keys"""
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, tier: SharedTier = shared_tier):
+        self.ttl = ttl
+        self.tier = tier
+        self._entries = LRUCache()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        """Local lookup only; never blocks on the network"""
+        body = self._entries.get(key)
+        if body is not None:
+            self.hits += 1
+        return body
+
+    def get_shared(self, key: Hashable) -> Optional[CachedBody]:
+        """Shared-tier lookup (call from a worker thread), kept locally on a hit"""
+        value = self.tier.get(_shared_key(key))
+        if value is None:
+            self.misses += 1
+            return None
+        last_modified, _, raw = value.partition(b"\n")
+        body = CachedBody(raw, float(last_modified))
+        self._entries.put(key, body, self.ttl)
+        self.shared_hits += 1
+        return body
+
+    def put(self, key: Hashable, raw: bytes) -> CachedBody:
+        """Store a new body; Last-Modified only moves if the content changed"""
+        previous = self._entries.peek(key)
+        body = CachedBody(raw, time.time())
+        if previous and previous.etag == body.etag:
+            body = previous
+        self._entries.put(key, body, self.ttl)
+        self.tier.set(_shared_key(key), b"%d\n" % body.last_modified + raw, self.ttl, _tags(key))
+        return body
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        return self._entries.expires_in(key)
+
+    def renew(self, key: Hashable) -> bool:
+        """Restart the local TTL of an unchanged body (see warmup.py)"""
+        body = self._entries.peek(key)
+        if body is None:
+            return False
+        self._entries.put(key, body, self.ttl)
+        return True
+
+    def invalidate_restaurant(self, restaurant_id: int):
+        """Drop the list and every entry belonging to one restaurant"""
+        self._entries.discard(lambda key: key[0] == "restaurants" or _mentions(key, restaurant_id))
+
+    def invalidate_menu(self, restaurant_id: int):
+        """Drop only menu-bearing entries for one restaurant"""
+        self._entries.discard(lambda key: key[0] in MENU_ROUTES and _mentions(key, restaurant_id))
+
+    def clear(self, _=None):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "sharedHits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self._entries.evictions
+        }
+
+
+# Shared-tier tags, matching the local invalidate_* predicates
+
+def restaurant_tags(restaurant_id: int) -> list:
+    return ["restaurants", f"r:{restaurant_id}"]
+
+
+def menu_tags(restaurant_id: int) -> list:
+    return [f"menu:{restaurant_id}"]
+
+
+def _shared_key(key: tuple) -> str:
+    return "catalog:" + repr(key)
+
+
+def _tags(key: tuple) -> list:
+    tags = ["catalog"]
+    if key[0] == "restaurants":
+        tags.append("restaurants")  # key[1] is the list order, not a restaurant
+    elif len(key) >= 2:
+        ids = key[1] if isinstance(key[1], tuple) else (key[1],)
+        for restaurant_id in ids:
+            tags.append(f"r:{restaurant_id}")
+            if key[0] in MENU_ROUTES:
+                tags.append(f"menu:{restaurant_id}")
+    return tags
+
+
+def _mentions(key: tuple, restaurant_id: int) -> bool:
+    # key[1] is a restaurant id, or a tuple of ids for batch reads
+    if len(key) < 2 or key[0] == "restaurants":
+        return False
+    if isinstance(key[1], tuple):
+        return restaurant_id in key[1]
+    return key[1] == restaurant_id
@@ -0,0 +1,224 @@
+"""
+Restaurant cards
+Denormalized listing rows: rating, order counts, ETA and open status
+
+GET /restaurants reads restaurant_cards with one indexed query instead of
+combining restaurants, sales rollups and the ETA table per request. A
+background job keeps the cards current:
+
+- incrementally, every REFRESH_INTERVAL seconds: only restaurants with
+  rollup rows newer than the last refresh (orders placed, delivered,
+  cancelled or rated) are recomputed,
+- fully, when the ETA table was rebuilt, the local hour changed (ETAs are
+  per hour of day and the popularity window slides), or the catalog was
+  reseeded.
+
+Cards are compared before writing, so only changed restaurants are
+written and dropped from the response caches.
+
+The card rating blends the restaurant's listed rating (worth
+RATING_PRIOR_WEIGHT ratings) with the ratings customers gave delivered
+orders, so a few ratings cannot swing a new restaurant to 1 or 5 stars.
+
+Run: python restaurant_cards.py refresh   (full refresh, e.g. after a backfill)
+"""
+
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Restaurant, RestaurantCard, RestaurantSalesRollup
+import eta
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL_SECONDS = int(os.getenv("RESTAURANT_CARD_REFRESH_INTERVAL", "60"))
+POPULAR_WINDOW_DAYS = int(os.getenv("RESTAURANT_CARD_POPULAR_DAYS", "30"))
+RATING_PRIOR_WEIGHT = float(os.getenv("RESTAURANT_CARD_RATING_PRIOR", "10"))
+
+# sort parameter -> ORDER BY, each served by one of the card indexes
+SORTS = {
+    None: (RestaurantCard.restaurant_id,),
+    "rating": (RestaurantCard.rating.desc(), RestaurantCard.restaurant_id.desc()),
+    "popular": (RestaurantCard.recent_orders.desc(), RestaurantCard.restaurant_id.desc()),
+    "eta": (RestaurantCard.eta_max.asc().nulls_last(), RestaurantCard.restaurant_id),
+}
+
+# What the last refresh covered; a None watermark forces a full refresh
+_state = {"watermark": None, "eta_built_at": None, "hour": None}
+last_refresh: dict = {}
+
+# Set once the first refresh after startup has run (warm-up waits for it)
+first_refresh = asyncio.Event()
+
+
+def request_full_refresh(_=None):
+    """Recompute every card on the next run (catalog reseeded)"""
+    _state["watermark"] = None
+
+
+def blended_rating(listed: Optional[float], count: int, total: int) -> float:
+    """(k·listed + sum of ratings) / (k + count)"""
+    if not listed:
+        return round(total / count, 2) if count else 0.0
+    return round((RATING_PRIOR_WEIGHT * listed + total) / (RATING_PRIOR_WEIGHT + count), 2)
+
+
+# ============================================
+# REFRESH
+# ============================================
+
+def _aggregate(db: Session, restaurant_ids: Optional[List[int]], since: datetime) -> Dict[int, tuple]:
+    """restaurant id -> (orders, recent orders, rating count, rating total) from the daily rollups"""
+    rollup = RestaurantSalesRollup
+    billable = func.coalesce(rollup.order_count, 0) - func.coalesce(rollup.cancelled_count, 0)
+    query = db.query(
+        rollup.restaurant_id,
+        func.sum(billable),
+        func.sum(case((rollup.bucket_start >= since, billable), else_=0)),
+        func.sum(func.coalesce(rollup.rating_count, 0)),
+        func.sum(func.coalesce(rollup.rating_total, 0)),
+    ).filter(rollup.granularity == "day")
+    if restaurant_ids is not None:
+        query = query.filter(rollup.restaurant_id.in_(restaurant_ids))
+    return {
+        restaurant_id: (int(orders or 0), int(recent or 0), int(ratings or 0), int(total or 0))
+        for restaurant_id, orders, recent, ratings, total in query.group_by(rollup.restaurant_id).all()
+    }
+
+
+def card_values(restaurant: Restaurant, totals: Optional[tuple]) -> dict:
+    orders, recent, ratings, rating_total = totals or (0, 0, 0, 0)
+    estimate = eta.restaurant_eta(restaurant.id, restaurant.delivery_time) or {}
+    return {
+        "restaurant_id": restaurant.id,
+        "name": restaurant.name,
+        "cuisine": restaurant.cuisine,
+        "image": restaurant.image,
+        "address": restaurant.address,
+        "phone": restaurant.phone,
+        "is_open": bool(restaurant.is_open),
+        "rating": blended_rating(restaurant.rating, ratings, rating_total),
+        "rating_count": ratings,
+        "order_count": orders,
+        "recent_orders": recent,
+        "eta_min": estimate.get("minMinutes"),
+        "eta_max": estimate.get("maxMinutes"),
+        "eta_source": estimate.get("source"),
+        "delivery_time": restaurant.delivery_time,
+    }
+
+
+def refresh(db: Session, full: bool = False) -> List[int]:
+    """Bring the cards up to date; returns the ids of restaurants whose card changed"""
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    hour = eta.local_hour(now)
+    watermark = db.query(func.max(RestaurantSalesRollup.id)).scalar() or 0
+    full = (
+        full or _state["watermark"] is None
+        or _state["eta_built_at"] != eta.current.built_at or _state["hour"] != hour
+    )
+
+    if full:
+        ids = None
+        restaurants = db.query(Restaurant).all()
+        cards = {card.restaurant_id: card for card in db.query(RestaurantCard).all()}
+    else:
+        # Restaurants with orders written since the last refresh
+        ids = [restaurant_id for (restaurant_id,) in db.query(RestaurantSalesRollup.restaurant_id).filter(
+            RestaurantSalesRollup.id > _state["watermark"],
+            RestaurantSalesRollup.id <= watermark
+        ).distinct().all()]
+        restaurants = db.query(Restaurant).filter(Restaurant.id.in_(ids)).all() if ids else []
+        cards = {
+            card.restaurant_id: card
+            for card in db.query(RestaurantCard).filter(RestaurantCard.restaurant_id.in_(ids)).all()
+        } if ids else {}
+
+    totals = _aggregate(db, ids, now - timedelta(days=POPULAR_WINDOW_DAYS)) if restaurants else {}
+    changed = []
+    for restaurant in restaurants:
+        values = card_values(restaurant, totals.get(restaurant.id))
+        card = cards.pop(restaurant.id, None)
+        if card is None:
+            db.add(RestaurantCard(updated_at=now, **values))
+        elif any(getattr(card, column) != value for column, value in values.items()):
+            for column, value in values.items():
+                setattr(card, column, value)
+            card.updated_at = now
+        else:
+            continue
+        changed.append(restaurant.id)
+
+    if full:
+        # Cards of restaurants that no longer exist
+        for card in cards.values():
+            db.delete(card)
+            changed.append(card.restaurant_id)
+
+    db.commit()
+    _state.update(watermark=watermark, eta_built_at=eta.current.built_at, hour=hour)
+    last_refresh.update(
+        at=now.isoformat(), full=full, restaurants=len(restaurants), changed=len(changed),
+        durationMs=round((time.perf_counter() - started) * 1000, 1)
+    )
+    return changed
+
+
+def _refresh_once(full: bool = False) -> List[int]:
+    db = SessionLocal()
+    try:
+        return refresh(db, full)
+    finally:
+        db.close()
+
+
+async def run_refresh_loop(on_changed: Callable[[List[int]], Awaitable[None]], interval: int = REFRESH_INTERVAL_SECONDS,
+                           after: Optional[asyncio.Event] = None):
+    """Background task: refresh the cards and report the restaurants that changed
+
+    after: wait for this first, e.g. the first ETA build; a later one would
+    force a second full refresh that empties the freshly warmed caches.
+    """
+    if after is not None:
+        await after.wait()
+    while True:
+        try:
+            changed = await asyncio.to_thread(_refresh_once)
+            if changed:
+                await on_changed(changed)
+                logger.info("🪪 Restaurant cards refreshed", extra=dict(last_refresh))
+        except Exception:
+            logger.exception("Restaurant card refresh failed")
+        first_refresh.set()
+        await asyncio.sleep(interval)
+
+
+# ============================================
+# SERVING
+# ============================================
+
+def list_cards(db: Session, sort: Optional[str] = None) -> List[RestaurantCard]:
+    """Open restaurants in list order (one index scan)"""
+    return db.query(RestaurantCard).filter(RestaurantCard.is_open == True).order_by(*SORTS[sort]).all()
+
+
+def get_card(db: Session, restaurant_id: int) -> Optional[RestaurantCard]:
+    return db.get(RestaurantCard, restaurant_id)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["refresh"]:
+        sys.exit("Usage: python restaurant_cards.py refresh")
+    eta.refresh()
+    print(f"✅ Refreshed restaurant cards, {len(_refresh_once(full=True))} changed")
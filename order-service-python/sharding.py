@@ -0,0 +1,300 @@
+"""
+Order sharding
+Orders spread over several databases by a stable hash of user_id
+
+With ORDER_SHARD_URLS set (see database.py) every order lives on shard
+crc32(user_id) % N, so one user's orders are always on one shard and
+listing them is a single indexed query. Users, the catalog, analytics
+rollups and popularity scores stay on the main database; the catalog-side
+aggregates are written there right after the order commits on its shard.
+The cold archive index (archived_orders) and the per-user order summaries
+are kept per shard, next to the orders they describe.
+
+Order ids stay globally unique across shards: they are handed out in
+blocks (hi/lo) from the order_id_sequence row on the main database, so a
+process touches the main database once per ORDER_ID_BLOCK orders.
+
+Run: python sharding.py status
+     python sharding.py reshard --to URL1,URL2,... [--from ...] [--dry-run]
+
+Resharding copies every order (archive index entry, order summary) whose shard
+changes under the new layout, then deletes it from the old shard only if
+its version did not change meanwhile. It is idempotent, so it can be
+re-run until nothing moves. Stop order writes (or run it during a
+maintenance window) before the final pass, then restart the service with
+the new ORDER_SHARD_URLS.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, create_engine, func, select
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import argparse
+import os
+import threading
+
+import database
+from database import SessionLocal, ShardSessions, shard_engines
+from models import Order, ArchivedOrder, OrderIdSequence, UserOrderSummary
+import order_status
+import partitioning
+
+ORDER_ID_BLOCK = int(os.getenv("ORDER_ID_BLOCK", "100"))
+RESHARD_BATCH_SIZE = int(os.getenv("RESHARD_BATCH_SIZE", "1000"))
+
+
+def create_tables():
+    """Create the order tables on every shard that is not the main database"""
+    for shard_engine in shard_engines:
+        if shard_engine is not database.engine:
+            partitioning.create_shard_tables(shard_engine)
+
+
+def open_shard(user_id: int) -> Session:
+    return ShardSessions[database.shard_index(user_id)]()
+
+
+def for_each_shard(fn: Callable[[Session], object]) -> List[object]:
+    """Run fn(session) on every shard in turn"""
+    results = []
+    for make_session in ShardSessions:
+        db = make_session()
+        try:
+            results.append(fn(db))
+        finally:
+            db.close()
+    return results
+
+
+# ============================================
+# GLOBAL ORDER IDS
+# ============================================
+
+def max_order_id() -> int:
+    """Highest order id on the main database or any shard (incl. archived)"""
+    engines = {id(e): e for e in [database.engine, *shard_engines]}.values()
+    highest = 0
+    for engine in engines:
+        with engine.connect() as conn:
+            for column in (Order.__table__.c.id, ArchivedOrder.__table__.c.order_id):
+                highest = max(highest, conn.execute(select(func.max(column))).scalar() or 0)
+    return highest
+
+
+def reserve_block(size: int) -> Tuple[int, int]:
+    """Reserve ids [start, end) with one conditional UPDATE on the main database"""
+    table = OrderIdSequence.__table__
+    db = SessionLocal()
+    try:
+        for _ in range(3):
+            row = db.execute(
+                table.update().where(table.c.name == "orders").values(
+                    next_id=table.c.next_id + size
+                ).returning(table.c.next_id)
+            ).first()
+            if row:
+                db.commit()
+                return row.next_id - size, row.next_id
+
+            # First allocation: continue above every existing order
+            try:
+                db.execute(table.insert().values(name="orders", next_id=max_order_id() + 1))
+                db.commit()
+            except IntegrityError:
+                db.rollback()  # another process initialized it first
+        raise RuntimeError("Could not reserve order ids")
+    finally:
+        db.close()
+
+
+class OrderIdAllocator:
+    """Hands out ids from blocks reserved on the main database"""
+
+    def __init__(self, block_size: int = ORDER_ID_BLOCK):
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = reserve_block(self.block_size)
+            order_id = self._next
+            self._next += 1
+            return order_id
+
+
+order_ids = OrderIdAllocator()
+
+
+# ============================================
+# FAN-OUT QUERIES
+# ============================================
+
+def transition_orders(
+    db: Session,
+    order_ids: Iterable[int],
+    new_status: str,
+    expected_version: Optional[int] = None,
+    restaurant_ids: Optional[Iterable[int]] = None
+) -> dict:
+    """order_status.transition_orders across all shards
+
+    Callers only know order ids, so every shard runs the conditional UPDATE
+    for the whole id list; each one matches just the orders it holds.
+    """
+    order_ids = list(order_ids)
+    if restaurant_ids is not None:
+        restaurant_ids = list(restaurant_ids)
+    if not database.is_sharded():
+        return order_status.transition_orders(
+            db, order_ids, new_status, expected_version, restaurant_ids=restaurant_ids
+        )
+
+    results = for_each_shard(
+        lambda shard_db: order_status.transition_orders(
+            shard_db, order_ids, new_status, expected_version, rollup_db=db, restaurant_ids=restaurant_ids
+        )
+    )
+    not_found = set(order_ids)
+    for result in results:
+        not_found &= set(result["notFound"])
+    return {
+        "updated": [row for result in results for row in result["updated"]],
+        "conflicts": [row for result in results for row in result["conflicts"]],
+        "notFound": sorted(not_found)
+    }
+
+
+# ============================================
+# RESHARDING
+# ============================================
+
+def _engines(urls: List[str]) -> Dict[str, Engine]:
+    known = {str(e.url.render_as_string(hide_password=False)): e for e in [database.engine, *shard_engines]}
+    return {url: known.get(url) or create_engine(url) for url in urls}
+
+
+def _move_rows(table, key_column, version_column, source: Engine, target: Engine, rows: List[dict]):
+    """Upsert rows on target, then delete the unchanged ones from source"""
+    ids = [row[key_column.name] for row in rows]
+    with target.begin() as conn:
+        conn.execute(table.delete().where(key_column.in_(ids)))
+        conn.execute(table.insert(), rows)
+
+    with source.begin() as conn:
+        if version_column is None:
+            conn.execute(table.delete().where(key_column.in_(ids)))
+        else:
+            # Orders modified since the copy stay put and move on the next run
+            conn.execute(
+                table.delete().where(
+                    key_column == bindparam("key"), version_column == bindparam("expected_version")
+                ),
+                [{"key": row[key_column.name], "expected_version": row[version_column.name]} for row in rows]
+            )
+
+
+def reshard(source_urls: List[str], target_urls: List[str], batch_size: int = RESHARD_BATCH_SIZE, dry_run: bool = False) -> dict:
+    """Move orders so that each one lives on shard_index(user_id) of target_urls"""
+    source_urls = [database.normalize_url(url) for url in source_urls]
+    target_urls = [database.normalize_url(url) for url in target_urls]
+    engines = _engines(list(dict.fromkeys(source_urls + target_urls)))
+    if not dry_run:
+        for url in target_urls:
+            if engines[url] is database.engine:
+                partitioning.create_tables(database.engine)
+            else:
+                partitioning.create_shard_tables(engines[url])
+
+    moves = defaultdict(int)
+    plans = (
+        (Order.__table__, Order.__table__.c.id, Order.__table__.c.version),
+        (ArchivedOrder.__table__, ArchivedOrder.__table__.c.order_id, None),
+        (UserOrderSummary.__table__, UserOrderSummary.__table__.c.user_id, None),
+    )
+    for source_url in source_urls:
+        source = engines[source_url]
+        for table, key_column, version_column in plans:
+            last_key = 0
+            while True:
+                with source.connect() as conn:
+                    rows = [dict(row._mapping) for row in conn.execute(
+                        select(table).where(key_column > last_key).order_by(key_column).limit(batch_size)
+                    )]
+                if not rows:
+                    break
+                last_key = rows[-1][key_column.name]
+
+                by_target = defaultdict(list)
+                for row in rows:
+                    target_url = target_urls[database.shard_index(row["user_id"], len(target_urls))]
+                    if target_url != source_url:
+                        by_target[target_url].append(row)
+
+                for target_url, group in by_target.items():
+                    moves[(table.name, source_url, target_url)] += len(group)
+                    if not dry_run:
+                        _move_rows(table, key_column, version_column, source, engines[target_url], group)
+
+    return {
+        "dryRun": dry_run,
+        "moved": [
+            {"table": table, "from": source, "to": target, "rows": count}
+            for (table, source, target), count in sorted(moves.items())
+        ]
+    }
+
+
+def shard_status() -> List[dict]:
+    """Order count per shard, plus rows that belong to another shard"""
+    status = []
+    for index, shard_engine in enumerate(shard_engines):
+        with shard_engine.connect() as conn:
+            counts = conn.execute(
+                select(Order.__table__.c.user_id, func.count()).group_by(Order.__table__.c.user_id)
+            ).all()
+        status.append({
+            "shard": index,
+            "url": shard_engine.url.render_as_string(hide_password=True),
+            "orders": sum(count for _, count in counts),
+            "users": len(counts),
+            "misplaced": sum(count for user_id, count in counts if database.shard_index(user_id) != index)
+        })
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Order shard maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="orders per shard in the current layout")
+    move = commands.add_parser("reshard", help="move orders to a new shard layout")
+    move.add_argument("--to", required=True, help="comma-separated target shard URLs")
+    move.add_argument("--from", dest="source", help="comma-separated source URLs (default: current layout)")
+    move.add_argument("--batch-size", type=int, default=RESHARD_BATCH_SIZE)
+    move.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        for shard in shard_status():
+            print(f"📊 Shard {shard['shard']} {shard['url']}: {shard['orders']} orders, "
+                  f"{shard['users']} users, {shard['misplaced']} misplaced")
+        return
+
+    sources = args.source.split(",") if args.source else (database.ORDER_SHARD_URLS or [database.DATABASE_URL])
+    started = datetime.utcnow()
+    result = reshard(sources, args.to.split(","), args.batch_size, args.dry_run)
+    for move in result["moved"]:
+        source, target = (make_url(url).render_as_string(hide_password=True) for url in (move["from"], move["to"]))
+        print(f"{'🔎' if args.dry_run else '✅'} {move['table']}: {move['rows']} rows {source} → {target}")
+    if not result["moved"]:
+        print("✅ Nothing to move")
+    print(f"⏱️ {(datetime.utcnow() - started).total_seconds():.1f}s")
+
+
+if __name__ == "__main__":
+    main()
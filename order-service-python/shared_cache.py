@@ -0,0 +1,333 @@
+"""
+Two-level cache
+Per-process LRU in front of a shared Redis-protocol store
+
+With several instances behind the gateway, each process keeps its own
+LRU (level 1) and falls back to a shared store (level 2) on a miss, so an
+entry built by one instance warms all of them. Shared entries carry tags
+(e.g. "r:3" for everything about restaurant 3); invalidating a tag deletes
+the shared entries and broadcasts the invalidation on a pub/sub channel,
+so every instance drops its local copies within milliseconds.
+
+The shared tier is optional: without SHARED_CACHE_URL, without the `redis`
+package, or while the store is unreachable, everything keeps working on
+the local level alone. After an error the tier is skipped for
+SHARED_CACHE_RETRY seconds instead of adding a timeout to every request.
+Shared-tier calls block, so async code goes through a worker thread
+(TwoLevelCache.get_local first, InvalidationBus.invalidate_async).
+Local testing: `python cache_standin.py` and
+SHARED_CACHE_URL=redis://localhost:6380/0
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "")
+SHARED_CACHE_PREFIX = os.getenv("SHARED_CACHE_PREFIX", "order-service")
+SOCKET_TIMEOUT_SECONDS = float(os.getenv("SHARED_CACHE_TIMEOUT_MS", "50")) / 1000
+RETRY_SECONDS = float(os.getenv("SHARED_CACHE_RETRY", "5"))
+LOCAL_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "2048"))
+
+INVALIDATION_CHANNEL = f"{SHARED_CACHE_PREFIX}:invalidate"
+
+# Identifies this process on the invalidation channel
+INSTANCE_ID = uuid.uuid4().hex[:12]
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry TTL"""
+
+    def __init__(self, max_entries: int = LOCAL_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """Seconds until the entry expires (None if absent or expired)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            left = entry[0] - time.monotonic()
+            return left if left > 0 else None
+
+    def peek(self, key: Hashable):
+        """Value regardless of expiry, without touching LRU order"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry else None
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            doomed = [key for key in self._entries if predicate(key)]
+            for key in doomed:
+                del self._entries[key]
+            return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedTier:
+    """Shared store client that turns every failure into a cache miss"""
+
+    def __init__(self, url: str = SHARED_CACHE_URL, prefix: str = SHARED_CACHE_PREFIX):
+        self.url = url
+        self.prefix = prefix
+        self.client = None
+        if url and redis is not None:
+            self.client = redis.Redis.from_url(
+                url,
+                socket_timeout=SOCKET_TIMEOUT_SECONDS,
+                socket_connect_timeout=SOCKET_TIMEOUT_SECONDS
+            )
+        self.down_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    @property
+    def available(self) -> bool:
+        return self.client is not None and time.monotonic() >= self.down_until
+
+    def _call(self, fn: Callable, default=None):
+        if not self.available:
+            return default
+        try:
+            return fn(self.client)
+        except Exception as e:
+            self.errors += 1
+            if self.down_until <= time.monotonic():
+                logger.warning("⚠️ Shared cache unavailable, local only for %gs: %s", RETRY_SECONDS, e)
+            self.down_until = time.monotonic() + RETRY_SECONDS
+            return default
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def _tag(self, tag: str) -> str:
+        return f"{self.prefix}:tag:{tag}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self._call(lambda client: client.get(self._key(key)))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()):
+        """Store value and register it under each tag, in one round trip"""
+        def write(client):
+            pipe = client.pipeline(transaction=False)
+            pipe.set(self._key(key), value, px=int(ttl * 1000))
+            for tag in tags:
+                pipe.sadd(self._tag(tag), self._key(key))
+                pipe.pexpire(self._tag(tag), int(ttl * 1000) * 2)
+            pipe.execute()
+        self._call(write)
+
+    def delete_tags(self, tags: Iterable[str]):
+        """Delete every shared entry registered under any of the tags"""
+        def delete(client):
+            tag_keys = [self._tag(tag) for tag in tags]
+            members = set()
+            for tag_key in tag_keys:
+                members.update(client.smembers(tag_key))
+            client.delete(*members, *tag_keys)
+        self._call(delete)
+
+    def publish(self, message: dict):
+        self._call(lambda client: client.publish(INVALIDATION_CHANNEL, json.dumps(message)))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "available": self.available,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors
+        }
+
+
+class InvalidationBus:
+    """Applies invalidations locally and relays them to the other instances
+
+    Handlers are registered per scope ("menu", "restaurant", "user", ...)
+    and called with the invalidated id, both for local invalidations and
+    for ones received from other instances.
+    """
+
+    def __init__(self, tier: SharedTier):
+        self.tier = tier
+        self.handlers: Dict[str, List[Callable]] = {}
+        self.sent = 0
+        self.received = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def register(self, scope: str, handler: Callable):
+        self.handlers.setdefault(scope, []).append(handler)
+
+    def _apply(self, scope: str, key):
+        for handler in self.handlers.get(scope, []):
+            try:
+                handler(key)
+            except Exception:
+                logger.exception("Invalidation handler for %s failed", scope)
+
+    def invalidate(self, scope: str, key=None, tags: Iterable[str] = ()):
+        """Drop local entries, shared entries under tags, and tell everyone (blocking)"""
+        self._apply(scope, key)
+        if self.tier.enabled:
+            self._broadcast(scope, key, list(tags))
+
+    async def invalidate_async(self, scope: str, key=None, tags: Iterable[str] = ()):
+        """invalidate() for the event loop: the shared tier is called from a worker thread"""
+        self._apply(scope, key)
+        if self.tier.enabled:
+            await asyncio.to_thread(self._broadcast, scope, key, list(tags))
+
+    def _broadcast(self, scope: str, key, tags: List[str]):
+        if tags:
+            self.tier.delete_tags(tags)
+        self.tier.publish({"origin": INSTANCE_ID, "scope": scope, "key": key})
+        self.sent += 1
+
+    def start(self):
+        if self.tier.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _listen(self):
+        """Subscriber loop, reconnecting while the store is down
+
+        Whatever was published while disconnected is lost, so local entries
+        are dropped on every (re)subscribe; the TTL bounds staleness anyway.
+        """
+        while not self._stopping.is_set():
+            try:
+                pubsub = self.tier.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                self._apply("all", None)
+                while not self._stopping.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._receive(message["data"])
+            except Exception as e:
+                if not self._stopping.is_set():
+                    logger.warning("⚠️ Cache invalidation channel lost, retrying: %s", e)
+                    self._stopping.wait(RETRY_SECONDS)
+
+    def _receive(self, data: bytes):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        if message.get("origin") == INSTANCE_ID:
+            return
+        self.received += 1
+        self._apply(message.get("scope"), message.get("key"))
+
+    def stats(self) -> dict:
+        return {
+            "instance": INSTANCE_ID,
+            "listening": self._thread is not None and self._thread.is_alive(),
+            "sent": self.sent,
+            "received": self.received
+        }
+
+
+class TwoLevelCache:
+    """Local LRU + shared tier for JSON-serializable values"""
+
+    def __init__(self, name: str, tier: SharedTier, ttl: float, max_entries: int = LOCAL_MAX_ENTRIES):
+        self.name = name
+        self.tier = tier
+        self.ttl = ttl
+        self.local = LRUCache(max_entries)
+        self.local_hits = 0
+        self.misses = 0
+
+    def _shared_key(self, key) -> str:
+        return f"{self.name}:{key}"
+
+    def get_local(self, key):
+        """Local level only, safe on the event loop"""
+        value = self.local.get(key)
+        if value is not None:
+            self.local_hits += 1
+        return value
+
+    def get(self, key):
+        """Local level, then the shared tier (blocking on a local miss)"""
+        value = self.get_local(key)
+        if value is not None:
+            return value
+        raw = self.tier.get(self._shared_key(key))
+        if raw is not None:
+            value = json.loads(raw)
+            self.local.put(key, value, self.ttl)
+            return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value, tags: Iterable[str] = ()):
+        """Store on both levels (blocking)"""
+        self.local.put(key, value, self.ttl)
+        self.tier.set(self._shared_key(key), json.dumps(value, default=str), self.ttl, tags)
+
+    def drop(self, key):
+        self.local.discard(lambda k: k == key)
+
+    def stats(self) -> dict:
+        return {"entries": len(self.local), "localHits": self.local_hits, "misses": self.misses}
+
+
+shared_tier = SharedTier()
+invalidation_bus = InvalidationBus(shared_tier)
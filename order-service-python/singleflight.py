@@ -0,0 +1,56 @@
+"""
+Request coalescing (single-flight)
+Concurrent identical reads share one in-flight fetch and its result
+
+The first caller for a key starts the fetch in a worker thread; callers
+that arrive while it is running await the same future instead of hitting
+the database again. Nothing is cached after the fetch completes, so this
+never serves data older than the request that triggered it.
+"""
+
+from typing import Any, Callable, Hashable
+import asyncio
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self._inflight = {}
+        self._counters = {}
+
+    async def do(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(*args) in a thread, or join an identical call already running
+
+        key should be a tuple whose first element names the route, e.g.
+        ("menu", restaurant_id, sort); counters are grouped by that name.
+        Results are shared between callers and must not be mutated.
+        """
+        counters = self._counters.setdefault(key[0], {"requests": 0, "executions": 0, "collapsed": 0})
+        counters["requests"] += 1
+
+        future = self._inflight.get(key)
+        if future is None:
+            counters["executions"] += 1
+            future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._finish(key, f))
+        else:
+            counters["collapsed"] += 1
+
+        # shield: a disconnecting caller must not cancel the shared fetch
+        return await asyncio.shield(future)
+
+    def _finish(self, key: Hashable, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Mark the exception retrieved even if every waiter went away
+            future.exception()
+
+    def stats(self) -> dict:
+        """Per-route request/execution/collapsed counters"""
+        return {
+            "inflight": len(self._inflight),
+            "routes": {name: dict(counters) for name, counters in self._counters.items()}
+        }
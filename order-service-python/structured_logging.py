@@ -0,0 +1,243 @@
+"""
+Structured logging
+JSON log lines written by a background thread, with request ids and an access log
+
+Handlers never touch stdout: log calls put the record on a bounded queue
+(dropping, and counting, records if the writer falls behind) and a writer
+thread formats it as one JSON line. Every record carries the id of the
+request it was logged from (X-Request-ID from the caller, or a new one,
+echoed in the response).
+
+AccessLogMiddleware writes one line per request with status, latency and
+the time spent in database calls. High-volume routes can be sampled with
+LOG_SAMPLE_RATES="GET /restaurants=0.01,GET /health=0"; errors and
+requests slower than LOG_SLOW_MS are always logged.
+
+LOG_FORMAT=text keeps plain, human-readable lines for local runs.
+"""
+
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json, text
+QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_MS", "1000"))
+REQUEST_ID_HEADER = "x-request-id"
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        route, _, rate = part.rpartition("=")
+        if route.strip():
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+SAMPLE_RATES = _parse_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+class RequestTimings:
+    """Per-request counters filled in by the database event hooks"""
+
+    __slots__ = ("db_seconds", "db_queries")
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.db_queries = 0
+
+
+request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+# Attributes every LogRecord has; anything else came in through extra=
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+
+# ============================================
+# HANDLERS
+# ============================================
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["requestId"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRIBUTES}
+        return f"{line} {extras}" if extras else line
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue without formatting; drop instead of waiting when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same process, so the writer thread can format the record itself;
+        # only the context-dependent request id must be captured here
+        record.request_id = request_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup():
+    """Route all logging (including uvicorn's) through the queue; idempotent"""
+    global _handler, _listener
+    if _handler is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    log_queue: queue.Queue = queue.Queue(QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)  # flush what is queued
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(LOG_LEVEL)
+
+    # uvicorn's own lines go through the queue too; its access log is
+    # replaced by AccessLogMiddleware
+    for name in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    logging.getLogger("uvicorn.access").disabled = True
+
+
+def stats() -> dict:
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0
+    }
+
+
+# ============================================
+# DATABASE TIME
+# ============================================
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if request_timings.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    timings = request_timings.get()
+    started = conn.info.get("query_started")
+    if timings is not None and started:
+        timings.db_seconds += time.perf_counter() - started.pop()
+        timings.db_queries += 1
+
+
+# ============================================
+# ACCESS LOG
+# ============================================
+
+access_logger = logging.getLogger("access")
+
+
+class AccessLogMiddleware:
+    """ASGI middleware assigning request ids and writing the access log"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = Headers(scope=scope).get(REQUEST_ID_HEADER)
+        if not rid or len(rid) > 128 or not rid.isprintable():
+            rid = uuid.uuid4().hex[:16]
+        rid_token = request_id.set(rid)
+        timings = RequestTimings()
+        timings_token = request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_logged(message: Message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (REQUEST_ID_HEADER.encode(), rid.encode("latin-1"))]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_logged)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            route = scope.get("route")
+            route_name = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+            rate = SAMPLE_RATES.get(route_name, 1.0)
+            if status >= 500 or duration_ms >= SLOW_REQUEST_MS or rate >= 1.0 or random.random() < rate:
+                access_logger.info(
+                    "%s %s %d", scope["method"], scope["path"], status,
+                    extra={
+                        "route": route_name,
+                        "status": status,
+                        "durationMs": round(duration_ms, 2),
+                        "dbMs": round(timings.db_seconds * 1000, 2),
+                        "dbQueries": timings.db_queries,
+                        "bytes": size,
+                        "sampleRate": rate
+                    }
+                )
+            request_timings.reset(timings_token)
+            request_id.reset(rid_token)
@@ -0,0 +1,62 @@
+"""Sales rollup compaction (analytics.py)"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.orm import sessionmaker
+
+import analytics
+from models import Restaurant, RestaurantSalesRollup, User
+
+CREATED_AT = datetime(2026, 3, 4, 12, 30)
+
+
+def _add_orders(db, count: int):
+    for _ in range(count):
+        analytics._add_delta(db, 1, CREATED_AT, order_count=1, revenue=10.0)
+    db.commit()
+
+
+def _totals(db):
+    return db.query(
+        func.count(RestaurantSalesRollup.id), func.sum(RestaurantSalesRollup.order_count)
+    ).filter(RestaurantSalesRollup.granularity == "hour").one()
+
+
+@pytest.fixture
+def sqlite_db():
+    engine = create_engine("sqlite://")
+    RestaurantSalesRollup.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    yield db
+    db.close()
+
+
+def test_compaction_merges_deltas(sqlite_db):
+    _add_orders(sqlite_db, 3)
+
+    assert analytics.compact_rollups(sqlite_db) == 2  # the hour and the day bucket
+    assert _totals(sqlite_db) == (1, 3)
+    assert analytics.compact_rollups(sqlite_db) == 0
+
+
+def test_compaction_skipped_while_another_instance_compacts(postgres_engine):
+    for table in (User.__table__, Restaurant.__table__, RestaurantSalesRollup.__table__):
+        table.create(postgres_engine)
+    Session = sessionmaker(bind=postgres_engine)
+    db, other = Session(), Session()
+    try:
+        db.add(Restaurant(id=1, name="R", cuisine="C"))
+        _add_orders(db, 3)
+        other.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": analytics._ADVISORY_LOCK_ID})
+
+        assert analytics.compact_rollups(db) == 0
+        assert _totals(db) == (3, 3)
+
+        other.commit()
+        assert analytics.compact_rollups(db) == 2
+        assert _totals(db) == (1, 3)
+    finally:
+        db.close()
+        other.close()
@@ -0,0 +1,86 @@
+"""Request deadlines (deadlines.py)"""
+
+import asyncio
+import time
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import deadlines
+
+
+def test_no_deadline_outside_requests():
+    assert deadlines.remaining() is None
+    assert deadlines.http_timeout(5.0) == 5.0
+
+
+def test_http_timeout_capped_by_deadline():
+    token = deadlines.current_deadline.set(time.monotonic() + 1.0)
+    try:
+        assert 0.9 < deadlines.http_timeout(5.0) <= 1.0
+        assert deadlines.http_timeout(0.5) == 0.5
+    finally:
+        deadlines.current_deadline.reset(token)
+
+
+def test_http_timeout_after_deadline():
+    token = deadlines.current_deadline.set(time.monotonic() - 0.1)
+    try:
+        with pytest.raises(deadlines.DeadlineExceeded):
+            deadlines.http_timeout(5.0)
+    finally:
+        deadlines.current_deadline.reset(token)
+
+
+@pytest.mark.parametrize("route, header, expected", [
+    ("GET /restaurants", None, 2000),
+    ("GET /unknown", None, deadlines.DEFAULT_DEADLINE_MS),
+    ("GET /restaurants", "750", 750),
+    ("GET /restaurants", "0", 1),
+    ("GET /restaurants", "60000", 2000),  # the header cannot extend the budget
+    ("GET /unknown", str(deadlines.MAX_DEADLINE_MS * 10), deadlines.DEFAULT_DEADLINE_MS),
+    ("GET /restaurants", "soon", 2000),
+])
+def test_budget(route, header, expected):
+    assert deadlines.budget_ms(route, header) == expected
+
+
+async def remaining_budget(request):
+    # What an outbound call made by the handler would be allowed
+    return JSONResponse({"remaining": deadlines.remaining(), "timeout": deadlines.http_timeout(30.0)})
+
+
+async def slow(request):
+    await asyncio.sleep(2)
+    return JSONResponse({})
+
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[Route("/remaining", remaining_budget), Route("/slow", slow)])
+    with TestClient(deadlines.DeadlineMiddleware(app, app.routes)) as client:
+        yield client
+
+
+def test_header_deadline_reaches_handler(client):
+    body = client.get("/remaining", headers={"X-Request-Timeout-Ms": "1500"}).json()
+
+    assert 1.0 < body["remaining"] <= 1.5
+    assert body["timeout"] == pytest.approx(body["remaining"], abs=0.05)
+
+
+def test_default_deadline_reaches_handler(client):
+    body = client.get("/remaining").json()
+    assert body["remaining"] <= deadlines.DEFAULT_DEADLINE_MS / 1000
+
+
+def test_expired_handler_answers_504(client):
+    started = time.monotonic()
+    response = client.get("/slow", headers={"X-Request-Timeout-Ms": "100"})
+
+    assert response.status_code == 504
+    assert time.monotonic() - started < 1.5
+    assert deadlines.stats.exceeded["GET /slow"] >= 1
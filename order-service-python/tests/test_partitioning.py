@@ -0,0 +1,82 @@
+"""Plain orders table -> partitioned layout (partitioning.py)"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import partitioning
+from models import Order, Restaurant, User
+
+# orders as first released, before the LEGACY_COLUMN_FIXUPS columns
+FIRST_RELEASE_COLUMNS = {
+    "id", "user_id", "restaurant_id", "items", "total_amount", "delivery_address",
+    "status", "payment_status", "created_at", "updated_at"
+}
+
+
+def test_every_order_column_is_copied():
+    sql = partitioning.copy_legacy_orders_sql()
+    inserted = sql[sql.index("(") + 1:sql.index(")")].split(", ")
+    assert inserted == [column.name for column in Order.__table__.columns]
+
+
+def test_every_later_column_has_a_fixup():
+    fixed = {ddl.split("IF NOT EXISTS ")[1].split()[0] for ddl in partitioning.LEGACY_COLUMN_FIXUPS}
+    assert {column.name for column in Order.__table__.columns} - FIRST_RELEASE_COLUMNS == fixed
+
+
+@pytest.fixture
+def engine(postgres_engine):
+    engine = postgres_engine
+    User.__table__.create(engine)
+    Restaurant.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO users (id, email, username, hashed_password) VALUES (1, 'a@example.com', 'a', 'x')"
+        ))
+        conn.execute(text("INSERT INTO restaurants (id, name, cuisine) VALUES (1, 'R', 'C')"))
+    return engine
+
+
+def test_convert_keeps_every_column(engine):
+    Order.__table__.create(engine)
+    created = datetime.utcnow() - timedelta(days=40)
+    delivered = created + timedelta(minutes=20)
+    with engine.begin() as conn:
+        conn.execute(Order.__table__.insert().values(
+            id=7, user_id=1, restaurant_id=1, items=[{"menuItemId": 1, "quantity": 2, "price": 10.0}],
+            total_amount=20.0, delivery_address="x", status="DELIVERED", payment_status="PAID", version=4,
+            dispatched_at=created, dispatch_claimed_at=created, dispatch_attempts=2,
+            out_for_delivery_at=delivered, rating=5, created_at=created, updated_at=delivered
+        ))
+
+    assert partitioning.convert_existing_orders(engine) == 1
+    assert partitioning.is_partitioned(engine)
+    with engine.connect() as conn:
+        row = conn.execute(Order.__table__.select()).one()
+        next_id = conn.execute(text("SELECT nextval('orders_id_seq')")).scalar()
+    assert (row.rating, row.out_for_delivery_at, row.dispatch_attempts, row.dispatch_claimed_at, row.version) == (
+        5, delivered, 2, created, 4
+    )
+    assert next_id == 8
+
+
+def test_convert_first_release_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE orders (id SERIAL PRIMARY KEY, user_id INTEGER NOT NULL, restaurant_id INTEGER NOT NULL, "
+            "items JSON, total_amount DOUBLE PRECISION NOT NULL, delivery_address TEXT NOT NULL, "
+            "status VARCHAR, payment_status VARCHAR, created_at TIMESTAMP, updated_at TIMESTAMP)"
+        ))
+        conn.execute(text(
+            "INSERT INTO orders (user_id, restaurant_id, total_amount, delivery_address, status) "
+            "VALUES (1, 1, 10, 'x', 'DELIVERED')"
+        ))
+
+    assert partitioning.convert_existing_orders(engine) == 1
+    with engine.connect() as conn:
+        row = conn.execute(Order.__table__.select()).one()
+    assert row.version == 1
+    assert row.dispatched_at is not None  # notified inline back then
+    assert (row.dispatch_attempts, row.rating, row.out_for_delivery_at) == (0, None, None)
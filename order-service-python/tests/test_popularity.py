@@ -0,0 +1,110 @@
+"""Forward-decay popularity scores (popularity.py)"""
+
+from datetime import datetime, timedelta
+import math
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import popularity
+from models import MenuItem
+
+HALF_LIFE = timedelta(days=popularity.HALF_LIFE_DAYS)
+
+
+def test_weight_doubles_every_half_life():
+    ts = popularity.landmark(3) + timedelta(days=1)
+    later = ts + HALF_LIFE
+
+    assert popularity.epoch_of(later) == 3
+    assert popularity.decay_weight(later) / popularity.decay_weight(ts) == pytest.approx(2.0)
+
+
+def test_weights_stay_finite_within_an_epoch():
+    end = popularity.landmark(1) - timedelta(seconds=1)
+
+    assert popularity.epoch_of(end) == 0
+    assert math.isfinite(popularity.decay_weight(end))
+    assert popularity.decay_weight(end) == pytest.approx(math.exp(popularity.RENORMALIZE_TAUS), rel=1e-3)
+
+
+def test_current_score_decays_with_half_life():
+    ordered_at = popularity.landmark(2) + timedelta(hours=5)
+    stored = 3 * popularity.decay_weight(ordered_at)
+
+    assert popularity.current_score(stored, 2, now=ordered_at) == pytest.approx(3.0)
+    assert popularity.current_score(stored, 2, now=ordered_at + HALF_LIFE) == pytest.approx(1.5)
+
+
+def test_rescaling_preserves_current_value():
+    ordered_at = popularity.landmark(4) - timedelta(days=2)
+    stored = popularity.decay_weight(ordered_at)
+    now = popularity.landmark(5) + timedelta(hours=1)
+
+    moved = popularity.rescaled(stored, 4, 5)
+    assert popularity.current_score(moved, 5, now=now) == pytest.approx(
+        popularity.current_score(stored, 4, now=now)
+    )
+    assert popularity.rescaled(stored, 3, 5) == 0.0
+    assert popularity.rescaled(stored, 5, 5) == stored
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://")
+    MenuItem.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setitem(popularity._rescaled_epoch, "epoch", None)
+    yield session
+    session.close()
+
+
+def test_record_order_items_matches_python_maths(db):
+    epoch = popularity.epoch_of(datetime.utcnow())
+    db.add_all([
+        MenuItem(id=1, restaurant_id=1, name="a", price=1, popularity_score=10.0, popularity_epoch=epoch - 1),
+        MenuItem(id=2, restaurant_id=1, name="b", price=1, popularity_score=10.0, popularity_epoch=epoch - 2),
+    ])
+    db.commit()
+
+    ordered_at = popularity.landmark(epoch) + timedelta(hours=1)
+    popularity.record_order_items(db, 1, [{"menuItemId": 1, "quantity": 2}], ordered_at)
+    db.commit()
+
+    first, second = db.query(MenuItem).order_by(MenuItem.id).all()
+    assert first.popularity_epoch == second.popularity_epoch == epoch
+    assert first.popularity_score == pytest.approx(
+        popularity.rescaled(10.0, epoch - 1, epoch) + 2 * popularity.decay_weight(ordered_at, epoch)
+    )
+    assert second.popularity_score == 0.0
+
+
+def test_top_k_cache_serves_longer_rankings(db):
+    db.add_all([
+        MenuItem(id=i, restaurant_id=1, name=str(i), price=1, popularity_score=float(i), popularity_epoch=0)
+        for i in range(1, 31)
+    ])
+    db.commit()
+    cache = popularity.TopKCache(k=10)
+
+    assert [item["id"] for item in cache.get(db, 1)] == list(range(30, 20, -1))
+    assert len(cache.get(db, 1, 25)) == 25
+    assert len(cache.get(db, 1, 100)) == 30
+    assert len(cache.get(db, 1, 5)) == 5
+
+
+def test_rescale_remembered_only_once_committed(db):
+    epoch = popularity.epoch_of(datetime.utcnow())
+    db.add(MenuItem(id=1, restaurant_id=1, name="a", price=1, popularity_score=10.0, popularity_epoch=epoch - 1))
+    db.commit()
+
+    popularity.record_order_items(db, 1, [{"menuItemId": 1, "quantity": 1}])
+    db.rollback()
+    assert popularity._rescaled_epoch["epoch"] is None
+    assert db.get(MenuItem, 1).popularity_epoch == epoch - 1
+
+    popularity.record_order_items(db, 1, [])
+    db.commit()
+    assert popularity._rescaled_epoch["epoch"] == epoch
+    assert db.get(MenuItem, 1).popularity_epoch == epoch
@@ -0,0 +1,80 @@
+"""Cart quotes and quote tokens (pricing.py)"""
+
+import time
+
+import pytest
+
+import pricing
+
+TABLE = pricing.PriceTable(1, True, {
+    10: (pricing.to_paise(120), "Paneer Tikka"),
+    11: (pricing.to_paise(60), "Naan"),
+})
+
+
+def test_quote_totals():
+    quote = pricing.quote(TABLE, [(10, 1), (11, 2), (11, 1)], None, user_id=7)
+
+    assert [item["quantity"] for item in quote["items"]] == [1, 3]
+    assert quote["subtotal"] == 300.0
+    # Delivery 40 (below 499) + packaging 4 items x 5; 5% tax on 300
+    assert [fee["code"] for fee in quote["fees"]] == ["DELIVERY", "PACKAGING"]
+    assert quote["tax"] == 15.0
+    assert quote["total"] == 375.0
+
+
+def test_quote_promotion_waives_fee():
+    quote = pricing.quote(TABLE, [(10, 3)], "freedelivery", user_id=7)
+
+    assert quote["promoCode"] == "FREEDELIVERY"
+    assert "DELIVERY" not in [fee["code"] for fee in quote["fees"]]
+
+
+@pytest.mark.parametrize("lines, promo, message", [
+    ([], None, "Cart is empty"),
+    ([(99, 1)], None, "Items not available: 99"),
+    ([(10, 0)], None, "Quantity must be between"),
+    ([(11, 1)], "WELCOME50", "needs a subtotal"),
+    ([(10, 1)], "NOPE", "Unknown promo code"),
+])
+def test_quote_rejects(lines, promo, message):
+    with pytest.raises(pricing.QuoteError, match=message):
+        pricing.quote(TABLE, lines, promo, user_id=7)
+
+
+def test_quote_closed_restaurant():
+    with pytest.raises(pricing.QuoteError, match="closed"):
+        pricing.quote(pricing.PriceTable(2, False, {}), [(1, 1)], None, user_id=7)
+
+
+def test_token_round_trip():
+    quote = pricing.quote(TABLE, [(10, 1), (11, 2)], None, user_id=7)
+    payload = pricing.verify(quote["quoteToken"], user_id=7)
+
+    items, total = pricing.quoted_order(payload)
+    assert items == [
+        {"menuItemId": 10, "quantity": 1, "price": 120.0},
+        {"menuItemId": 11, "quantity": 2, "price": 60.0},
+    ]
+    assert total == quote["total"]
+
+
+def test_token_bound_to_user():
+    token = pricing.quote(TABLE, [(10, 1)], None, user_id=7)["quoteToken"]
+    assert pricing.verify(token, user_id=8) is None
+
+
+def test_token_tampering_rejected():
+    token = pricing.sign({"u": 7, "r": 1, "i": [[10, 1, 12000]], "t": 100, "x": time.time() + 60})
+    body, _, signature = token.partition(".")
+    forged = pricing.sign({"u": 7, "r": 1, "i": [[10, 1, 1]], "t": 1, "x": time.time() + 60}).partition(".")[0]
+
+    assert pricing.verify(token, user_id=7) is not None
+    assert pricing.verify(f"{forged}.{signature}", user_id=7) is None
+    assert pricing.verify(f"{body}.", user_id=7) is None
+    assert pricing.verify("not a token", user_id=7) is None
+
+
+def test_token_expiry():
+    token = pricing.sign({"u": 7, "r": 1, "i": [], "t": 0, "x": int(time.time()) - 1})
+    assert pricing.verify(token, user_id=7) is None
@@ -0,0 +1,61 @@
+"""Order id allocation and shard routing (sharding.py, database.py)"""
+
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import zlib
+
+import database
+import sharding
+
+
+class FakeSequence:
+    """Stands in for the order_id_sequence row"""
+
+    def __init__(self, start: int = 1):
+        self.next_id = start
+        self.calls = 0
+
+    def reserve_block(self, size: int):
+        self.calls += 1
+        start, self.next_id = self.next_id, self.next_id + size
+        return start, self.next_id
+
+
+def test_allocator_hands_out_blocks(monkeypatch):
+    sequence = FakeSequence(start=500)
+    monkeypatch.setattr(sharding, "reserve_block", sequence.reserve_block)
+    allocator = sharding.OrderIdAllocator(block_size=10)
+
+    ids = [allocator.next_id() for _ in range(25)]
+
+    assert ids == list(range(500, 525))
+    assert sequence.calls == 3
+
+
+def test_allocators_never_share_ids(monkeypatch):
+    sequence = FakeSequence()
+    monkeypatch.setattr(sharding, "reserve_block", sequence.reserve_block)
+    allocators = [sharding.OrderIdAllocator(block_size=7) for _ in range(3)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda allocator: allocator.next_id(), itertools.islice(itertools.cycle(allocators), 600)))
+
+    assert len(set(ids)) == 600
+
+
+def test_shard_index_is_stable_crc32():
+    for user_id in (1, 42, 10_000_019):
+        assert database.shard_index(user_id, 4) == zlib.crc32(str(user_id).encode()) % 4
+
+
+def test_shard_index_spreads_users():
+    counts = [0] * 4
+    for user_id in range(1, 4001):
+        counts[database.shard_index(user_id, 4)] += 1
+
+    assert all(800 < count < 1200 for count in counts)
+
+
+def test_unsharded_routes_everything_to_the_main_database():
+    assert database.shard_index(123) == 0
+    assert database.ShardSessions == [database.SessionLocal]
@@ -0,0 +1,94 @@
+"""Bulk user import: parsing, validation and per-row errors (user_import.py)"""
+
+from contextlib import contextmanager
+
+import pytest
+
+import repositories
+import user_import
+
+
+def test_validate_row_normalizes():
+    record = user_import.validate_row({
+        "email": " Ann@Example.com ", "username": " ann ", "password": " secret ", "full_name": "", "role": ""
+    })
+
+    assert record["email"] == "Ann@example.com"
+    assert record["username"] == "ann"
+    assert record["password"] == " secret "  # never trimmed
+    assert record["full_name"] is None
+    assert record["role"] == "customer"
+
+
+@pytest.mark.parametrize("row, message", [
+    ({"username": "ann", "password": "pw"}, "Missing email"),
+    ({"email": "ann@example.com", "password": "pw"}, "Missing username"),
+    ({"email": "ann@example.com", "username": "ann", "password": ""}, "Missing password"),
+    ({"email": "not-an-email", "username": "ann", "password": "pw"}, "Invalid email"),
+    ({"email": "ann@example.com", "username": "ann", "password": "pw", "role": "owner"}, "Unknown role 'owner'"),
+])
+def test_validate_row_errors(row, message):
+    with pytest.raises(ValueError, match=message):
+        user_import.validate_row(row)
+
+
+def test_read_rows_csv_line_numbers():
+    text = "email,username,password\na@example.com,a,pw\nb@example.com,b,pw\n"
+    assert [(line, row["username"]) for line, row in user_import.read_rows(text, "csv")] == [(2, "a"), (3, "b")]
+
+
+def test_read_rows_jsonl_errors():
+    text = '{"email": "a@example.com"}\n\nnot json\n[1, 2]\n'
+    rows = list(user_import.read_rows(text, "jsonl"))
+
+    assert rows[0] == (1, {"email": "a@example.com"})
+    assert rows[1][0] == 3 and rows[1][1].startswith("Invalid JSON")
+    assert rows[2] == (4, "Expected a JSON object")
+
+
+def test_read_rows_unknown_format():
+    with pytest.raises(ValueError, match="Unknown format"):
+        list(user_import.read_rows("", "xml"))
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    repo = repositories.InMemoryRepository()
+
+    @contextmanager
+    def open_repository():
+        yield repo
+
+    monkeypatch.setattr(user_import, "open_repository", open_repository)
+    monkeypatch.setattr(user_import, "get_password_hash", lambda password: f"hashed:{password}")
+    monkeypatch.setattr(user_import, "HASH_WORKERS", 1)
+    return repo
+
+
+def test_import_reports_bad_rows_and_keeps_going(repo):
+    repo.add_users([{"email": "taken@example.com", "username": "taken", "hashed_password": "x", "role": "customer"}])
+    text = "\n".join([
+        "email,username,password,role",
+        "ok1@example.com,ok1,pw,",                # 2: created
+        "broken,bad,pw,",                         # 3: invalid email
+        "ok1@example.com,other,pw,",              # 4: duplicate email in file
+        "taken@example.com,fresh,pw,",            # 5: already registered
+        "new@example.com,taken,pw,",              # 6: username taken
+        "ok2@example.com,ok2,pw,admin",           # 7: created
+        "ok3@example.com,ok3,,",                  # 8: missing password
+    ])
+
+    report = user_import.import_users(text, "csv", batch_size=3)
+
+    assert report["total"] == 7
+    assert report["created"] == 2
+    assert report["failed"] == 5
+    assert [(error["line"], error["error"]) for error in report["errors"]] == [
+        (3, "Invalid email 'broken'"),
+        (4, "Duplicate email in file"),
+        (5, "Email already registered"),
+        (6, "Username already taken"),
+        (8, "Missing password"),
+    ]
+    assert repo.users_by_email["ok2@example.com"].role == "admin"
+    assert repo.users_by_email["ok1@example.com"].hashed_password == "hashed:pw"
@@ -0,0 +1,200 @@
+"""
+Bulk user import
+Registers many users from CSV or JSONL in one pass
+
+Per batch of IMPORT_BATCH_SIZE rows: validate every row, look up taken
+emails/usernames with one set-based query, hash the passwords in parallel
+on IMPORT_HASH_WORKERS threads (bcrypt releases the GIL while hashing, so
+they run on separate cores), then insert in multi-row INSERTs of IMPORT_INSERT_CHUNK users.
+Bad rows are reported with their line number and never stop the import.
+
+Columns / keys: email, username, password, and optionally full_name,
+phone, role (default customer).
+
+Run: python user_import.py users.csv [--format csv|jsonl]
+Or:  POST /admin/users/import?format=csv (admin, file as request body)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+import csv
+import io
+import json
+import os
+import time
+
+from pydantic import EmailStr, TypeAdapter, ValidationError
+
+from auth import get_password_hash
+from repositories import open_repository
+
+BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+INSERT_CHUNK = int(os.getenv("IMPORT_INSERT_CHUNK", "500"))
+HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", str(os.cpu_count() or 1)))
+MAX_REPORTED_ERRORS = 1000
+
+ROLES = ("customer", "restaurant", "delivery", "admin")
+FIELDS = ("email", "username", "password", "full_name", "phone", "role")
+
+_email = TypeAdapter(EmailStr)
+
+
+# ============================================
+# PARSING AND VALIDATION
+# ============================================
+
+def read_rows(text: str, fmt: str) -> Iterator[Tuple[int, object]]:
+    """(line number, row dict) pairs; unparsable lines yield an error string"""
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"Invalid JSON: {e}"
+                continue
+            yield line_number, row if isinstance(row, dict) else "Expected a JSON object"
+    else:
+        raise ValueError(f"Unknown format '{fmt}' (csv or jsonl)")
+
+
+def validate_row(row: dict) -> dict:
+    """Normalized user record (password still in plain text); raises ValueError"""
+    record = {field: (str(row[field]).strip() if row.get(field) not in (None, "") else None) for field in FIELDS}
+    for field in ("email", "username", "password"):
+        if not record[field]:
+            raise ValueError(f"Missing {field}")
+    try:
+        record["email"] = _email.validate_python(record["email"])
+    except ValidationError:
+        raise ValueError(f"Invalid email '{record['email']}'")
+    record["role"] = record["role"] or "customer"
+    if record["role"] not in ROLES:
+        raise ValueError(f"Unknown role '{record['role']}'")
+    record["password"] = str(row["password"])  # passwords are not trimmed
+    return record
+
+
+# ============================================
+# IMPORT
+# ============================================
+
+def hash_passwords(passwords: List[str], pool: Optional[ThreadPoolExecutor]) -> List[str]:
+    if pool is None:
+        return [get_password_hash(password) for password in passwords]
+    return list(pool.map(get_password_hash, passwords))
+
+
+def _import_batch(repo, batch: List[Tuple[int, object]], seen: Dict[str, set], report: dict, pool):
+    def fail(line: int, error: str, email: Optional[str] = None):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line, "email": email, "error": error})
+
+    valid = []
+    for line, row in batch:
+        if isinstance(row, str):
+            fail(line, row)
+            continue
+        try:
+            record = validate_row(row)
+        except ValueError as e:
+            fail(line, str(e), row.get("email"))
+            continue
+        # Duplicates within the file: first occurrence wins
+        if record["email"] in seen["email"]:
+            fail(line, "Duplicate email in file", record["email"])
+        elif record["username"] in seen["username"]:
+            fail(line, "Duplicate username in file", record["email"])
+        else:
+            seen["email"].add(record["email"])
+            seen["username"].add(record["username"])
+            valid.append((line, record))
+
+    taken_emails, taken_usernames = repo.taken_identities(
+        (record["email"] for _, record in valid), (record["username"] for _, record in valid)
+    )
+    new = []
+    for line, record in valid:
+        if record["email"] in taken_emails:
+            fail(line, "Email already registered", record["email"])
+        elif record["username"] in taken_usernames:
+            fail(line, "Username already taken", record["email"])
+        else:
+            new.append((line, record))
+
+    started = time.perf_counter()
+    hashes = hash_passwords([record.pop("password") for _, record in new], pool)
+    report["hashSeconds"] += time.perf_counter() - started
+    for (_, record), hashed in zip(new, hashes):
+        record["hashed_password"] = hashed
+
+    for start in range(0, len(new), INSERT_CHUNK):
+        chunk = new[start:start + INSERT_CHUNK]
+        results = repo.add_users([record for _, record in chunk])
+        for (line, record), duplicate in zip(chunk, results):
+            if duplicate is None:
+                report["created"] += 1
+            else:
+                fail(line, "Email already registered" if duplicate == "email" else "Username already taken", record["email"])
+
+
+def import_users(text: str, fmt: str, batch_size: int = BATCH_SIZE) -> dict:
+    """Import users from CSV/JSONL text; returns counts, per-row errors and throughput"""
+    report = {"total": 0, "created": 0, "failed": 0, "errors": [], "hashSeconds": 0.0}
+    seen = {"email": set(), "username": set()}
+    started = time.perf_counter()
+
+    pool = ThreadPoolExecutor(HASH_WORKERS, thread_name_prefix="import-hash") if HASH_WORKERS > 1 else None
+    try:
+        with open_repository() as repo:
+            batch = []
+            for line, row in read_rows(text, fmt):
+                report["total"] += 1
+                batch.append((line, row))
+                if len(batch) >= batch_size:
+                    _import_batch(repo, batch, seen, report, pool)
+                    batch = []
+            if batch:
+                _import_batch(repo, batch, seen, report, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    seconds = time.perf_counter() - started
+    report["errors"].sort(key=lambda error: error["line"])
+    report["seconds"] = round(seconds, 3)
+    report["hashSeconds"] = round(report["hashSeconds"], 3)
+    report["usersPerSecond"] = round(report["created"] / seconds, 1) if seconds else 0.0
+    report["hashWorkers"] = HASH_WORKERS
+    return report
+
+
+def detect_format(filename: str) -> str:
+    return "jsonl" if filename.endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk user import")
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=("csv", "jsonl"))
+    args = parser.parse_args()
+
+    with open(args.file, encoding="utf-8") as f:
+        report = import_users(f.read(), args.format or detect_format(args.file))
+
+    for error in report["errors"]:
+        print(f"❌ line {error['line']}: {error['error']}" + (f" ({error['email']})" if error["email"] else ""))
+    print(f"✅ Created {report['created']} of {report['total']} users, {report['failed']} failed")
+    print(f"⏱️ {report['seconds']}s ({report['usersPerSecond']} users/s, "
+          f"{report['hashSeconds']}s hashing on {report['hashWorkers']} worker(s))")
+
+
+if __name__ == "__main__":
+    main()
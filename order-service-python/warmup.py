@@ -0,0 +1,168 @@
+"""
+Catalog warm-up
+Fills the catalog caches before the worker reports ready, then keeps them warm
+
+A freshly started worker has empty caches, so its first requests for
+/restaurants and popular menus would all miss and hit the database at
+once. On startup the warmer loads the most popular WARMUP_RESTAURANTS
+open restaurants, their cards and menus with a few bulk IN queries. From
+those it builds every catalog response body (restaurant lists, restaurant,
+detail and both menu orders) and the price tables for quotes. /health
+answers 503 until this is done.
+
+Every REFRESH_INTERVAL seconds the refresher then:
+
+- rebuilds restaurants whose row or menu items have an updated_at newer
+  than the previous check (set on insert and on every edit, so this also
+  catches changes made straight in the database or by instances without
+  a shared invalidation channel),
+- rebuilds entries that were invalidated or evicted, and popular-sorted
+  menus before they expire (their order changes with every order),
+- restarts the TTL of every other entry about to expire, without a query.
+
+The number of bulk queries per cycle is fixed, however many restaurants changed.
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+
+from repositories import Repository, open_repository
+
+logger = logging.getLogger(__name__)
+
+WARMUP_RESTAURANTS = int(os.getenv("CATALOG_WARMUP_RESTAURANTS", "400"))
+REFRESH_INTERVAL_SECONDS = float(os.getenv("CATALOG_REFRESH_INTERVAL", "10"))
+RETRY_SECONDS = float(os.getenv("CATALOG_WARMUP_RETRY", "5"))
+CLOCK_SKEW = timedelta(seconds=2)  # updated_at is written by other instances' clocks
+
+# build(repo, restaurant ids, include lists) -> (cache key -> body, price table sources)
+Builder = Callable[[Repository, List[int], bool], Tuple[Dict[Hashable, bytes], List[tuple]]]
+
+
+class CatalogWarmer:
+    """Warms the response cache and price tables, then refreshes ahead of expiry"""
+
+    def __init__(self, responses, prices, build: Builder):
+        self.responses = responses
+        self.prices = prices
+        self.build = build
+        self.ready = False
+        self.restaurant_ids: List[int] = []
+        self.keys: Dict[Optional[int], List[Hashable]] = {}  # restaurant id (None: lists) -> warmed keys
+        self.checked_at: Optional[datetime] = None
+        self.warmup_ms: Optional[float] = None
+        self.refreshes = 0
+        self.rebuilt = 0
+        self.renewed = 0
+        self.failures = 0
+
+    def _store(self, repo: Repository, restaurant_ids: List[int], lists: bool):
+        bodies, price_sources = self.build(repo, restaurant_ids, lists)
+        for key, raw in bodies.items():
+            self.responses.put(key, raw)
+            owner = None if key[0] == "restaurants" else key[1]
+            if key not in self.keys.setdefault(owner, []):
+                self.keys[owner].append(key)
+        for restaurant, items in price_sources:
+            self.prices.put(restaurant, items)
+        self.rebuilt += len(restaurant_ids)
+
+    def warm(self) -> int:
+        """Bulk-load the catalog into the caches (worker thread); returns restaurants warmed"""
+        started = datetime.utcnow()
+        with open_repository() as repo:
+            # Cards are in popularity order; without cards, the open restaurants by id
+            ids = [card.restaurant_id for card in repo.list_restaurant_cards("popular")]
+            if not ids:
+                ids = sorted(r.id for r in repo.list_open_restaurants())
+            self.restaurant_ids = ids[:WARMUP_RESTAURANTS]
+            self._store(repo, self.restaurant_ids, lists=True)
+        self.checked_at = started
+        return len(self.restaurant_ids)
+
+    def refresh(self) -> dict:
+        """Rebuild changed, missing and expiring entries (worker thread)"""
+        started = datetime.utcnow()
+        horizon = REFRESH_INTERVAL_SECONDS * 1.5  # would expire before the next run
+        with open_repository() as repo:
+            changed = repo.changed_restaurants(self.checked_at - CLOCK_SKEW)
+            stale = [restaurant_id for restaurant_id in self.restaurant_ids if restaurant_id in changed]
+            renew = []
+            for restaurant_id in self.restaurant_ids:
+                if restaurant_id in changed:
+                    continue
+                keys = self.keys.get(restaurant_id, [])
+                left = [self.responses.expires_in(key) for key in keys]
+                prices_left = self.prices.expires_in(restaurant_id)
+                if not keys or None in left or prices_left is None or any(
+                    key[0] == "menu" and key[2] == "popular" and seconds < horizon
+                    for key, seconds in zip(keys, left)
+                ):
+                    stale.append(restaurant_id)
+                else:
+                    renew.extend(key for key, seconds in zip(keys, left) if seconds < horizon)
+                    if prices_left < horizon:
+                        stale.append(restaurant_id)
+
+            list_keys = self.keys.get(None, [])
+            lists_left = [self.responses.expires_in(key) for key in list_keys]
+            rebuild_lists = bool(changed) or not list_keys or None in lists_left
+            if not rebuild_lists:
+                renew.extend(key for key, seconds in zip(list_keys, lists_left) if seconds < horizon)
+
+            if stale or rebuild_lists:
+                self._store(repo, stale, rebuild_lists)
+        for key in renew:
+            if self.responses.renew(key):
+                self.renewed += 1
+        self.checked_at = started
+        self.refreshes += 1
+        return {"changed": len(changed), "rebuilt": len(stale), "renewed": len(renew), "lists": rebuild_lists}
+
+    async def run(self, refresh: bool = True, after: Optional[asyncio.Event] = None,
+                  interval: float = REFRESH_INTERVAL_SECONDS):
+        """Background task: warm up (retrying until it succeeds), then refresh
+
+        after: wait for this first, e.g. the restaurant cards' first refresh,
+        whose invalidations would otherwise empty the fresh caches again.
+        """
+        if after is not None:
+            await after.wait()
+        while not self.ready:
+            started = time.perf_counter()
+            try:
+                warmed = await asyncio.to_thread(self.warm)
+            except Exception:
+                self.failures += 1
+                logger.exception("Catalog warm-up failed, retrying")
+                await asyncio.sleep(RETRY_SECONDS)
+                continue
+            self.warmup_ms = round((time.perf_counter() - started) * 1000, 1)
+            self.ready = True
+            logger.info("🔥 Catalog warmed up", extra={"restaurants": warmed, "durationMs": self.warmup_ms})
+
+        while refresh:
+            await asyncio.sleep(interval)
+            try:
+                result = await asyncio.to_thread(self.refresh)
+                if result["rebuilt"] or result["lists"]:
+                    logger.debug("Catalog refreshed", extra=result)
+            except Exception:
+                self.failures += 1
+                logger.exception("Catalog refresh failed")
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warmupMs": self.warmup_ms,
+            "restaurants": len(self.restaurant_ids),
+            "refreshes": self.refreshes,
+            "rebuilt": self.rebuilt,
+            "renewed": self.renewed,
+            "failures": self.failures,
+            "checkedAt": self.checked_at.isoformat() if self.checked_at else None
+        }